@@ -7,11 +7,28 @@
 # Workflow:
 #   1) Load stack paths from INPUT_PATTERN and prepare OUTPUT_HDF5.
 #   2) For each image, read frames with the selected CHANNEL.
-#   3) On the first frame, estimate background (BACKGROUND_WINDOW) to compute SNR.
+#   3) On the first frame, estimate background (BACKGROUND_WINDOW) to compute SNR. Optionally the
+#      background is estimated again every BACKGROUND_REFRESH_EVERY frames and/or when the frame drifts
+#      from it by more than BACKGROUND_DRIFT_TOL (see background_scheduler.py).
 #   4) Apply Gaussian smoothing (LOG_SIGMA), Laplacian + threshold (LOG_THRESHOLD) to detect blobs,
 #      constrained by BLOB_MIN_PIXELS/BLOB_MAX_PIXELS.
 #   5) Find local maxima inside blobs; save positions to an HDF5 store (one group per image/frame)
 #      along with background and run metadata.
+#   6) Optionally (EXTRACT_FEATURES), store next to x/y the area, integrated intensity and peak SNR
+#      of each cell (blob pixels assigned to their nearest maximum), computed in the same pass as the positions.
+# With LOG_CACHE_DIR set, the LoG map of every frame is also saved in an on-disk cache (see log_map_cache.py)
+# so that re-analyses (e.g. detection_parameter_sweep.py) do not need to read and filter the images again.
+# With METRICS_FILE set, the wall time of each stage, the blob/maxima counts of each frame and the bytes
+# read/written are logged as JSON lines (see detection_metrics.py); PROFILE_OUTPUT dumps a cProfile of the run.
+# With PARQUET_DIR set, the detections of each stack are also written as Parquet (well=/position= partitions,
+# see detections_parquet.py) for fast columnar queries.
+# With SHARD_DIR set, each stack is written to its own small HDF5 file (same keys) by one of N_WORKERS processes,
+# so that no writer waits on a single output file, and the shards are then merged into OUTPUT_HDF5
+# (see merge_detection_shards.py).
+# With PREFETCH_DEPTH > 0, frames are read ahead in a background thread (current and next stack, see
+# frame_prefetcher.py) so that reading the images overlaps with the detection.
+# Stacks written as OME-Zarr by make_stack_temps_en.py (INPUT_PATTERN ending with *.zarr) are read directly with
+# zarr (see zarr_stack.py), frame by frame, without bioformats; they hold a single channel so CHANNEL is ignored.
 # See CONFIGURATION for parameters and the COMMANDS section for the run confirmation.
 
 # Commands dataframes:
@@ -29,6 +46,12 @@
 #       f.attrs[name_atribute]
 #   to get the background:
 #       f['background']['im'][:] as an array -> plt.imshow() to see it
+#   with background refresh, all maps and their frame ranges are in:
+#       f['Image{id}/background']['maps'][:] and f['Image{id}/background']['frames'][:]
+#   acquisition times (hours since the first frame, when the stack has embedded times or a sidecar, see time_axes.py):
+#       f['Image{id}/times'][:] and f['Image{id}/times'].attrs['start']
+#   and the acquisition metadata of the stack (camera, well, position, channel, stack_path, times_source):
+#       f['Image{id}'].attrs
 #   to get one of the dataframes:
 #       
 #
@@ -39,11 +62,22 @@
 import javabridge # To use bioformats 
 import bioformats # to open the images
 import sep # to determine the background
+import background_scheduler as bkgsched # python file to decide when the background is estimated again
 import Find_Local_Maxima as findMax # python file to determine blobs and local maxima
+import detection_metrics # python file to time the stages of the detection
+import log_map_cache # python file to keep the LoG maps on disk for later re-analysis
+import merge_detection_shards # python file to gather the per-stack shards in one output file
+import detections_parquet # python file to also save the detections as partitioned Parquet
+import frame_prefetcher # python file to read the frames ahead in a background thread
+import zarr_stack # python file to read the stacks saved as OME-Zarr
+import time_axes # python file to read the acquisition times of the stacks and store them with the counts
 import h5py # to have compacted dataframes
 import pandas # to use dataframes
 import sys,os # to access our images and use the terminal
+import time # to time the stacks
 import glob # finds all the pathnames matching a specified pattern according to the rules used by the Unix shell
+import multiprocessing # to process several stacks in parallel
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm # to get a processing bar in the terminal
 from scipy.spatial import KDTree
 
@@ -59,80 +93,160 @@ CONFIRM_BEFORE_RUN = True  # Keep the confirmation prompt enabled
 # Detection parameters
 CHANNEL = 0  # Use 1 when processing bright-field + fluorescence stacks
 BACKGROUND_WINDOW = 256  # Background window size in pixels; large enough to avoid local effects
+BACKGROUND_REFRESH_EVERY = None  # Re-estimate the background every N frames; None keeps the first-frame background
+BACKGROUND_DRIFT_TOL = None  # Re-estimate when |median(frame - background)| exceeds this many rms; None to disable
 LOG_SIGMA = 3.5  # Gaussian smoothing applied before Laplacian
 LOG_THRESHOLD = 0.0375  # LoG threshold used to select blobs
 BLOB_MIN_PIXELS = 30  # Minimum number of pixels to accept a blob
 BLOB_MAX_PIXELS = None  # Optional maximum blob size; keep None to disable
 MIN_DUPLICATE_DISTANCE = 12  # Radius for optional duplicate filtering (currently unused)
 FILENAME_ID_INDEX = 0  # Which filename token to use as the HDF5 group identifier
+EXTRACT_FEATURES = False  # Also save "area", "intensity" and "snr" columns for each detected cell
 
+# LoG map cache
+LOG_CACHE_DIR = None  # Directory of the LoG map cache, e.g. "./results 141125/log cache 1031"; None to disable
+LOG_CACHE_MAX_GB = 50  # Size limit of the cache; least recently used maps are removed first
 
-# =============== COMMANDS =========================================================================================
+# Parquet copy of the detections
+PARQUET_DIR = None  # Root of the partitioned Parquet dataset, e.g. "./results 141125/parquet 1031_0.0375"; None to disable
 
-# Collect images matching the input pattern and confirm output target
-input_files = glob.glob(INPUT_PATTERN)
-output_file = OUTPUT_HDF5
-input_dir = os.path.dirname(INPUT_PATTERN)
-
-print(input_files)
-print("input dir={}".format(input_dir))
-for image_path in input_files:
-    base=os.path.basename(image_path)
-    print(base)
-#    assert base.split("_")[-2]=="Image", "wrong vsi={}".format(base)
-print("output file will be ={}".format(output_file))
-if CONFIRM_BEFORE_RUN:
-    ans=input("is this OK? (y/n) ")
-    if ans != "y":
-        sys.exit()
-
-
-#Then we start java to access our images
-javabridge.start_vm(class_path=bioformats.JARS)
-# we create the output file to write in it
-f=h5py.File(output_file,'w')
- 
-# we specify the metadata in our output file
-f.attrs['channel']=CHANNEL
-f.attrs['sigma']=LOG_SIGMA
-f.attrs['seuil']=LOG_THRESHOLD
-f.attrs['ccmin']=BLOB_MIN_PIXELS
-if BLOB_MAX_PIXELS is not None:
-    f.attrs['ccmax']=BLOB_MAX_PIXELS
-# for pnadas df
-store=pandas.HDFStore(output_file,'a')
-
-# Then we loop on the images 
-for ifile,fin in enumerate(input_files):
-    # determine the image number from file name
+# Parallel runs
+SHARD_DIR = None  # Directory of per-stack output shards, e.g. "./results 141125/shards 1031"; None writes OUTPUT_HDF5 directly
+N_WORKERS = 1  # Number of stacks processed in parallel (each worker writes its own shard; needs SHARD_DIR)
+MERGE_MODE = "copy"  # How shards are merged into OUTPUT_HDF5: "copy" (pandas + h5py readers) or "link" (h5py readers only)
+
+# Read-ahead of the frames
+PREFETCH_DEPTH = 0  # Number of frames read ahead in a background thread; 0 reads each frame in the loop
+PREFETCH_MAX_MB = 1024  # Memory limit of the frames waiting in the read-ahead buffer
+
+# Instrumentation
+METRICS_FILE = None  # JSON-lines file with per-stage timings and counters, e.g. "./results 141125/metrics_1031.jsonl"
+PROFILE_OUTPUT = None  # cProfile stats file of the whole run, e.g. "./results 141125/detection_1031.prof"
+
+
+# =============== FUNCTIONS =========================================================================================
+
+# Function that writes the detection parameters in the attributes of the output file
+# Arguments:
+#   - f: h5py file
+def writeRunAttributes(f):
+    f.attrs['channel']=CHANNEL
+    f.attrs['sigma']=LOG_SIGMA
+    f.attrs['seuil']=LOG_THRESHOLD
+    f.attrs['ccmin']=BLOB_MIN_PIXELS
+    if BLOB_MAX_PIXELS is not None:
+        f.attrs['ccmax']=BLOB_MAX_PIXELS
+    f.attrs['features']=EXTRACT_FEATURES
+    if BACKGROUND_REFRESH_EVERY is not None:
+        f.attrs['bkg_refresh_every']=BACKGROUND_REFRESH_EVERY
+    if BACKGROUND_DRIFT_TOL is not None:
+        f.attrs['bkg_drift_tol']=BACKGROUND_DRIFT_TOL
+
+# Function that opens the LoG map cache if LOG_CACHE_DIR is set
+# Output:
+#   - log_cache: log_map_cache.LogMapCache or None
+def openLogCache():
+    if LOG_CACHE_DIR is None:
+        return None
+    # the cache variant records the experiment, the channel and how the SNR was obtained so that maps of other runs never mix
+    variant=log_map_cache.variant(INPUT_PATTERN,CHANNEL,BACKGROUND_WINDOW)
+    if BACKGROUND_REFRESH_EVERY is not None:
+        variant+="_every{}".format(BACKGROUND_REFRESH_EVERY)
+    if BACKGROUND_DRIFT_TOL is not None:
+        variant+="_tol{}".format(BACKGROUND_DRIFT_TOL)
+    return log_map_cache.LogMapCache(LOG_CACHE_DIR,max_bytes=LOG_CACHE_MAX_GB*1e9,variant=variant)
+
+# Function that returns the identifier of a stack (HDF5 group Image{id}) from its file name
+def stackId(fin):
     b=os.path.basename(fin)
 #    imnum=int(b.split(".")[0].split("Image_")[1])
 #    imnum = int(b.split(".")[0].split("_")[-1].replace("d", "").replace("h", "").replace("m", ""))
 #    imnum = int(b.split("_")[2])
 #    imnum = f"{b.split('_')[0]}_{b.split('_')[1]}_{b.split('_')[2]}_{b.split('_')[3]}"
-    imnum = b.split("_")[FILENAME_ID_INDEX]
-
+    return b.split("_")[FILENAME_ID_INDEX]
 
-    # open the image with bioformats
+# Function that opens a stack for the read-ahead thread
+# Arguments:
+#   - fin: path of the stack
+# Output:
+#   - nt: number of frames
+#   - read: function returning the raw frame ip of the selected CHANNEL
+def openStackReader(fin):
+    if zarr_stack.is_zarr_stack(fin):
+        stack=zarr_stack.open_stack(fin)
+        return stack.shape[0],lambda ip: zarr_stack.read_frame(stack,ip)
     ome=bioformats.OMEXML(bioformats.get_omexml_metadata(fin))
-    print(ome.image().AcquisitionDate)
-    # Retrieve properties of the image
-    nt=ome.image().Pixels.SizeT
-    Nx=ome.image().Pixels.SizeX
-    Ny=ome.image().Pixels.SizeY
-    nchan=ome.image().Pixels.channel_count
-    # read the image 
     reader=bioformats.ImageReader(fin)
+    return ome.image().Pixels.SizeT,lambda ip: reader.read(c=CHANNEL,t=ip)
+
+# Function that starts the read-ahead thread if PREFETCH_DEPTH > 0
+# Arguments:
+#   - input_files: stacks in the order they will be processed
+# Output:
+#   - prefetcher: frame_prefetcher.FramePrefetcher or None
+def openPrefetcher(input_files):
+    if PREFETCH_DEPTH <= 0:
+        return None
+    # the reading thread must be attached to the java VM to use bioformats
+    return frame_prefetcher.FramePrefetcher(input_files,openStackReader,depth=PREFETCH_DEPTH,max_bytes=PREFETCH_MAX_MB*1e6,
+                                            thread_init=javabridge.attach,thread_exit=javabridge.detach)
+
+# Function that detects the cells of every frame of one stack and writes them in the output file
+# Arguments:
+#   - fin: path of the stack
+#   - f: h5py output file (background)
+#   - store: pandas.HDFStore on the same file (positions)
+#   - metrics: detection_metrics.RunMetrics
+#   - log_cache: log_map_cache.LogMapCache or None
+#   - ifile, nfiles: position of the stack in the run (for display, and index of the stack in the prefetcher)
+#   - prefetcher: frame_prefetcher.FramePrefetcher reading the frames ahead, or None to read them in the loop
+def processStack(fin,f,store,metrics,log_cache=None,ifile=0,nfiles=1,prefetcher=None):
+    refresh_background=BACKGROUND_REFRESH_EVERY is not None or BACKGROUND_DRIFT_TOL is not None
+    # determine the image number from file name
+    imnum = stackId(fin)
+
+
+    if zarr_stack.is_zarr_stack(fin):
+        # OME-Zarr stack: single channel, the frames are read lazily from their chunks
+        stack=zarr_stack.open_stack(fin)
+        nt,Ny,Nx=stack.shape
+        nchan=1
+        reader=None
+    else:
+        # open the image with bioformats
+        ome=bioformats.OMEXML(bioformats.get_omexml_metadata(fin))
+        print(ome.image().AcquisitionDate)
+        # Retrieve properties of the image
+        nt=ome.image().Pixels.SizeT
+        Nx=ome.image().Pixels.SizeX
+        Ny=ome.image().Pixels.SizeY
+        nchan=ome.image().Pixels.channel_count
+        # read the image (the read-ahead thread has its own reader)
+        reader=bioformats.ImageReader(fin) if prefetcher is None else None
 
 
     # HDF output (how information will be organized in the out file)
     print("><"*100)
-    print(r"{} ({}/{})".format(fin,ifile,len(input_files)))
+    print(r"{} ({}/{})".format(fin,ifile,nfiles))
     print(r" ->{} frames. image size=({}x{}) with {} channels: using channel={}".format(nt,Nx,Ny,nchan,CHANNEL))
     
     # we loop on the frames
+    t_stack=time.perf_counter()
+    if metrics.enabled:
+        store.flush()
+        f.flush()
+        size_before=os.path.getsize(store.filename)
+    parquet_frames=[]
     for ip in tqdm(range(nt),desc="Processing"):
-        yy=reader.read(c=CHANNEL,t=ip)
+        with metrics.stage("read"):
+            if prefetcher is not None:
+                # only the time spent waiting for the read-ahead thread is counted
+                yy=prefetcher.get(ifile,ip)
+            elif reader is None:
+                yy=zarr_stack.read_frame(stack,ip)
+            else:
+                yy=reader.read(c=CHANNEL,t=ip)
+        metrics.add("bytes_read",yy.nbytes)
         if yy.ndim == 3 and yy.shape[2] == 3:  # examiner si c'est un RGB image
             # separate the 3 channels
             yy = yy[:, :, 0]   # R channel
@@ -142,30 +256,181 @@ for ifile,fin in enumerate(input_files):
         else:
             data=yy.reshape(Ny,Nx)
         # compute background if we are at the first frame and save it in the output file
-        if ip==0:
-            bkg=sep.Background(data,bw=BACKGROUND_WINDOW,bh=BACKGROUND_WINDOW)
-            key="Image{}/background".format(imnum)
-            g = f.create_group(key)
-            ds=g.create_dataset("image",data=bkg.back(),compression='gzip')
-            g.attrs['rms']=bkg.globalrms
-            g.attrs['bw']=BACKGROUND_WINDOW
-
-        # work on SNR
-        snr=(data-bkg.back())/bkg.globalrms
-        # compute LoG and threshold to obtain blobs
-        blobs=findMax.getBlobs(snr,s=LOG_THRESHOLD,ccmin=BLOB_MIN_PIXELS,sigma=LOG_SIGMA,ccmax=BLOB_MAX_PIXELS)
+        with metrics.stage("background"):
+            if ip==0:
+                bkg=sep.Background(data,bw=BACKGROUND_WINDOW,bh=BACKGROUND_WINDOW)
+                # keep the map in memory instead of evaluating it again at each frame
+                back=bkg.back()
+                rms=bkg.globalrms
+                key="Image{}/background".format(imnum)
+                g = f.create_group(key)
+                ds=g.create_dataset("image",data=back,compression='gzip')
+                g.attrs['rms']=rms
+                g.attrs['bw']=BACKGROUND_WINDOW
+                if refresh_background:
+                    bkgsched.initBackgroundMaps(g,back,rms)
+                    last_refresh=0
+            elif refresh_background:
+                # estimate the background again if it is too old or if the frame drifted too much from it
+                drift=bkgsched.backgroundDrift(data,back,rms) if BACKGROUND_DRIFT_TOL is not None else None
+                if bkgsched.needsRefresh(ip,last_refresh,drift,every=BACKGROUND_REFRESH_EVERY,tol=BACKGROUND_DRIFT_TOL):
+                    bkg=sep.Background(data,bw=BACKGROUND_WINDOW,bh=BACKGROUND_WINDOW)
+                    back=bkg.back()
+                    rms=bkg.globalrms
+                    bkgsched.appendBackgroundMap(g,back,rms,ip)
+                    last_refresh=ip
+
+            # work on SNR
+            signal=data-back
+            snr=signal/rms
+        # compute LoG and threshold to obtain blobs (same steps as findMax.getBlobs, timed separately)
+        with metrics.stage("log"):
+            lap=findMax.LoG(snr,LOG_SIGMA)
+        if log_cache is not None:
+            with metrics.stage("cache"):
+                log_cache.put(imnum,ip,LOG_SIGMA,lap)
+        with metrics.stage("label"):
+            y_t,img_t=findMax.thresholdMap(lap,LOG_THRESHOLD)
+            markers=findMax.labelBlobs(img_t)
+            blobs=findMax.selectBlobs(markers,y_t,ccmin=BLOB_MIN_PIXELS,ccmax=BLOB_MAX_PIXELS,keepMark=EXTRACT_FEATURES)
         # get local maxima for each blob: output is a dataframe
-        pos=findMax.findMax(blobs,data.shape)
+        with metrics.stage("maxima"):
+            if EXTRACT_FEATURES:
+                pos=findMax.findMax(blobs,data.shape,image=signal,snr=snr)
+            else:
+                pos=findMax.findMax(blobs,data.shape)
         
         
         #pos = findMax.filter_coordinates(pos, MIN_DUPLICATE_DISTANCE)
         #pos = pandas.DataFrame(pos, columns=['x', 'y'])
         # write df (careful, here floats)
         key="Image{}/frame{}".format(imnum,ip)
-        pos.to_hdf(store,key=key)
+        with metrics.stage("write"):
+            pos.to_hdf(store,key=key)
+        if PARQUET_DIR is not None:
+            parquet_frames.append(pos.reset_index(drop=True).assign(frame=ip))
+        if metrics.enabled:
+            metrics.frame(imnum,ip,components=markers.max(),blob_pixels=len(blobs),maxima=len(pos))
+    if refresh_background:
+        bkgsched.closeBackgroundMaps(g,nt)
+    # acquisition times of the frames and metadata, embedded in the stack by make_stack_temps_en.py (or from its sidecar)
+    times,acquisition=time_axes.read_stack_acquisition(fin)
+    grp=f.require_group("Image{}".format(imnum))
+    grp.attrs['stack_path']=fin
+    for name,value in acquisition.items():
+        grp.attrs[name]=value
+    if times is not None and len(times)==nt:
+        time_axes.write_stack_times(grp,times)
+    elif times is not None:
+        print("Ignored the times of {}: {} times for {} frames".format(fin,len(times),nt))
+    if PARQUET_DIR is not None:
+        with metrics.stage("write"):
+            detections_parquet.write_stack_parquet(PARQUET_DIR,imnum,pandas.concat(parquet_frames,ignore_index=True))
+    if metrics.enabled:
+        # file size after flushing both handles gives the bytes written for this stack
+        store.flush()
+        f.flush()
+        metrics.stack(imnum,nt,time.perf_counter()-t_stack,os.path.getsize(store.filename)-size_before)
+
+# Function run by the worker processes: starts java once per worker
+def startWorker():
+    javabridge.start_vm(class_path=bioformats.JARS)
 
-# we close the files created
-store.close()
-f.close()
-# and java
-javabridge.kill_vm()
+# Function that detects the cells of one stack and writes them in its own shard SHARD_DIR/Image{id}.hdf5
+# Arguments:
+#   - fin: path of the stack
+#   - ifile, nfiles: position of the stack in the run (for display)
+# Output:
+#   - path of the shard
+def processStackShard(fin,ifile=0,nfiles=1):
+    imnum=stackId(fin)
+    shard="{}/Image{}.hdf5".format(SHARD_DIR,imnum)
+    # one metrics file per shard
+    metrics_file=None
+    if METRICS_FILE is not None:
+        root,ext=os.path.splitext(METRICS_FILE)
+        metrics_file="{}_{}{}".format(root,imnum,ext)
+    # the frames go to the shard through pandas only; the background, times and attributes are kept in an
+    # in-memory h5py file and added to the shard once the store is closed, so the shard never has two handles
+    store=pandas.HDFStore(shard,'w')
+    mem=h5py.File("Image{}_mem.hdf5".format(imnum),'w',driver='core',backing_store=False)
+    metrics=detection_metrics.RunMetrics(metrics_file)
+    prefetcher=openPrefetcher([fin])
+    processStack(fin,mem,store,metrics,openLogCache(),0,nfiles,prefetcher)
+    if prefetcher is not None:
+        prefetcher.close()
+    metrics.close()
+    store.close()
+    with h5py.File(shard,'a') as f:
+        writeRunAttributes(f)
+        merge_detection_shards.copyInto(mem,f)
+    mem.close()
+    merge_detection_shards.checkShard(shard)
+    return shard
+
+
+# =============== COMMANDS =========================================================================================
+
+if __name__ == "__main__":
+    # Collect images matching the input pattern and confirm output target
+    input_files = glob.glob(INPUT_PATTERN)
+    output_file = OUTPUT_HDF5
+    input_dir = os.path.dirname(INPUT_PATTERN)
+
+    print(input_files)
+    print("input dir={}".format(input_dir))
+    for image_path in input_files:
+        base=os.path.basename(image_path)
+        print(base)
+    #    assert base.split("_")[-2]=="Image", "wrong vsi={}".format(base)
+    print("output file will be ={}".format(output_file))
+    if SHARD_DIR is not None:
+        print("shards in {} with {} workers".format(SHARD_DIR,N_WORKERS))
+    if CONFIRM_BEFORE_RUN:
+        ans=input("is this OK? (y/n) ")
+        if ans != "y":
+            sys.exit()
+
+    profiler=detection_metrics.start_profile(PROFILE_OUTPUT)
+    if SHARD_DIR is None:
+        #Then we start java to access our images
+        javabridge.start_vm(class_path=bioformats.JARS)
+        # we create the output file to write in it
+        f=h5py.File(output_file,'w')
+        # we specify the metadata in our output file
+        writeRunAttributes(f)
+        f.flush()
+        # for pnadas df
+        store=pandas.HDFStore(output_file,'a')
+        # timings and counters (no-op when METRICS_FILE is None)
+        metrics=detection_metrics.RunMetrics(METRICS_FILE)
+        log_cache=openLogCache()
+        # reads ahead across the stacks (None when PREFETCH_DEPTH is 0)
+        prefetcher=openPrefetcher(input_files)
+
+        # Then we loop on the images
+        for ifile,fin in enumerate(input_files):
+            processStack(fin,f,store,metrics,log_cache,ifile,len(input_files),prefetcher)
+
+        # we close the files created
+        if prefetcher is not None:
+            prefetcher.close()
+        metrics.close()
+        store.close()
+        f.close()
+    else:
+        os.makedirs(SHARD_DIR,exist_ok=True)
+        if N_WORKERS>1:
+            # each worker starts its own java VM; "spawn" gives fresh processes on every platform
+            with ProcessPoolExecutor(max_workers=N_WORKERS,mp_context=multiprocessing.get_context("spawn"),initializer=startWorker) as pool:
+                shards=list(pool.map(processStackShard,input_files,range(len(input_files)),[len(input_files)]*len(input_files)))
+        else:
+            javabridge.start_vm(class_path=bioformats.JARS)
+            shards=[processStackShard(fin,ifile,len(input_files)) for ifile,fin in enumerate(input_files)]
+        # gather the shards in the output file
+        merge_detection_shards.mergeShards(shards,output_file,mode=MERGE_MODE)
+        print("merged {} shards into {}".format(len(shards),output_file))
+    detection_metrics.stop_profile(profiler,PROFILE_OUTPUT)
+    # and java
+    if SHARD_DIR is None or N_WORKERS<=1:
+        javabridge.kill_vm()
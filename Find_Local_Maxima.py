@@ -32,13 +32,44 @@ def localMax(img):
     return dst
 
 
+# Function that computes per-blob features from the blob pixels in a single
+# vectorized reduction (no second pass over the image)
+# Arguments:
+#   - blobs: dataframe of blob pixels (columns "ix", "iy", "val" and "mark") as returned by getBlobs(...,keepMark=True)
+#   - image: optional matrix of pixels (background subtracted) summed over each blob
+#   - snr: optional SNR matrix of pixels from which the peak value of each blob is kept
+#   - mark: optional label of each pixel replacing the blob label (e.g. the cell each pixel is assigned to)
+# Output:
+#   - feat: dataframe indexed by label with columns "area" (pixels), "intensity" and "snr"
+def blobFeatures(blobs,image=None,snr=None,mark=None):
+    mark=blobs.mark.values if mark is None else np.asarray(mark)
+    # sort pixels by label so that each label is a contiguous segment
+    order=np.argsort(mark,kind='stable')
+    mark=mark[order]
+    iy=blobs.iy.values[order]
+    ix=blobs.ix.values[order]
+    labels,starts,area=np.unique(mark,return_index=True,return_counts=True)
+    feat={'area':area.astype(float)}
+    if image is not None:
+        feat['intensity']=np.add.reduceat(image[iy,ix].astype(float),starts) if labels.size else np.zeros(0)
+    if snr is not None:
+        feat['snr']=np.maximum.reduceat(snr[iy,ix].astype(float),starts) if labels.size else np.zeros(0)
+    return pandas.DataFrame(feat,index=labels)
+
+
 # Function that 
 # Arguments:
 #   - blobs: dataframe of pixels coordinates (columns "x" and "y") and their value (column "value")
 #   - shape: shape of our images
+#   - image: optional matrix of pixels (background subtracted) to compute the integrated intensity of each cell
+#   - snr: optional SNR matrix of pixels to compute the peak SNR of each cell
+#     (when image or snr is given, blobs must contain the "mark" column: getBlobs(...,keepMark=True))
 # Output:
-#   - p: dataframe of two columns "x" and "y" corresponding to the positions of the cells
-def findMax(blobs,shape):
+#   - p: dataframe of two columns "x" and "y" corresponding to the positions of the cells,
+#     followed by the columns "area", "intensity" and "snr" of each cell if requested: every pixel of a blob
+#     is assigned to the nearest maximum of the same blob, so a blob holding k cells is split among them
+#     and the sums over the cells equal the sums over the blobs
+def findMax(blobs,shape,image=None,snr=None):
     # we define a nbew image with the pixel values of the blobs on it and zero elsewhere
     new_img=np.zeros(shape)
     new_img[blobs.iy,blobs.ix]=blobs.val
@@ -48,9 +79,30 @@ def findMax(blobs,shape):
     Nc, markers = cv2.connectedComponents(locmax)
     iy,ix=np.where(markers>0)
     p=pandas.DataFrame(np.array([ix,iy,markers[iy,ix]]).T,columns=["x","y","mark"])
-    # we define ƒmean maxes
-    p=p.groupby('mark').agg({'x':'mean','y':'mean'})
-    return p[['x','y']]
+    if image is None and snr is None:
+        # we define ƒmean maxes
+        p=p.groupby('mark').agg({'x':'mean','y':'mean'})
+        return p[['x','y']]
+    # we retrieve the blob each maximum belongs to
+    blob_img=np.zeros(shape,dtype=np.int32)
+    blob_img[blobs.iy,blobs.ix]=blobs.mark
+    p['blob']=blob_img[iy,ix]
+    p=p.groupby('mark').agg({'x':'mean','y':'mean','blob':'first'})
+    # nearest maximum of every blob pixel, restricted to its own blob: the blob label is a third
+    # coordinate spaced further apart than any two pixels of the image
+    spacing=2.*(shape[0]+shape[1])
+    cell=np.zeros(len(blobs),dtype=np.int64)
+    if len(p):
+        tree=KDTree(np.c_[p.x.values,p.y.values,p.blob.values*spacing])
+        dist,i=tree.query(np.c_[blobs.ix.values,blobs.iy.values,blobs.mark.values*spacing],distance_upper_bound=spacing/2)
+        found=i<len(p)
+        cell[found]=p.index.values[i[found]]
+    # features are stored as floats so the dataframe keeps a single block next to x and y
+    keep=cell>0
+    feat=blobFeatures(blobs[keep],image,snr,mark=cell[keep])
+    p=p.join(feat)
+    p['area']=p['area'].fillna(0.)
+    return p[['x','y']+list(feat.columns)]
 
 # Function that first applies a smoothing before using the Laplacian to 
 #  identify contours
@@ -64,28 +116,37 @@ def LoG(yy,sigma):
     lap=-ndi.laplace(s1)
     return lap
 
-# Function that 
+# Function that applies the threshold on the result of the LoG
 # Arguments:
-#   - yy: image as matrix of pixels
+#   - lap: result of the LoG as matrix of pixels
 #   - s: value of the threshold applied to determine the interior of the contours
-#   - ccmin: maximum number of pixels for a blob to be processed (default value to 20)
-#   - ccmax: maximum number of pixels for a blob to be processed (default value to None)
-#   - sigma: value of the smoothing (default value to 2)
-#   - method: method used to identify blobs in the pictures (default to "LoG")
-#   - returnMap: boolean to specify if one wish to also have the result of the LoG in output
 # Output:
-#   - q: dataframe of 3 columns "ix", "iy" and "val" corresponding to the pixels 
-def getBlobs(yy,s,ccmin=20,ccmax=None,sigma=2,method="LoG",returnMap=False):
-    # First, apply smoothing and Laplacian through LoG function defined previously
-    if method=="LoG":
-        lap=LoG(yy,sigma)
-    else:
-        assert False,"{} unknown method".format(method)
-    # Apply threshold
+#   - y_t: LoG values above the threshold, s elsewhere
+#   - img_t: y_t normalized as an 8 bits image (0 where the threshold is not reached)
+def thresholdMap(lap,s):
     y_t=np.where(lap>s,lap,s)
     img_t = cv2.normalize(y_t, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
-    # Use connected components to retrieve and label blobs
+    return y_t,img_t
+
+# Function that labels the connected components (blobs) of the thresholded image
+# Arguments:
+#   - img_t: 8 bits thresholded image returned by thresholdMap
+# Output:
+#   - markers: matrix of pixels with the label of the blob (0 outside of the blobs)
+def labelBlobs(img_t):
     Nc, markers = cv2.connectedComponents(img_t)
+    return markers
+
+# Function that keeps the blobs respecting the size criteria
+# Arguments:
+#   - markers: matrix of labels returned by labelBlobs
+#   - y_t: thresholded LoG returned by thresholdMap
+#   - ccmin: minimum number of pixels for a blob to be processed
+#   - ccmax: maximum number of pixels for a blob to be processed (None to disable)
+#   - keepMark: boolean to also keep the blob label of each pixel (column "mark")
+# Output:
+#   - q: dataframe of 3 columns "ix", "iy" and "val" corresponding to the pixels of the selected blobs
+def selectBlobs(markers,y_t,ccmin=20,ccmax=None,keepMark=False):
     # Check the criteria of minimum size
     iy,ix=np.where(markers>0)
     d={'ix':ix,'iy':iy,'mark':markers[iy,ix],'val':y_t[iy,ix]}
@@ -98,7 +159,32 @@ def getBlobs(yy,s,ccmin=20,ccmax=None,sigma=2,method="LoG",returnMap=False):
     if ccmax is not None:
         cnt=cnt[cnt.sz<ccmax]
     q=q.merge(cnt,on='mark')  
-    q=q[['ix','iy','val']]
+    q=q[['ix','iy','val','mark']] if keepMark else q[['ix','iy','val']]
+    return q
+
+# Function that 
+# Arguments:
+#   - yy: image as matrix of pixels
+#   - s: value of the threshold applied to determine the interior of the contours
+#   - ccmin: maximum number of pixels for a blob to be processed (default value to 20)
+#   - ccmax: maximum number of pixels for a blob to be processed (default value to None)
+#   - sigma: value of the smoothing (default value to 2)
+#   - method: method used to identify blobs in the pictures (default to "LoG")
+#   - returnMap: boolean to specify if one wish to also have the result of the LoG in output
+#   - keepMark: boolean to also keep the blob label of each pixel (column "mark"), needed for the features
+# Output:
+#   - q: dataframe of 3 columns "ix", "iy" and "val" corresponding to the pixels 
+def getBlobs(yy,s,ccmin=20,ccmax=None,sigma=2,method="LoG",returnMap=False,keepMark=False):
+    # First, apply smoothing and Laplacian through LoG function defined previously
+    if method=="LoG":
+        lap=LoG(yy,sigma)
+    else:
+        assert False,"{} unknown method".format(method)
+    # Apply threshold
+    y_t,img_t=thresholdMap(lap,s)
+    # Use connected components to retrieve and label blobs
+    markers=labelBlobs(img_t)
+    q=selectBlobs(markers,y_t,ccmin=ccmin,ccmax=ccmax,keepMark=keepMark)
     if returnMap:
         return q,lap
     else:
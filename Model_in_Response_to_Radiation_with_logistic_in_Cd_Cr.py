@@ -10,7 +10,11 @@ import matplotlib.pyplot as plt # to display fitting result
 from scipy.optimize import curve_fit # to perform the non linear fit
 import random # to use random initial parameter values
 import time
-from scipy.integrate import solve_ivp
+import model_dataset # python file to load all the curves of a campaign from one binary file
+import radiation_model # python file with the model below as a picklable object with cached integrations
+import model_uncertainty # python file with the bootstrap and profile likelihood confidence intervals
+import fit_seeding # python file with the Sobol/LHS seeding and two-stage fits
+import growth_cutoff # python file with the cutoff of the growth curves
 
 # =============== FUNCTIONS =========================================================================================
 
@@ -40,12 +44,20 @@ def Chi2(exp,fit,std,k):
 #             and b corresponds to the list of the upper bounds of the set of parameters
 #   - ndraws: int corresponding to the total number of random draws for the initial values of model parameters
 #             from whoich a fit is performed
-#   - method: string designating the type of method wished for choosing the initial set of parameters
+#   - method: string designating the type of method wished for choosing the initial set of parameters.
+#             With "sobol" or "lhs", the ndraws initial sets form a quasi-random design whose chi2 is only evaluated
+#             (one integration each), and the fits are performed from the top_k best ones (see fit_seeding.py).
+#             The model must then have a time_points attribute (RadiationModel)
+#   - top_k: int corresponding to the number of fits performed with "sobol" or "lhs"
 # Output:
 #   - chi2: float corresponding to the chi2 value of the model
 #   - best_popt: float corresponding to the chi2 value of the model
-def Find_best_popt(model,time,exp, std, k,bounds,ndraws,method):
+def Find_best_popt(model,time,exp, std, k,bounds,ndraws,method,top_k=16):
     npara=len(bounds[0]) # we retrieve the total number of parameters
+    if method in ("sobol","lhs"):
+        best_popt,_,optima=fit_seeding.two_stage_fit(model,exp,std,bounds,n_seeds=ndraws,top_k=top_k,method=method)
+        print(len(optima)," distinct optima found from the ",top_k," best initial sets")
+        return Chi2(exp,model(time,*best_popt),std,k),best_popt
     chi2=10000000 # we initialize the chi2 at a very high value
     best_popt=np.zeros(npara) 
     # we loop on the number of random draws
@@ -88,12 +100,21 @@ dose=20
 # as well as the path where are saved the mean cell densities values at each time point with their standard deviation values in a .txt file
 #path_exp="/Users/billoir/Desktop/Fichiers Thèse/Projet 1 Irradiations BB/Expériences/Données expérimentales/Averaged_curves/"+str(dose)+"_Gy_Well"+str(num_well)+"_3exps.txt"
 path_exp="/Users/billoir/Desktop/Fichiers Thèse/Projet 1 Irradiations BB/Expériences/Données expérimentales/Well"+str(num_well)+"_Incucyte_F98_20Gy_2024_09_24_smooth=35.txt"
-# we precise the interval of time in HOURS between two cell density values
+# Alternatively, the curves are read from the campaign dataset written by export_density_bulk.py (None to use path_exp),
+# in which case the condition of the plate is also needed
+DATASET_PATH=None
+condition="hypoxie"
+# we precise the interval of time in HOURS between two cell density values (with DATASET_PATH, the acquisition
+# times stored in the dataset are used instead)
 interval=1.5
 # we indicate how many random draws we wish to perform
 ndraws=int(1e4)
-# and the methods used to do the draws
+# and the methods used to do the draws: "random", "randrange", or "sobol"/"lhs" to fit only from the top_k best
+# draws of a quasi-random design (much fewer fits)
 method="random"
+top_k=16
+# number of bootstrap refits for the 95% confidence intervals of ts and tu after the fit (0 to skip them)
+n_bootstrap=0
 # we also specify the frame to which we wish to stop
 last_frame=130
 # Finally, we give two list of colors: one for the mean cell densities values and another one for the error bars. The numeration of the well
@@ -104,19 +125,26 @@ colors_std=["#DDA0DD","#00BFFF","#7FFFD4","#ADFF2F","#FFD700","#F08080"]
 # =============== INITIALIZATION =========================================================================================
 
 # we retrieve the experimental values of the inital cell density as well as the standard deviation values
-mean_celldensity=np.loadtxt(path_exp,usecols=0)[0:last_frame]
+if DATASET_PATH is None:
+    mean_celldensity=np.loadtxt(path_exp,usecols=0)[0:last_frame]
+else:
+    curve=model_dataset.load(DATASET_PATH).series(condition,dose,num_well)
+    mean_celldensity=curve["mean"][0:last_frame]
 std_celldensity=0.2*mean_celldensity            #np.loadtxt(path_exp,usecols=1)
 # we stock the value of the initial cell density in the variable C0 which will be used in the model
 C0=mean_celldensity[0]
 # we deduce the total number of frames in the experiment
 nframes=np.size(mean_celldensity)
 # we define the array of experimental time values
-time_points=(np.arange(nframes))*interval
+if DATASET_PATH is None:
+    time_points=(np.arange(nframes))*interval
+else:
+    time_points=curve["time"][0:last_frame]
 
-ind_cut=np.where(mean_celldensity<1.1e-3)[0][-1]
-mean_celldensity=mean_celldensity[0:ind_cut+1]
-std_celldensity=std_celldensity[0:ind_cut+1]
-time_points=time_points[0:ind_cut+1]
+# the curve is cut after its last point below 1.1e-3, or at the cutoff stored in the dataset (see growth_cutoff.py)
+stored_cut=curve["cutoff"] if DATASET_PATH is not None else growth_cutoff.NOT_COMPUTED
+ind_cut=growth_cutoff.curve_cutoff(mean_celldensity,stored_cut,rule="below",threshold=1.1e-3)
+time_points,mean_celldensity,std_celldensity=growth_cutoff.truncate(ind_cut,time_points,mean_celldensity,std_celldensity)
 
 # Fixed parameters
 k0=0.045
@@ -143,30 +171,15 @@ bounds=([0,0],[0.06,0.2])
 
 # =============== MODEL =========================================================================================
 
-def equa_diff(t,y,ts,tu):
-    Cd,Cr,Cs,Cu,C=y
-    kd=tr+tu-gamma
-    if t<Ta:
-        dCd=(kd/Ta)*t*C*(1-C/Cmax)
-        dCu=0
-        dCs=0
-        dCr=0
-        dC=dCd+dCr+dCu+dCs
-    if t>= Ta:
-        dCd=kd*Cd*(1-C/Cmax)-(tu+tr)*Cd
-        dCu=(tu*Cd-gamma*Cu)
-        dCs=ts*Cu
-        dCr=(k0*(1-C/Cmax)*Cr+tr*Cd)
-        dC=dCd+dCr+dCu+dCs
-    return [dCd,dCr,dCs,dCu,dC]
+# The equations (Cd, Cr, Cs, Cu, C) are in radiation_model.py. The model keeps the solutions of the last
+# parameter sets, so the compartments of the figure come from the same integration as the fit
+radiation=radiation_model.RadiationModel(time_points,C0,Ta,k0=k0,gamma=gamma,Cmax=Cmax,tr=tr)
 
 def model(t,ts,tu):
-    sol=solve_ivp(equa_diff,[time_points[0],time_points[-1]],[C0,0,0,0,C0],t_eval=time_points,args=[ts,tu],method='DOP853')
-    return sol.y[4]
+    return radiation(t,ts,tu)
 
 def subpopulations(t,ts,tu):
-    sol=solve_ivp(equa_diff,[time_points[0],time_points[-1]],[C0,0,0,0,C0],t_eval=time_points,args=[ts,tu],method='DOP853')
-    return sol.y[0],sol.y[1],sol.y[2],sol.y[3]
+    return radiation.subpopulations(ts,tu)
 
 
 
@@ -174,10 +187,17 @@ def subpopulations(t,ts,tu):
 
 #### 1- NUMERICAL RESOLUTION AND FIT ######################################
 start=time.time()
-chi2,popt=Find_best_popt(model, time_points, mean_celldensity, std_celldensity,k,bounds, ndraws,method)
+chi2,popt=Find_best_popt(radiation, time_points, mean_celldensity, std_celldensity,k,bounds, ndraws,method,top_k)
 end=time.time()
 print("Time taken = ", (end-start)/60)
 
+if n_bootstrap>0:
+    # 95% confidence intervals by residual bootstrap, each refit starting from popt. This script has no main guard,
+    # so the refits run in this process; model_uncertainty.py runs them in parallel for all the wells
+    samples=model_uncertainty.bootstrap(radiation,mean_celldensity,std_celldensity,popt,bounds,n_boot=n_bootstrap,n_workers=1)
+    for name,(low,high) in zip(radiation.param_names,model_uncertainty.percentile_interval(samples)):
+        print(name," 95% CI = [",low,",",high,"]")
+
 #popt=[tr,ts,tu]
 #popt=np.asarray([0, 1.9e-02, 	0.8e-01])
 #popt=np.asarray([3.30841570e-06,1.56032614e-02,1.11340108e-01])
@@ -2,6 +2,8 @@ import h5py
 import numpy as np
 import matplotlib.pyplot as plt
 
+import growth_cutoff
+
 # ---- 可调参数放在一起，方便修改 ----
 # 只需改一次标签，输入HDF5和输出图片名都会同步
 RUN_TAG = "1027_0.0375"
@@ -86,35 +88,34 @@ def prepare_y_values(mean_counts, variances, y_mode):
     return y, std_dev
 
 
-def maybe_truncate_curve(x_values, y_values, std_values=None):
-    """根据开关只画到 y 第一次达到 1.5e-3 的功能。"""
-    if not CUT_AT_THRESHOLD:
-        return x_values, y_values, std_values
-    hit_indices = np.where(y_values >= THRESHOLD_VALUE)[0]
-    if hit_indices.size == 0:
+def curve_cutoffs(y_curves):
+    """所有曲线一次算出截断帧（第一次达到阈值的点，未达到则画全程）；开关关闭时为 None。"""
+    if not CUT_AT_THRESHOLD or not y_curves:
+        return [None] * len(y_curves)
+    return [int(end) for end in growth_cutoff.cutoff_indices(growth_cutoff.stack(y_curves), "threshold", THRESHOLD_VALUE)]
+
+
+def maybe_truncate_curve(x_values, y_values, std_values=None, end_idx=None):
+    """根据开关只画到 y 第一次达到阈值的功能（end_idx 来自 curve_cutoffs）。"""
+    if end_idx is None:
         return x_values, y_values, std_values
-    end_idx = int(hit_indices[0])
-    if std_values is None:
-        return x_values[: end_idx + 1], y_values[: end_idx + 1], None
-    return (
-        x_values[: end_idx + 1],
-        y_values[: end_idx + 1],
-        std_values[: end_idx + 1],
-    )
+    return growth_cutoff.truncate(end_idx, x_values, y_values, std_values)
 
 
 def plot_puits_cell_counts(puits_stats, output_path, puits_concentrations=None, y_mode="count"):
     plt.figure(figsize=(15, 8))
     colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
     y_label = "Cell count" if y_mode == "count" else "Cell density (cells/µm²)"
+    prepared = [prepare_y_values(stats['mean_counts'], stats['variances'], y_mode) for stats in puits_stats.values()]
+    cutoffs = curve_cutoffs([y for y, _ in prepared])
     for i, (puits_name, stats) in enumerate(puits_stats.items()):
         n_points = len(stats['mean_counts'])
         x = np.arange(0, n_points * FRAME_INTERVAL_HOURS, FRAME_INTERVAL_HOURS)
-        y, std_dev = prepare_y_values(stats['mean_counts'], stats['variances'], y_mode)
+        y, std_dev = prepared[i]
         label_text = puits_name
         if puits_concentrations and puits_name in puits_concentrations:
             label_text = f" ({puits_concentrations[puits_name]:.2f} x10^5/ml)"
-        x_plot, y_plot, std_plot = maybe_truncate_curve(x, y, std_dev)
+        x_plot, y_plot, std_plot = maybe_truncate_curve(x, y, std_dev, cutoffs[i])
         plt.scatter(x_plot, y_plot, label=label_text, color=colors[i], marker='o', s=50, alpha=0.7)
         if std_plot is not None:
             plt.fill_between(x_plot, y_plot - std_plot, y_plot + std_plot, color=colors[i], alpha=0.1)
@@ -0,0 +1,95 @@
+# ================ DESCRIPTION ==============================================================================
+#
+# This file reunites the functions used to decide when the background of a stack has to be estimated again
+# and to store every background map in the output HDF5 file with the range of frames it was used for.
+# The background is recomputed every N frames and/or when the median of the residual (frame - background),
+# measured in units of the background rms on a subsampled grid, exceeds a tolerance. The functions are then
+# applied in our Detection_algorithm_stack.py file.
+#
+# Layout in the output file, inside the group Image{id}/background:
+#   - image: first background map (unchanged, read by the existing scripts)
+#   - maps: all background maps, shape (n_maps, Ny, Nx)
+#   - frames: for each map, the first frame and the end frame (excluded) where it was used
+#   - rms: global rms of each map
+#
+# =============== REQUIRED PACKAGES =========================================================================================
+
+import numpy as np # to use arrays
+
+# =============== FUNCTIONS =========================================================================================
+
+# Function that measures how far the current frame drifted from the background
+# Arguments:
+#   - data: image as matrix of pixels
+#   - back: background map currently used
+#   - rms: global rms of the background
+#   - step: subsampling step of the grid on which the residual is evaluated (default value to 8)
+# Output:
+#   - drift: absolute median of the residual, in units of rms
+def backgroundDrift(data,back,rms,step=8):
+    residual=data[::step,::step]-back[::step,::step]
+    return abs(float(np.median(residual)))/rms
+
+# Function that decides if the background has to be estimated again
+# Arguments:
+#   - ip: current frame
+#   - last_ip: frame where the current background was estimated
+#   - drift: value returned by backgroundDrift (only used if tol is not None)
+#   - every: number of frames after which the background is always refreshed (None to disable)
+#   - tol: tolerance on the drift above which the background is refreshed (None to disable)
+# Output:
+#   - boolean
+def needsRefresh(ip,last_ip,drift=None,every=None,tol=None):
+    if every is not None and ip-last_ip>=every:
+        return True
+    if tol is not None and drift is not None and drift>tol:
+        return True
+    return False
+
+# Function that creates the datasets storing the background maps of one stack and adds the first map
+# Arguments:
+#   - g: h5py group Image{id}/background
+#   - back: first background map
+#   - rms: global rms of the first background
+def initBackgroundMaps(g,back,rms):
+    ny,nx=back.shape
+    g.create_dataset("maps",data=back[None],maxshape=(None,ny,nx),chunks=(1,ny,nx),compression='gzip')
+    g.create_dataset("frames",data=np.array([[0,-1]]),maxshape=(None,2))
+    g.create_dataset("rms",data=np.array([rms]),maxshape=(None,))
+
+# Function that adds a new background map, valid from frame ip on
+# Arguments:
+#   - g: h5py group Image{id}/background
+#   - back: new background map
+#   - rms: global rms of the new background
+#   - ip: first frame where the new background is used
+def appendBackgroundMap(g,back,rms,ip):
+    n=g["maps"].shape[0]
+    g["frames"][n-1,1]=ip
+    for name in ("maps","frames","rms"):
+        g[name].resize(n+1,axis=0)
+    g["maps"][n]=back
+    g["frames"][n]=[ip,-1]
+    g["rms"][n]=rms
+
+# Function that closes the validity range of the last background map at the end of the stack
+# Arguments:
+#   - g: h5py group Image{id}/background
+#   - nt: number of frames of the stack
+def closeBackgroundMaps(g,nt):
+    n=g["maps"].shape[0]
+    g["frames"][n-1,1]=nt
+    g.attrs['n_maps']=n
+
+# Function that returns the background map used for a given frame
+# Arguments:
+#   - g: h5py group Image{id}/background
+#   - ip: frame
+# Output:
+#   - background map as a matrix of pixels (the first map if the stack has a single background)
+def backgroundForFrame(g,ip):
+    if "maps" not in g:
+        return g["image"][:]
+    frames=g["frames"][:]
+    k=np.where((frames[:,0]<=ip)&((frames[:,1]>ip)|(frames[:,1]<0)))[0]
+    return g["maps"][int(k[-1]) if k.size else 0]
@@ -0,0 +1,198 @@
+"""
+Micro-benchmark of the detection pipeline on synthetic fluorescent stacks.
+
+Synthetic frames have the Incucyte size (1408x1040) and contain Gaussian spots
+at known positions on top of a background gradient and Gaussian noise. Each
+case (density, noise, gradient) is written to a temporary BigTIFF and run
+through the same functions as Detection_algorithm_stack.py, timing every stage
+separately:
+    read -> background -> LoG -> threshold -> label -> maxima -> write
+
+For each case the report gives the time per stage, the frames/sec of the whole
+pipeline, the peak RSS of the process and the recall/precision of the
+detections against the ground truth positions (one-to-one matching within
+MATCH_RADIUS pixels). Results are printed and saved as JSON so that runs can be
+compared over time.
+
+Note: frames are read with tifffile; bioformats (used in production) needs a
+JVM and is not part of the benchmark.
+"""
+
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from itertools import product
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import sep
+import tifffile
+
+import Find_Local_Maxima as findMax
+from cell_tracking import link_frames
+
+
+# ------- Configuration -------
+IMAGE_WIDTH_PX = 1408
+IMAGE_HEIGHT_PX = 1040
+N_FRAMES = 10  # Frames per synthetic stack
+DENSITIES = [500, 2000, 5000]  # Cells per frame
+NOISE_LEVELS = [5.0]  # Std of the Gaussian noise (grey levels)
+GRADIENTS = [0.0, 50.0]  # Background increase (grey levels) from left to right
+BACKGROUND_LEVEL = 100.0
+SPOT_AMPLITUDE = 60.0
+SPOT_SIGMA = 3.0  # Spot radius (pixels)
+SEED = 0
+
+# Detection parameters (same meaning as in Detection_algorithm_stack.py)
+BACKGROUND_WINDOW = 256
+LOG_SIGMA = 3.5
+LOG_THRESHOLD = 0.0375
+BLOB_MIN_PIXELS = 30
+BLOB_MAX_PIXELS = None
+
+MATCH_RADIUS = 4.0  # Max distance (pixels) between a detection and its ground truth cell
+OUTPUT_JSON = "./benchmark_detection.json"
+
+STAGES = ["read", "background", "log", "threshold", "label", "maxima", "write"]
+
+
+def synthetic_frame(
+    rng: np.random.Generator,
+    n_cells: int,
+    noise: float,
+    gradient: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return one synthetic frame and the (n, 2) x/y ground truth positions."""
+    ny, nx = IMAGE_HEIGHT_PX, IMAGE_WIDTH_PX
+    r = int(np.ceil(4 * SPOT_SIGMA))
+    margin = r + 1
+    truth = rng.uniform([margin, margin], [nx - margin, ny - margin], size=(n_cells, 2))
+
+    img = BACKGROUND_LEVEL + gradient * np.linspace(0.0, 1.0, nx)[None, :] * np.ones((ny, 1))
+    # splat every spot on a small patch around its position
+    dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+    cx = np.round(truth[:, 0]).astype(int)
+    cy = np.round(truth[:, 1]).astype(int)
+    px = cx[:, None, None] + dx[None]
+    py = cy[:, None, None] + dy[None]
+    d2 = (px - truth[:, 0, None, None]) ** 2 + (py - truth[:, 1, None, None]) ** 2
+    np.add.at(img, (py.ravel(), px.ravel()), (SPOT_AMPLITUDE * np.exp(-d2 / (2 * SPOT_SIGMA ** 2))).ravel())
+    img += rng.normal(0.0, noise, size=img.shape)
+    return img.astype(np.float32), truth
+
+
+def write_synthetic_stack(path: str, rng: np.random.Generator, n_cells: int, noise: float, gradient: float) -> List[np.ndarray]:
+    """Write a synthetic BigTIFF stack and return the ground truth of every frame."""
+    truths = []
+    with tifffile.TiffWriter(path, bigtiff=True) as tif:
+        for _ in range(N_FRAMES):
+            img, truth = synthetic_frame(rng, n_cells, noise, gradient)
+            tif.write(img)
+            truths.append(truth)
+    return truths
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of the process (ru_maxrss is in bytes on macOS, kB on Linux)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
+
+
+def run_case(tmp_dir: str, rng: np.random.Generator, n_cells: int, noise: float, gradient: float) -> Dict:
+    """Run the pipeline on one synthetic stack and return the timings and scores."""
+    stack_path = os.path.join(tmp_dir, "stack.tif")
+    out_path = os.path.join(tmp_dir, "output.hdf5")
+    truths = write_synthetic_stack(stack_path, rng, n_cells, noise, gradient)
+
+    times = {name: [] for name in STAGES}
+    n_true = n_found = n_matched = 0
+    with tifffile.TiffFile(stack_path) as tif, pd.HDFStore(out_path, "w") as store:
+        for ip in range(N_FRAMES):
+            t0 = time.perf_counter()
+            data = tif.pages[ip].asarray().astype(np.float64)
+            t1 = time.perf_counter()
+            if ip == 0:
+                bkg = sep.Background(data, bw=BACKGROUND_WINDOW, bh=BACKGROUND_WINDOW)
+                back = bkg.back()
+            snr = (data - back) / bkg.globalrms
+            t2 = time.perf_counter()
+            lap = findMax.LoG(snr, LOG_SIGMA)
+            t3 = time.perf_counter()
+            y_t, img_t = findMax.thresholdMap(lap, LOG_THRESHOLD)
+            t4 = time.perf_counter()
+            markers = findMax.labelBlobs(img_t)
+            blobs = findMax.selectBlobs(markers, y_t, ccmin=BLOB_MIN_PIXELS, ccmax=BLOB_MAX_PIXELS)
+            t5 = time.perf_counter()
+            pos = findMax.findMax(blobs, data.shape)
+            t6 = time.perf_counter()
+            pos.to_hdf(store, key=f"Imagebench/frame{ip}")
+            t7 = time.perf_counter()
+            for name, dt in zip(STAGES, np.diff([t0, t1, t2, t3, t4, t5, t6, t7])):
+                times[name].append(dt)
+
+            ia, _ = link_frames(truths[ip], pos[["x", "y"]].to_numpy(dtype=float), MATCH_RADIUS)
+            n_true += len(truths[ip])
+            n_found += len(pos)
+            n_matched += ia.size
+
+    total = float(np.sum([np.sum(v) for v in times.values()]))
+    return {
+        "cells_per_frame": n_cells,
+        "noise": noise,
+        "gradient": gradient,
+        "frames": N_FRAMES,
+        "frames_per_sec": N_FRAMES / total,
+        "stages": {
+            name: {"total_s": float(np.sum(v)), "mean_ms": 1e3 * float(np.mean(v)), "median_ms": 1e3 * float(np.median(v))}
+            for name, v in times.items()
+        },
+        "recall": n_matched / n_true if n_true else float("nan"),
+        "precision": n_matched / n_found if n_found else float("nan"),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main() -> None:
+    rng = np.random.default_rng(SEED)
+    report = {
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "config": {
+            "image_size": [IMAGE_WIDTH_PX, IMAGE_HEIGHT_PX],
+            "spot_sigma": SPOT_SIGMA,
+            "spot_amplitude": SPOT_AMPLITUDE,
+            "background_window": BACKGROUND_WINDOW,
+            "sigma": LOG_SIGMA,
+            "seuil": LOG_THRESHOLD,
+            "ccmin": BLOB_MIN_PIXELS,
+            "ccmax": BLOB_MAX_PIXELS,
+            "match_radius": MATCH_RADIUS,
+        },
+        "cases": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_cells, noise, gradient in product(DENSITIES, NOISE_LEVELS, GRADIENTS):
+            case = run_case(tmp_dir, rng, n_cells, noise, gradient)
+            report["cases"].append(case)
+            stages = " ".join(f"{name}={case['stages'][name]['mean_ms']:.1f}ms" for name in STAGES)
+            print(
+                f"cells={n_cells} noise={noise} gradient={gradient}: {case['frames_per_sec']:.2f} frames/s, "
+                f"recall={case['recall']:.3f} precision={case['precision']:.3f}, "
+                f"peak RSS={case['peak_rss_mb']:.0f} MB\n    {stages}"
+            )
+
+    with open(OUTPUT_JSON, "w") as fp:
+        json.dump(report, fp, indent=2)
+    print(f"Saved benchmark report to: {OUTPUT_JSON}")
+
+
+if __name__ == "__main__":
+    main()
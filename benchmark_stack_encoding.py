@@ -0,0 +1,167 @@
+"""
+Benchmark of the stack encodings of make_stack_temps_en.py against the read
+throughput of the detection.
+
+A stack (SAMPLE_STACK, or synthetic uint16 frames as in benchmark_detection.py
+when it is None) is rewritten once per encoding of ENCODINGS into a temporary
+directory, as make_stack_temps_en.py writes it (one OME-TIFF series with the
+acquisition times when EMBED_TIMES is set, one page per write otherwise). For
+each encoding the report gives the file size and compression ratio, the write
+time, and the time to read and decode every page the way the detection does
+(one page after the other).
+
+Reads come from the local page cache, so they measure the decoding cost only.
+For NAS-backed runs the time of one frame is estimated as
+    transfer (compressed bytes / NAS_BANDWIDTH_MBPS) + decoding,
+and compared with DETECTION_MS_PER_FRAME (the compute time of one frame, see
+benchmark_detection.py): when the estimated read time is below it, reading is
+hidden by the detection with PREFETCH_DEPTH > 0.
+
+Encodings whose codec is missing (zstd/lzw need the imagecodecs package) are
+reported as unavailable.
+"""
+
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+import tifffile
+
+import time_axes
+from benchmark_detection import synthetic_frame
+
+
+# ------- Configuration -------
+SAMPLE_STACK = None  # e.g. "./results 141125/stack rouge 1031/B3-7-C2_stack.tif"; None uses synthetic frames
+N_FRAMES = 20  # Frames taken from the sample stack (or generated)
+N_CELLS = 2000  # Cells per synthetic frame
+NOISE = 5.0  # Noise of the synthetic frames (grey levels)
+SEED = 0
+EMBED_TIMES = True  # Write the stacks as OME-TIFF series with acquisition times (embed_times of make_stack_temps_en.py)
+
+ENCODINGS = [
+    {"name": "none"},
+    {"name": "tiled", "tile": (256, 256)},
+    {"name": "deflate", "compression": "deflate", "predictor": True},
+    {"name": "deflate-tiled", "compression": "deflate", "predictor": True, "tile": (256, 256)},
+    {"name": "lzw", "compression": "lzw", "predictor": True},
+    {"name": "zstd", "compression": "zstd", "predictor": True, "level": 3},
+    {"name": "zstd-tiled", "compression": "zstd", "predictor": True, "level": 3, "tile": (256, 256)},
+]
+COMPRESSION_THREADS = [1, 4]  # Values of compression_threads tried for the compressed encodings
+
+NAS_BANDWIDTH_MBPS = 100.0  # Effective network bandwidth to the NAS (MB/s)
+DETECTION_MS_PER_FRAME = 250.0  # Compute time of one frame without reading
+OUTPUT_JSON = "./benchmark_stack_encoding.json"
+
+
+def load_frames() -> List[np.ndarray]:
+    """Frames of the sample stack, or synthetic uint16 frames."""
+    if SAMPLE_STACK is not None:
+        with tifffile.TiffFile(SAMPLE_STACK) as tif:
+            return [tif.pages[i].asarray() for i in range(min(N_FRAMES, len(tif.pages)))]
+    rng = np.random.default_rng(SEED)
+    return [np.clip(synthetic_frame(rng, N_CELLS, NOISE, 0.0)[0], 0, 65535).astype(np.uint16) for _ in range(N_FRAMES)]
+
+
+def write_options(encoding: Dict, threads: int) -> Dict:
+    """Keyword arguments of tif.write, as built by make_stack_temps_en.py."""
+    options = {}
+    if encoding.get("compression") is not None:
+        options["compression"] = encoding["compression"]
+        options["predictor"] = encoding.get("predictor", True)
+        options["maxworkers"] = threads
+        if encoding.get("level") is not None:
+            options["compressionargs"] = {"level": encoding["level"]}
+    if encoding.get("tile") is not None:
+        options["tile"] = encoding["tile"]
+    return options
+
+
+def run_encoding(path: str, frames: List[np.ndarray], encoding: Dict, threads: int) -> Optional[Dict]:
+    """Write and read back one stack; None if the codec is not available."""
+    options = write_options(encoding, threads)
+    t0 = time.perf_counter()
+    try:
+        if EMBED_TIMES:
+            times = [datetime(2025, 1, 1) + timedelta(hours=1.5 * i) for i in range(len(frames))]
+            metadata = time_axes.ome_metadata(times[0], times, "benchmark")
+            time_axes.write_ome_series(path, iter(frames), len(frames), frames[0], metadata, **options)
+        else:
+            with tifffile.TiffWriter(path, bigtiff=True) as tif:
+                for img in frames:
+                    tif.write(img, **options)
+    except (ValueError, ImportError, NotImplementedError, KeyError) as exc:
+        print(f"{encoding['name']}: unavailable ({exc})")
+        return None
+    t_write = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    pages = []
+    with tifffile.TiffFile(path) as tif:
+        for ip in range(len(frames)):
+            pages.append(tif.pages[ip].asarray())
+        n_series = len(tif.series)
+    t_read = time.perf_counter() - t0
+    assert all(np.array_equal(page, img) for page, img in zip(pages, frames)), "encoding is not lossless"
+    assert not EMBED_TIMES or n_series == 1, "the frames are not written as one series"
+
+    n = len(frames)
+    size = os.path.getsize(path)
+    raw = sum(img.nbytes for img in frames)
+    decode_ms = 1e3 * t_read / n
+    nas_ms = 1e3 * size / n / (NAS_BANDWIDTH_MBPS * 1e6) + decode_ms
+    return {
+        "encoding": encoding["name"],
+        "threads": threads,
+        "size_mb": size / 1e6,
+        "ratio": raw / size,
+        "write_ms_per_frame": 1e3 * t_write / n,
+        "decode_ms_per_frame": decode_ms,
+        "decode_mb_per_s": raw / 1e6 / t_read,
+        "nas_read_ms_per_frame": nas_ms,
+        "hidden_by_detection": nas_ms < DETECTION_MS_PER_FRAME,
+    }
+
+
+def main() -> None:
+    frames = load_frames()
+    report = {
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "platform": platform.platform(),
+        "tifffile": tifffile.__version__,
+        "config": {
+            "sample_stack": SAMPLE_STACK,
+            "frames": len(frames),
+            "frame_shape": list(frames[0].shape),
+            "dtype": str(frames[0].dtype),
+            "nas_bandwidth_mbps": NAS_BANDWIDTH_MBPS,
+            "detection_ms_per_frame": DETECTION_MS_PER_FRAME,
+        },
+        "cases": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for encoding in ENCODINGS:
+            for threads in (COMPRESSION_THREADS if encoding.get("compression") else [1]):
+                case = run_encoding(os.path.join(tmp_dir, "stack.tif"), frames, encoding, threads)
+                if case is None:
+                    break
+                report["cases"].append(case)
+                print(
+                    f"{case['encoding']:>14} threads={threads}: {case['size_mb']:.1f} MB (x{case['ratio']:.2f}), "
+                    f"write {case['write_ms_per_frame']:.1f} ms/frame, decode {case['decode_ms_per_frame']:.1f} ms/frame "
+                    f"({case['decode_mb_per_s']:.0f} MB/s), NAS read ~{case['nas_read_ms_per_frame']:.1f} ms/frame"
+                )
+
+    with open(OUTPUT_JSON, "w") as fp:
+        json.dump(report, fp, indent=2)
+    print(f"Saved benchmark report to: {OUTPUT_JSON}")
+
+
+if __name__ == "__main__":
+    main()
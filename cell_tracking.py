@@ -0,0 +1,196 @@
+"""
+Link cell detections across consecutive frames into tracks.
+
+Input: a detection HDF5 written by Detection_algorithm_stack.py, with one
+pandas dataframe (columns "x", "y") per key "Image{id}/frame{n}".
+
+For every pair of consecutive frames, candidate links are gated with a KD-tree
+(only pairs closer than MAX_LINK_DISTANCE pixels are considered). The gating
+graph is split into connected components: components made of a single link
+are accepted directly, the ambiguous ones are solved with a linear assignment
+(Hungarian) on the distances. Detections left unmatched in the next frame
+start a new track (birth); when a tracked cell of the previous frame lies
+within DIVISION_DISTANCE, it is recorded as the parent (division). Tracks whose
+last detection finds no match end there (death / cell loss).
+
+Output (one group per stack, same "Image{id}" names as the input):
+    - Image{id}/tracks: one row per detection (frame, x, y, track)
+    - Image{id}/lineage: one row per track (track, start, end, length, parent)
+      with parent = -1 when the track did not come from a division.
+
+Stacks are independent, so they are processed in parallel (one stack per
+worker process).
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import h5py
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from detections_parquet import read_frame_table
+
+
+# ------- Configuration -------
+HDF5_PATH = "./results 141125/output_file_1031_0.0375.hdf5"
+OUTPUT_PATH = "./results 141125/tracks_1031_0.0375.hdf5"
+MAX_LINK_DISTANCE = 15.0  # Gating radius (pixels) between two consecutive frames
+DIVISION_DISTANCE = 20.0  # Radius (pixels) to look for the mother of a newborn track
+N_WORKERS = 4  # Number of stacks tracked in parallel
+
+NO_PARENT = -1
+
+
+def list_frames(group: h5py.Group) -> List[str]:
+    """Return the frame keys of one image group sorted by frame number."""
+    frames = [name for name in group.keys() if name.startswith("frame")]
+    return sorted(frames, key=lambda name: int(name[len("frame"):]))
+
+
+def read_frame_positions(frame_group: h5py.Group) -> np.ndarray:
+    """Read the (n, 2) x/y array of one pandas fixed-format frame with h5py; (0, 2) for a frame without cells."""
+    columns = read_frame_table(frame_group)
+    if "x" not in columns or "y" not in columns:
+        raise KeyError(f"no x/y columns in {frame_group.name}")
+    return np.column_stack([columns["x"], columns["y"]]).astype(float)
+
+
+def read_stack_positions(hdf5_path: str, image_group: str) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """Return the frame numbers and the list of per-frame positions of one stack."""
+    with h5py.File(hdf5_path, "r") as f:
+        group = f[image_group]
+        names = list_frames(group)
+        frames = np.array([int(name[len("frame"):]) for name in names], dtype=int)
+        positions = [read_frame_positions(group[name]) for name in names]
+    return frames, positions
+
+
+def link_frames(a: np.ndarray, b: np.ndarray, max_distance: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Match the detections of two consecutive frames.
+
+    Returns the indices (ia, ib) of the matched pairs. Each detection is used at
+    most once and no pair is farther apart than max_distance.
+    """
+    empty = np.empty(0, dtype=int)
+    if len(a) == 0 or len(b) == 0:
+        return empty, empty
+    pairs = cKDTree(a).sparse_distance_matrix(cKDTree(b), max_distance, output_type="ndarray")
+    if pairs.size == 0:
+        return empty, empty
+    ia, ib, dist = pairs["i"].astype(int), pairs["j"].astype(int), pairs["v"]
+
+    # split the gating graph into independent sub-problems
+    na = len(a)
+    graph = coo_matrix((np.ones(ia.size), (ia, na + ib)), shape=(na + len(b), na + len(b)))
+    _, labels = connected_components(graph, directed=False)
+    comp = labels[ia]
+    order = np.argsort(comp, kind="stable")
+    ia, ib, dist, comp = ia[order], ib[order], dist[order], comp[order]
+    starts = np.flatnonzero(np.r_[True, comp[1:] != comp[:-1]])
+    sizes = np.diff(np.r_[starts, comp.size])
+
+    # unambiguous components: a single candidate link
+    single = starts[sizes == 1]
+    match_a, match_b = [ia[single]], [ib[single]]
+
+    # ambiguous components: linear assignment on the gated distances
+    for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+        sa, sb, sd = ia[start:start + size], ib[start:start + size], dist[start:start + size]
+        ua, ra = np.unique(sa, return_inverse=True)
+        ub, rb = np.unique(sb, return_inverse=True)
+        cost = np.full((ua.size, ub.size), 2.0 * max_distance + 1.0)
+        cost[ra, rb] = sd
+        rows, cols = linear_sum_assignment(cost)
+        keep = cost[rows, cols] <= max_distance
+        match_a.append(ua[rows[keep]])
+        match_b.append(ub[cols[keep]])
+    return np.concatenate(match_a), np.concatenate(match_b)
+
+
+def track_positions(
+    frames: np.ndarray,
+    positions: List[np.ndarray],
+    max_distance: float = MAX_LINK_DISTANCE,
+    division_distance: float = DIVISION_DISTANCE,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Build the track and lineage tables from per-frame positions."""
+    if not positions:
+        tracks = pd.DataFrame({"frame": np.empty(0, np.int32), "x": np.empty(0, np.float32),
+                               "y": np.empty(0, np.float32), "track": np.empty(0, np.int32)})
+        return tracks, lineage_table(tracks, {})
+
+    ids = [np.arange(len(positions[0]))]
+    next_id = len(positions[0])
+    parents = {}
+    for t in range(1, len(positions)):
+        a, b = positions[t - 1], positions[t]
+        ia, ib = link_frames(a, b, max_distance)
+        current = np.full(len(b), NO_PARENT, dtype=int)
+        current[ib] = ids[-1][ia]
+        newborn = np.flatnonzero(current == NO_PARENT)
+        current[newborn] = next_id + np.arange(newborn.size)
+        next_id += newborn.size
+        # a newborn close to a cell that kept its track is the daughter of a division
+        if newborn.size and ia.size:
+            dist, nearest = cKDTree(a[ia]).query(b[newborn], distance_upper_bound=division_distance)
+            found = np.isfinite(dist)
+            for child, mother in zip(current[newborn[found]], ids[-1][ia[nearest[found]]]):
+                parents[int(child)] = int(mother)
+        ids.append(current)
+
+    counts = [len(p) for p in positions]
+    tracks = pd.DataFrame({
+        "frame": np.repeat(frames, counts).astype(np.int32),
+        "x": np.concatenate([p[:, 0] for p in positions]).astype(np.float32),
+        "y": np.concatenate([p[:, 1] for p in positions]).astype(np.float32),
+        "track": np.concatenate(ids).astype(np.int32),
+    })
+    return tracks, lineage_table(tracks, parents)
+
+
+def lineage_table(tracks: pd.DataFrame, parents: dict) -> pd.DataFrame:
+    """Summarise each track: first/last frame, number of detections and parent track."""
+    lineage = tracks.groupby("track").agg(start=("frame", "min"), end=("frame", "max"), length=("frame", "size"))
+    lineage = lineage.reset_index().astype(np.int32)
+    lineage["parent"] = lineage["track"].map(parents).fillna(NO_PARENT).astype(np.int32)
+    return lineage
+
+
+def track_stack(hdf5_path: str, image_group: str, max_distance: float, division_distance: float):
+    """Worker: read and track one stack."""
+    frames, positions = read_stack_positions(hdf5_path, image_group)
+    tracks, lineage = track_positions(frames, positions, max_distance, division_distance)
+    return image_group, tracks, lineage
+
+
+def main() -> None:
+    with h5py.File(HDF5_PATH, "r") as f:
+        image_groups = [name for name in f.keys() if name.startswith("Image")]
+
+    with ProcessPoolExecutor(max_workers=N_WORKERS) as pool:
+        jobs = [
+            pool.submit(track_stack, HDF5_PATH, g, MAX_LINK_DISTANCE, DIVISION_DISTANCE)
+            for g in image_groups
+        ]
+        with pd.HDFStore(OUTPUT_PATH, "w", complevel=5, complib="blosc") as store:
+            for job in jobs:
+                image_group, tracks, lineage = job.result()
+                store.put(f"{image_group}/tracks", tracks)
+                store.put(f"{image_group}/lineage", lineage)
+                divisions = int((lineage["parent"] != NO_PARENT).sum())
+                print(f"{image_group}: {len(lineage)} tracks, {divisions} divisions")
+
+    with h5py.File(OUTPUT_PATH, "a") as f:
+        f.attrs["source"] = HDF5_PATH
+        f.attrs["max_link_distance"] = MAX_LINK_DISTANCE
+        f.attrs["division_distance"] = DIVISION_DISTANCE
+    print(f"Saved tracks to: {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Base class of the growth/radiation ODE models: one integration and caching backend for all of them.
+
+A model declares
+    name          key in the registry (model_registry.py)
+    state_names   state vector of the ODE; the last one is the observed density C
+    param_names   fitted parameters, in the order of rhs and of curve_fit
+    bounds        (lower, upper) of the fitted parameters
+    dose_parameters  fixed parameters set from the dose by for_dose (e.g. Ta), if any
+and implements rhs(t, y, *params) and, if the state is not (C0, 0, ..., 0),
+initial_state(). The fixed parameters are attributes set in __init__.
+
+solve(*params) integrates the ODE at the time points (solve_ivp, DOP853 by
+default) and keeps the last CACHE_SIZE solutions (LRU), so the fit, the
+figures and repeated evaluations (warm starts, profiles, screening) share
+them. The object is picklable without its cache, to be sent to worker
+processes (model_uncertainty.py, fit_seeding.py, model_selection.py).
+"""
+
+import copy
+from collections import OrderedDict
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+from scipy.integrate import solve_ivp
+
+
+CACHE_SIZE = 4096
+
+
+class CompartmentModel:
+    """Density C(t) of one well as the last state of an ODE system."""
+
+    name = ""
+    state_names: Tuple[str, ...] = ("C",)
+    param_names: Tuple[str, ...] = ()
+    bounds: Tuple[Sequence[float], Sequence[float]] = ((), ())
+    dose_parameters: Tuple[str, ...] = ()
+
+    def __init__(self, time_points: Sequence[float], C0: float, method: str = "DOP853"):
+        self.time_points = np.asarray(time_points, dtype=float)
+        self.C0 = float(C0)
+        self.method = method
+        self._cache = OrderedDict()
+
+    @classmethod
+    def for_dose(cls, time_points: Sequence[float], C0: float, dose: float, **fixed) -> "CompartmentModel":
+        """Model of a well irradiated at dose (Gy); models without dose-dependent parameters ignore it."""
+        return cls(time_points, C0, **fixed)
+
+    def __getstate__(self) -> Dict:
+        # the cache is not sent to worker processes
+        state = self.__dict__.copy()
+        state["_cache"] = OrderedDict()
+        return state
+
+    def initial_state(self) -> Sequence[float]:
+        """C0 in the first compartment and in C, the other compartments empty."""
+        if len(self.state_names) == 1:
+            return [self.C0]
+        return [self.C0] + [0.0] * (len(self.state_names) - 2) + [self.C0]
+
+    def rhs(self, t, y, *params):
+        raise NotImplementedError
+
+    def solve(self, *params) -> np.ndarray:
+        """All states at the time points, shape (n_states, n); NaN if the integration failed."""
+        key = tuple(float(p) for p in params)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        t = self.time_points
+        n_states = len(self.state_names)
+        sol = solve_ivp(self.rhs, [t[0], t[-1]], self.initial_state(), t_eval=t, args=key, method=self.method)
+        y = sol.y
+        if y.shape[1] != t.size:
+            # failed integration: NaN so that the fit rejects these parameters
+            y = np.full((n_states, t.size), np.nan)
+        self._cache[key] = y
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return y
+
+    def __call__(self, t, *params) -> np.ndarray:
+        """Density C at the model time points (t is only there for curve_fit)."""
+        return self.solve(*params)[-1]
+
+    def states(self, *params) -> Dict[str, np.ndarray]:
+        return dict(zip(self.state_names, self.solve(*params)))
+
+    def with_time_points(self, time_points: Sequence[float], C0: float = None) -> "CompartmentModel":
+        """Same fixed parameters, other time points (and initial density)."""
+        other = copy.copy(self)
+        other.time_points = np.asarray(time_points, dtype=float)
+        if C0 is not None:
+            other.C0 = float(C0)
+        other._cache = OrderedDict()
+        return other
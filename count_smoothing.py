@@ -0,0 +1,139 @@
+"""
+Smoothing of the cell count time series, applied to the whole count matrix at once.
+
+The txt files given to the model are named "..._smooth=35", but the smoothing
+itself was done by hand outside of the repository. Here it is a step of the
+export (export_density_bulk.py, SMOOTHING): the count matrix of a detection
+file (one row per Image{well}-{position}-{channel} group, one column per
+frame, NaN for missing frames) is smoothed along the frames before the
+per-well mean/std are computed.
+
+Methods (smooth(counts, method, **params)):
+    "savgol"   Savitzky-Golay filter (scipy.signal.savgol_filter), window frames, polynomial order polyorder
+    "median"   rolling median over window frames (scipy.ndimage.median_filter)
+    "lowess"   LOWESS with a fraction frac of the points of each series (needs statsmodels)
+"savgol" and "median" process every row in one call. Missing frames inside a
+series are interpolated before filtering and set back to NaN afterwards;
+frames before the first / after the last valid frame stay NaN.
+
+Results are cached per (matrix, method, parameters): in memory for the
+current process, and as .npy files in CACHE_DIR if it is set, so re-running
+an export with the same parameters does not filter again.
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+from scipy.ndimage import median_filter
+from scipy.signal import savgol_filter
+
+import time_axes
+
+try:
+    from statsmodels.nonparametric.smoothers_lowess import lowess
+except ImportError:  # optional, only for method="lowess"
+    lowess = None
+
+
+# ------- Configuration -------
+DEFAULT_PARAMS = {
+    "savgol": {"window": 35, "polyorder": 2},
+    "median": {"window": 5},
+    "lowess": {"frac": 0.2},
+}
+CACHE_DIR = None  # e.g. "./smoothing cache"; None keeps the results in memory only
+MEMORY_ENTRIES = 32  # Smoothed matrices kept in memory
+
+
+_memory = OrderedDict()
+
+
+def describe(method: str, **params) -> str:
+    """Short tag of a parameter set for file names, e.g. "savgol_p2_w35"."""
+    params = {**DEFAULT_PARAMS.get(method, {}), **params}
+    short = {"window": "w", "polyorder": "p", "frac": "f"}
+    return "_".join([method] + [f"{short.get(k, k)}{v:g}" for k, v in sorted(params.items())])
+
+
+def _fill_gaps(counts: np.ndarray) -> np.ndarray:
+    """Interpolate the missing frames inside each series; edges take the nearest valid value."""
+    n_frames = counts.shape[1]
+    frames = np.arange(n_frames, dtype=float)
+    filled = time_axes.resample(frames, counts, frames)
+    valid = ~np.isnan(filled)
+    has_valid = valid.any(axis=1)
+    first = np.where(has_valid, valid.argmax(axis=1), 0)
+    last = np.where(has_valid, n_frames - 1 - valid[:, ::-1].argmax(axis=1), 0)
+    # nearest valid value before the first / after the last valid frame
+    rows = np.arange(counts.shape[0])
+    before = frames[None, :] < first[:, None]
+    after = frames[None, :] > last[:, None]
+    filled = np.where(before, filled[rows, first][:, None], filled)
+    filled = np.where(after, filled[rows, last][:, None], filled)
+    return np.where(has_valid[:, None], filled, 0.0)
+
+
+def _smooth(counts: np.ndarray, method: str, params: Dict) -> np.ndarray:
+    missing = np.isnan(counts)
+    if missing.all():
+        return counts.copy()
+    filled = _fill_gaps(counts)
+    n_frames = counts.shape[1]
+    if method == "savgol":
+        window = int(params["window"]) | 1  # odd
+        window = min(window, n_frames if n_frames % 2 else n_frames - 1)  # not longer than the series
+        if window <= params["polyorder"]:
+            return counts.copy()
+        out = savgol_filter(filled, window, int(params["polyorder"]), axis=1, mode="interp")
+    elif method == "median":
+        out = median_filter(filled, size=(1, int(params["window"])), mode="nearest")
+    elif method == "lowess":
+        if lowess is None:
+            raise ImportError("method='lowess' needs statsmodels")
+        frames = np.arange(n_frames, dtype=float)
+        out = np.vstack([
+            lowess(row, frames, frac=float(params["frac"]), return_sorted=False) for row in filled
+        ])
+    else:
+        raise ValueError(f"unknown smoothing method: {method}")
+    return np.where(missing, np.nan, out)
+
+
+def _key(counts: np.ndarray, method: str, params: Dict) -> str:
+    h = hashlib.sha256()
+    h.update(f"{counts.dtype.str}{counts.shape}".encode())
+    h.update(np.ascontiguousarray(counts).tobytes())
+    h.update(json.dumps({"method": method, **params}, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def smooth(counts: np.ndarray, method: Optional[str] = "savgol", cache_dir: Optional[str] = None, **params) -> np.ndarray:
+    """Smoothed copy of the (n_series, n_frames) count matrix; method None returns it unchanged.
+
+    cache_dir None uses the module setting CACHE_DIR at call time.
+    """
+    if method is None:
+        return counts
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    counts = np.atleast_2d(np.asarray(counts, dtype=float))
+    params = {**DEFAULT_PARAMS.get(method, {}), **params}
+    key = _key(counts, method, params)
+    if key in _memory:
+        _memory.move_to_end(key)
+        return _memory[key].copy()
+    path = os.path.join(cache_dir, f"{describe(method, **params)}_{key[:16]}.npy") if cache_dir is not None else None
+    if path is not None and os.path.isfile(path):
+        out = np.load(path)
+    else:
+        out = _smooth(counts, method, params)
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(path, out)
+    _memory[key] = out
+    if len(_memory) > MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+    return out.copy()
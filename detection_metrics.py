@@ -0,0 +1,163 @@
+"""
+Per-stage timing and counters for the detection loop (Detection_algorithm_stack.py).
+
+RunMetrics records, for every frame, the wall time of each stage (read,
+background, LoG, labelling, maxima, write), the number of connected components
+and of local maxima, and the bytes read from the stacks and written to the
+output file. Records are appended as JSON lines to a metrics file while the run
+goes on, each frame record being flushed as soon as the frame is done (so a
+slow or stuck plate can be inspected live, e.g. tail -f), and a summary with
+per-stage wall-time histograms is appended when the run ends:
+
+    {"event": "frame", "image": ..., "frame": ..., "stages_ms": {...}, "components": ..., "maxima": ...}
+    {"event": "stack", "image": ..., "frames": ..., "seconds": ..., "bytes_written": ...}
+    {"event": "summary", "stages": {name: {"total_s", "mean_ms", "p50_ms", "p95_ms", "max_ms", "histogram"}}, ...}
+
+When the metrics file is None every call returns immediately (stage() hands
+back a shared no-op context manager), so the overhead of a disabled run is a
+few attribute look-ups per stage.
+
+start_profile(path)/stop_profile(...) wrap the run in cProfile and dump the
+statistics to path (open them with pstats or snakeviz). To sample with py-spy instead, leave it to
+None and attach to the pid printed by RunMetrics: py-spy record --pid <pid>.
+"""
+
+import cProfile
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Optional
+
+import numpy as np
+
+
+_NO_STAGE = nullcontext()
+# log-spaced bin edges for the wall-time histograms: 10 µs .. 100 s
+HISTOGRAM_EDGES_S = np.logspace(-5, 2, 29)
+
+
+class _Stage:
+    """Context manager adding its wall time to one stage of the current frame."""
+
+    __slots__ = ("metrics", "name", "t0")
+
+    def __init__(self, metrics: "RunMetrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dt = time.perf_counter() - self.t0
+        self.metrics.durations[self.name].append(dt)
+        self.metrics.current[self.name] = self.metrics.current.get(self.name, 0.0) + dt
+        return False
+
+
+class RunMetrics:
+    """Collect stage timings and counters of one detection run."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.enabled = path is not None
+        self.path = path
+        self.durations = defaultdict(list)
+        self.counters = defaultdict(int)
+        self.current = {}
+        self.t_start = time.perf_counter()
+        self._log = None
+        if self.enabled:
+            self._log = open(path, "w")
+            self._write({"event": "start", "pid": os.getpid(), "date": time.strftime("%Y-%m-%d %H:%M:%S")})
+            print(f"metrics -> {path} (pid {os.getpid()})")
+
+    def _write(self, record: dict) -> None:
+        self._log.write(json.dumps(record) + "\n")
+
+    def stage(self, name: str):
+        """Return a context manager timing one stage of the current frame."""
+        if not self.enabled:
+            return _NO_STAGE
+        return _Stage(self, name)
+
+    def add(self, name: str, value: int) -> None:
+        """Increase a run counter (e.g. bytes_read)."""
+        if self.enabled:
+            self.counters[name] += int(value)
+
+    def frame(self, image: str, ip: int, **counts) -> None:
+        """Close the current frame: log its stage times and counts."""
+        if not self.enabled:
+            return
+        record = {"event": "frame", "image": image, "frame": ip,
+                  "stages_ms": {name: 1e3 * dt for name, dt in self.current.items()}}
+        record.update({name: int(value) for name, value in counts.items()})
+        for name, value in counts.items():
+            self.counters[name] += int(value)
+        self.counters["frames"] += 1
+        self._write(record)
+        # flushed at every frame (one write per frame, negligible next to the detection) so that the
+        # frames of a stack that is still running, or stuck, are already in the file
+        self._log.flush()
+        self.current = {}
+
+    def stack(self, image: str, nframes: int, seconds: float, bytes_written: int) -> None:
+        """Log the end of one stack."""
+        if not self.enabled:
+            return
+        self.counters["bytes_written"] += int(bytes_written)
+        self._write({"event": "stack", "image": image, "frames": nframes,
+                     "seconds": seconds, "bytes_written": int(bytes_written)})
+        self._log.flush()
+
+    def summary(self) -> dict:
+        """Per-stage statistics and histograms, and run counters."""
+        stages = {}
+        for name, values in self.durations.items():
+            v = np.asarray(values)
+            hist, _ = np.histogram(v, bins=HISTOGRAM_EDGES_S)
+            stages[name] = {
+                "count": int(v.size),
+                "total_s": float(v.sum()),
+                "mean_ms": 1e3 * float(v.mean()),
+                "p50_ms": 1e3 * float(np.percentile(v, 50)),
+                "p95_ms": 1e3 * float(np.percentile(v, 95)),
+                "max_ms": 1e3 * float(v.max()),
+                "histogram": hist.tolist(),
+            }
+        return {
+            "event": "summary",
+            "wall_s": time.perf_counter() - self.t_start,
+            "histogram_edges_s": HISTOGRAM_EDGES_S.tolist(),
+            "stages": stages,
+            "counters": dict(self.counters),
+        }
+
+    def close(self) -> None:
+        """Append the summary and close the metrics file."""
+        if not self.enabled or self._log is None:
+            return
+        self._write(self.summary())
+        self._log.close()
+        self._log = None
+
+
+def start_profile(path: Optional[str] = None) -> Optional[cProfile.Profile]:
+    """Start cProfile if a stats path is given (no-op and None otherwise)."""
+    if path is None:
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profile(profiler: Optional[cProfile.Profile], path: Optional[str] = None) -> None:
+    """Stop the profiler returned by start_profile and dump its stats to path."""
+    if profiler is None:
+        return
+    profiler.disable()
+    profiler.dump_stats(path)
+    print(f"profile -> {path}")
@@ -0,0 +1,220 @@
+# ================ DESCRIPTION ==============================================================================
+
+# This file runs the LoG detector of Detection_algorithm_stack.py for a whole grid of detection parameters
+# in a single pass over the images. Only the threshold and blob-size criteria change between the runs we
+# compare, so each frame is read once, its background/SNR is computed once, the LoG is computed once per
+# sigma, the thresholded map is labelled once per threshold, and only the blob-size selection and the
+# search of local maxima are repeated for every (ccmin, ccmax).
+# Workflow:
+#   1) Load stack paths from INPUT_PATTERN and prepare OUTPUT_HDF5.
+#   2) For each image, read frames with the selected CHANNEL, estimate the background on the first frame.
+#   3) For each sigma of LOG_SIGMAS compute the LoG, for each threshold of LOG_THRESHOLDS label the blobs,
+#      for each (ccmin, ccmax) of BLOB_SIZE_LIMITS keep the blobs of the right size and find the maxima.
+#   4) Save the positions of every parameter set in the same HDF5 file.
+#   With LOG_CACHE_DIR set, the LoG maps are taken from the on-disk cache (see log_map_cache.py) when they
+#   are available: a frame whose maps are all cached is not read at all (except frame 0, always read for the
+#   background of the image). Missing maps are computed and added
+#   to the cache. Cached maps are float16, so a few pixels right at the threshold may flip compared with a
+#   run without cache.
+#
+# Output layout:
+#   - sweep{k}/Image{id}/frame{n}: positions (x, y) found with the k-th parameter set
+#   - sweep{k}: group attributes sigma, seuil, ccmin (and ccmax if not None)
+#   - parameters: pandas dataframe with one row per parameter set (k, sigma, seuil, ccmin, ccmax)
+#   - Image{id}/background: background of each image, as in Detection_algorithm_stack.py
+#
+#   The group f['sweep{k}'] has the same layout as the root of a file written by Detection_algorithm_stack.py,
+#   so the count readers can be pointed at it, e.g. f['sweep3'][image_group][frame_name]['block0_values'].
+#   with pandas: pandas.read_hdf(filename,key='sweep3/ImageB3-7-C2/frame33')
+
+# =============== REQUIRED PACKAGES =========================================================================================
+
+import javabridge # To use bioformats
+import bioformats # to open the images
+import sep # to determine the background
+import Find_Local_Maxima as findMax # python file to determine blobs and local maxima
+import log_map_cache # python file to keep the LoG maps on disk
+import h5py # to have compacted dataframes
+import pandas # to use dataframes
+import sys,os # to access our images and use the terminal
+import glob # finds all the pathnames matching a specified pattern according to the rules used by the Unix shell
+from itertools import product
+from tqdm import tqdm # to get a processing bar in the terminal
+
+import numpy as np
+
+# =============== CONFIGURATION ====================================================================================
+
+# Input/output parameters
+INPUT_PATTERN = "./results 141125/stack rouge 1031/*.tif"  # Glob pattern for the stack images to process
+OUTPUT_HDF5 = "./results 141125/output_file_1031_sweep.hdf5"  # Destination file for all parameter sets
+CONFIRM_BEFORE_RUN = True  # Keep the confirmation prompt enabled
+
+# Fixed detection parameters
+CHANNEL = 0  # Use 1 when processing bright-field + fluorescence stacks
+BACKGROUND_WINDOW = 256  # Background window size in pixels; large enough to avoid local effects
+FILENAME_ID_INDEX = 0  # Which filename token to use as the HDF5 group identifier
+
+# Swept detection parameters (every combination is evaluated)
+LOG_SIGMAS = [3.5]  # Gaussian smoothing applied before Laplacian
+LOG_THRESHOLDS = [0.02, 0.025, 0.03, 0.0325, 0.035, 0.0375, 0.04, 0.045, 0.05, 0.06]  # LoG thresholds
+BLOB_SIZE_LIMITS = [(30, None)]  # (BLOB_MIN_PIXELS, BLOB_MAX_PIXELS) pairs; None disables the maximum
+
+# LoG map cache
+LOG_CACHE_DIR = None  # Directory of the LoG map cache, e.g. "./results 141125/log cache 1031"; None to disable
+LOG_CACHE_MAX_GB = 50  # Size limit of the cache; least recently used maps are removed first
+
+
+# =============== FUNCTIONS =========================================================================================
+
+# Function that lists the parameter sets of the sweep in the order of their index k
+# Output:
+#   - list of tuples (sigma, seuil, ccmin, ccmax)
+def parameterSets():
+    return [(sigma,s,ccmin,ccmax) for sigma,s,(ccmin,ccmax) in product(LOG_SIGMAS,LOG_THRESHOLDS,BLOB_SIZE_LIMITS)]
+
+# Function that retrieves once all the labelled pixels of a thresholded map and the size of each blob,
+# so that several size criteria can then be applied without labelling again
+# Arguments:
+#   - markers: matrix of labels returned by findMax.labelBlobs
+#   - y_t: thresholded LoG returned by findMax.thresholdMap
+# Output:
+#   - pixels: dictionnary of arrays "ix", "iy", "mark" and "val" of the labelled pixels
+#   - sizes: number of pixels of each label
+def blobPixels(markers,y_t):
+    iy,ix=np.where(markers>0)
+    mark=markers[iy,ix]
+    pixels={'ix':ix,'iy':iy,'mark':mark,'val':y_t[iy,ix]}
+    sizes=np.bincount(mark)
+    return pixels,sizes
+
+# Function that keeps the pixels of the blobs respecting the size criteria (same rule as findMax.selectBlobs)
+# Arguments:
+#   - pixels, sizes: output of blobPixels
+#   - ccmin: minimum number of pixels for a blob to be processed
+#   - ccmax: maximum number of pixels for a blob to be processed (None to disable)
+# Output:
+#   - q: dataframe of 3 columns "ix", "iy" and "val" corresponding to the pixels of the selected blobs
+def selectBySize(pixels,sizes,ccmin,ccmax=None):
+    ok=sizes>=ccmin
+    if ccmax is not None:
+        ok&=sizes<ccmax
+    keep=ok[pixels['mark']]
+    return pandas.DataFrame({name:pixels[name][keep] for name in ('ix','iy','val')})
+
+
+# Function that reads one frame of the selected channel
+# Arguments:
+#   - reader: bioformats.ImageReader of the stack
+#   - ip: frame
+#   - Nx, Ny: size of the images
+# Output:
+#   - data: image as matrix of pixels
+def readFrame(reader,ip,Nx,Ny):
+    yy=reader.read(c=CHANNEL,t=ip)
+    if yy.ndim == 3 and yy.shape[2] == 3:  # examiner si c'est un RGB image
+        yy = yy[:, :, 0]   # R channel
+        return np.ascontiguousarray(yy.reshape(Ny,Nx))
+    return yy.reshape(Ny,Nx)
+
+
+# =============== COMMANDS =========================================================================================
+
+if __name__ == "__main__":
+    # Collect images matching the input pattern and confirm output target
+    input_files = glob.glob(INPUT_PATTERN)
+    output_file = OUTPUT_HDF5
+    params=parameterSets()
+
+    print(input_files)
+    print("{} parameter sets: {} sigma x {} thresholds x {} size limits".format(
+        len(params),len(LOG_SIGMAS),len(LOG_THRESHOLDS),len(BLOB_SIZE_LIMITS)))
+    print("output file will be ={}".format(output_file))
+    if CONFIRM_BEFORE_RUN:
+        ans=input("is this OK? (y/n) ")
+        if ans != "y":
+            sys.exit()
+
+    #Then we start java to access our images
+    javabridge.start_vm(class_path=bioformats.JARS)
+    # we create the output file to write in it
+    f=h5py.File(output_file,'w')
+    f.attrs['channel']=CHANNEL
+    f.attrs['n_sweep']=len(params)
+    for k,(sigma,s,ccmin,ccmax) in enumerate(params):
+        g=f.create_group("sweep{}".format(k))
+        g.attrs['sigma']=sigma
+        g.attrs['seuil']=s
+        g.attrs['ccmin']=ccmin
+        if ccmax is not None:
+            g.attrs['ccmax']=ccmax
+    # for pnadas df
+    store=pandas.HDFStore(output_file,'a')
+    table=pandas.DataFrame(params,columns=['sigma','seuil','ccmin','ccmax'])
+    table['ccmax']=table['ccmax'].astype(float)
+    table.index.name='k'
+    table.to_hdf(store,key='parameters')
+    # LoG maps computed from the first-frame background with BACKGROUND_WINDOW (same variant as Detection_algorithm_stack.py)
+    log_cache=None
+    if LOG_CACHE_DIR is not None:
+        variant=log_map_cache.variant(INPUT_PATTERN,CHANNEL,BACKGROUND_WINDOW)
+        log_cache=log_map_cache.LogMapCache(LOG_CACHE_DIR,max_bytes=LOG_CACHE_MAX_GB*1e9,variant=variant)
+
+    # Then we loop on the images
+    for ifile,fin in enumerate(input_files):
+        imnum = os.path.basename(fin).split("_")[FILENAME_ID_INDEX]
+        # open the image with bioformats
+        ome=bioformats.OMEXML(bioformats.get_omexml_metadata(fin))
+        nt=ome.image().Pixels.SizeT
+        Nx=ome.image().Pixels.SizeX
+        Ny=ome.image().Pixels.SizeY
+        reader=bioformats.ImageReader(fin)
+        print("><"*100)
+        print(r"{} ({}/{})".format(fin,ifile,len(input_files)))
+
+        # background on the first frame, as in Detection_algorithm_stack.py; frame 0 is read even when all
+        # the LoG maps of the stack are cached so that every image gets its Image{id}/background
+        data0=readFrame(reader,0,Nx,Ny)
+        bkg=sep.Background(data0,bw=BACKGROUND_WINDOW,bh=BACKGROUND_WINDOW)
+        back=bkg.back()
+        rms=bkg.globalrms
+        g = f.create_group("Image{}/background".format(imnum))
+        g.create_dataset("image",data=back,compression='gzip')
+        g.attrs['rms']=rms
+        g.attrs['bw']=BACKGROUND_WINDOW
+        for ip in tqdm(range(nt),desc="Processing"):
+            # LoG maps already in the cache
+            laps={}
+            if log_cache is not None:
+                for sigma in LOG_SIGMAS:
+                    lap=log_cache.get(imnum,ip,sigma)
+                    if lap is not None:
+                        laps[sigma]=np.asarray(lap,dtype=float)
+            if len(laps)<len(LOG_SIGMAS):
+                data=data0 if ip==0 else readFrame(reader,ip,Nx,Ny)
+                snr=(data-back)/rms
+                for sigma in LOG_SIGMAS:
+                    if sigma not in laps:
+                        # the LoG is computed once per sigma
+                        laps[sigma]=findMax.LoG(snr,sigma)
+                        if log_cache is not None:
+                            log_cache.put(imnum,ip,sigma,laps[sigma])
+
+            k=0
+            for sigma in LOG_SIGMAS:
+                lap=laps[sigma]
+                for s in LOG_THRESHOLDS:
+                    # the blobs are labelled once per threshold
+                    y_t,img_t=findMax.thresholdMap(lap,s)
+                    pixels,sizes=blobPixels(findMax.labelBlobs(img_t),y_t)
+                    for ccmin,ccmax in BLOB_SIZE_LIMITS:
+                        blobs=selectBySize(pixels,sizes,ccmin,ccmax)
+                        pos=findMax.findMax(blobs,lap.shape)
+                        pos.to_hdf(store,key="sweep{}/Image{}/frame{}".format(k,imnum,ip))
+                        k+=1
+
+    # we close the files created
+    store.close()
+    f.close()
+    # and java
+    javabridge.kill_vm()
@@ -0,0 +1,153 @@
+"""
+Interactive viewer of the detections on top of a stack, without writing an annotated stack.
+
+Instead of saving an RGB copy of the stack with the cells painted in
+(cell_remark_withpoint.py), the frames are read lazily from the stack
+(TIFF page by page with tifffile, or OME-Zarr chunks, see zarr_stack.py) and
+the positions of the current frame are read on demand from the detection
+HDF5 (Image{id}/frame{n}). The image is shown downsampled by DOWNSAMPLE
+(block mean) and the cells are drawn as a scatter overlay at display
+resolution. The last CACHE_FRAMES downsampled frames are kept in memory (LRU),
+so scrubbing back and forth through the 160 frames only reads each page once.
+
+Controls: slider, or left/right arrow keys (shift for 10 frames).
+"""
+
+from collections import OrderedDict
+from typing import Tuple
+
+import h5py
+import matplotlib.pyplot as plt
+import numpy as np
+import tifffile
+from matplotlib.widgets import Slider
+
+import zarr_stack
+from detections_parquet import read_frame_table
+
+
+# ------- Configuration -------
+STACK_NAME = "B2-1-C2"
+STACK_PATH = f"./results 151025/stack rouge 1024/{STACK_NAME}_stack.tif"  # or ..._stack.zarr
+HDF5_PATH = "./results 151025/output_file_1024_0.0375.hdf5"
+DOWNSAMPLE = 2  # Display 1 pixel per DOWNSAMPLE x DOWNSAMPLE block; 1 for full resolution
+CACHE_FRAMES = 160  # Downsampled frames kept in memory
+CONTRAST_PERCENTILES = (1, 99.5)  # Display range, from the first frame
+MARKER_COLOR = "red"
+MARKER_SIZE = 12
+
+
+class StackFrames:
+    """Lazy, cached access to the downsampled frames of a TIFF or OME-Zarr stack."""
+
+    def __init__(self, path: str, downsample: int = DOWNSAMPLE, cache_frames: int = CACHE_FRAMES):
+        self.downsample = max(1, int(downsample))
+        self.cache_frames = cache_frames
+        self.cache = OrderedDict()
+        if zarr_stack.is_zarr_stack(path):
+            self.tif = None
+            self.array = zarr_stack.open_stack(path)
+            self.n_frames = self.array.shape[0]
+            self.shape = tuple(self.array.shape[1:])
+        else:
+            self.tif = tifffile.TiffFile(path)
+            self.array = None
+            self.n_frames = len(self.tif.pages)
+            self.shape = tuple(self.tif.pages[0].shape[:2])
+
+    def read(self, ip: int) -> np.ndarray:
+        """Full-resolution frame ip (first channel of RGB pages)."""
+        frame = self.array[ip] if self.array is not None else self.tif.pages[ip].asarray()
+        return frame[..., 0] if frame.ndim == 3 else frame
+
+    def display(self, ip: int) -> np.ndarray:
+        """Frame ip downsampled by block mean, from the cache if possible."""
+        if ip in self.cache:
+            self.cache.move_to_end(ip)
+            return self.cache[ip]
+        frame = self.read(ip).astype(np.float32)
+        d = self.downsample
+        if d > 1:
+            ny, nx = (frame.shape[0] // d) * d, (frame.shape[1] // d) * d
+            frame = frame[:ny, :nx].reshape(ny // d, d, nx // d, d).mean(axis=(1, 3))
+        self.cache[ip] = frame
+        if len(self.cache) > self.cache_frames:
+            self.cache.popitem(last=False)
+        return frame
+
+    def close(self) -> None:
+        if self.tif is not None:
+            self.tif.close()
+
+
+class Detections:
+    """Positions of one stack, read frame by frame from the detection HDF5."""
+
+    def __init__(self, hdf5_path: str, stack_name: str):
+        self.f = h5py.File(hdf5_path, "r")
+        self.group = self.f.get(f"Image{stack_name}")
+        if self.group is None:
+            print(f"No detections for Image{stack_name} in {hdf5_path}")
+
+    def positions(self, ip: int) -> np.ndarray:
+        """(n, 2) x/y positions of frame ip (empty if the frame has no detections)."""
+        name = f"frame{ip}"
+        if self.group is None or name not in self.group:
+            return np.empty((0, 2))
+        columns = read_frame_table(self.group[name])
+        return np.column_stack((columns["x"], columns["y"])).astype(float)
+
+    def close(self) -> None:
+        self.f.close()
+
+
+def contrast_range(frame: np.ndarray, percentiles: Tuple[float, float] = CONTRAST_PERCENTILES) -> Tuple[float, float]:
+    vmin, vmax = np.percentile(frame, percentiles)
+    return float(vmin), float(max(vmax, vmin + 1e-12))
+
+
+def show(stack_path: str = STACK_PATH, hdf5_path: str = HDF5_PATH, stack_name: str = STACK_NAME, start: int = 0) -> None:
+    frames = StackFrames(stack_path)
+    detections = Detections(hdf5_path, stack_name)
+    d = frames.downsample
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    fig.subplots_adjust(bottom=0.12)
+    first = frames.display(start)
+    vmin, vmax = contrast_range(first)
+    # extent in full-resolution pixels, so the positions are drawn without rescaling
+    extent = (-0.5, first.shape[1] * d - 0.5, first.shape[0] * d - 0.5, -0.5)
+    image = ax.imshow(first, cmap="gray", vmin=vmin, vmax=vmax, extent=extent, interpolation="nearest")
+    points = ax.scatter([], [], s=MARKER_SIZE, facecolors="none", edgecolors=MARKER_COLOR, linewidths=0.8)
+    ax.set_axis_off()
+
+    slider_ax = fig.add_axes([0.15, 0.04, 0.7, 0.03])
+    slider = Slider(slider_ax, "frame", 0, frames.n_frames - 1, valinit=start, valstep=1)
+
+    def update(value) -> None:
+        ip = int(value)
+        image.set_data(frames.display(ip))
+        xy = detections.positions(ip)
+        points.set_offsets(xy)
+        ax.set_title(f"Image{stack_name} frame {ip}/{frames.n_frames - 1}: {len(xy)} cells")
+        fig.canvas.draw_idle()
+
+    def on_key(event) -> None:
+        step = {"right": 1, "left": -1, "shift+right": 10, "shift+left": -10}.get(event.key)
+        if step is not None:
+            slider.set_val(int(np.clip(slider.val + step, 0, frames.n_frames - 1)))
+
+    slider.on_changed(update)
+    fig.canvas.mpl_connect("key_press_event", on_key)
+    update(start)
+    plt.show()
+    detections.close()
+    frames.close()
+
+
+def main() -> None:
+    show()
+
+
+if __name__ == "__main__":
+    main()
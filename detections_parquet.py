@@ -0,0 +1,177 @@
+"""
+Parquet storage of detections for fast columnar queries.
+
+Layout (hive partitioning, one file per stack):
+    {root}/well=B3/position=7/C2.parquet
+with one row per detected cell: frame, x, y (+ area, intensity, snr when the
+detection was run with EXTRACT_FEATURES). Rows are sorted by frame and written
+in row groups of ROW_GROUP_SIZE rows, so frame filters skip whole row groups
+through the Parquet statistics and well/position filters skip whole
+directories (predicate pushdown).
+
+- export_hdf5(...) converts a detection HDF5 (Image{id}/frame{n} keys) once;
+- write_stack_parquet(...) is also called by Detection_algorithm_stack.py when
+  PARQUET_DIR is set, so the Parquet copy is produced during the detection;
+- load_counts(...) / load_positions(...) read back only the columns and
+  partitions needed, e.g. the counts of every frame for the wells B2 and B3:
+      load_counts(root, wells=["B2", "B3"])
+"""
+
+import json
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import h5py
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+# ------- Configuration -------
+HDF5_PATH = "./results 141125/output_file_1031_0.0375.hdf5"
+PARQUET_ROOT = "./results 141125/parquet 1031_0.0375"
+ROW_GROUP_SIZE = 256 * 1024  # Rows per row group; large enough for scans, small enough to skip frames
+COMPRESSION = "zstd"
+
+IMAGE_GROUP_PATTERN = re.compile(r"^Image(?P<well>[A-Z]\d+)-(?P<position>\d+)-(?P<channel>\w+)$")
+
+
+def parse_image_group(name: str) -> Tuple[str, int, str]:
+    """Split 'ImageB3-7-C2' into ('B3', 7, 'C2'); other names give (id, -1, '')."""
+    match = IMAGE_GROUP_PATTERN.match(name)
+    if match is None:
+        return name[len("Image"):] if name.startswith("Image") else name, -1, ""
+    return match["well"], int(match["position"]), match["channel"]
+
+
+def frame_rows(frame_group: h5py.Group) -> int:
+    """Number of detections of one pandas fixed-format frame.
+
+    PyTables cannot store a zero-size array: an empty frame is written as a
+    (1, 1) placeholder block0_values whose real shape is kept in its "shape"
+    attribute, so block0_values.shape[0] alone counts one cell too many.
+    """
+    values = frame_group["block0_values"]
+    return 0 if "shape" in values.attrs else values.shape[0]
+
+
+def read_frame_table(frame_group: h5py.Group) -> Dict[str, np.ndarray]:
+    """Read every column of one pandas fixed-format frame with h5py (zero-length columns for an empty frame)."""
+    columns = {}
+    empty = frame_rows(frame_group) == 0
+    for b in range(int(frame_group.attrs.get("nblocks", 1))):
+        items = [i.decode() if isinstance(i, bytes) else str(i) for i in frame_group[f"block{b}_items"][:]]
+        values = frame_group[f"block{b}_values"]
+        values = np.empty((0, len(items)), dtype=values.dtype) if empty else values[:]
+        for k, name in enumerate(items):
+            columns[name] = values[:, k]
+    return columns
+
+
+def read_stack_table(hdf5_path: str, image_group: str) -> pd.DataFrame:
+    """Return all detections of one stack as a single dataframe with a frame column."""
+    parts = []
+    with h5py.File(hdf5_path, "r") as f:
+        group = f[image_group]
+        for name in group.keys():
+            if not name.startswith("frame"):
+                continue
+            columns = read_frame_table(group[name])
+            n = len(next(iter(columns.values()))) if columns else 0
+            table = pd.DataFrame(columns)
+            table.insert(0, "frame", np.full(n, int(name[len("frame"):]), dtype=np.int32))
+            parts.append(table)
+    if not parts:
+        return pd.DataFrame({"frame": np.empty(0, np.int32), "x": np.empty(0), "y": np.empty(0)})
+    return pd.concat(parts, ignore_index=True)
+
+
+def write_stack_parquet(
+    root: str,
+    image_id: str,
+    table: pd.DataFrame,
+    row_group_size: int = ROW_GROUP_SIZE,
+    compression: str = COMPRESSION,
+) -> str:
+    """Write the detections of one stack (frame, x, y, ...) to its partition file."""
+    well, position, channel = parse_image_group(f"Image{image_id}")
+    directory = os.path.join(root, f"well={well}", f"position={position}")
+    os.makedirs(directory, exist_ok=True)
+    table = table.sort_values("frame", kind="stable")
+    columns = {"frame": table["frame"].to_numpy(dtype=np.int32)}
+    for name in table.columns:
+        if name != "frame":
+            columns[name] = table[name].to_numpy(dtype=np.float32)
+    path = os.path.join(directory, f"{channel or 'stack'}.parquet")
+    pq.write_table(pa.table(columns), path, row_group_size=row_group_size, compression=compression)
+    return path
+
+
+def export_hdf5(hdf5_path: str, root: str, row_group_size: int = ROW_GROUP_SIZE) -> List[str]:
+    """Convert every stack of a detection HDF5 file to the Parquet layout."""
+    with h5py.File(hdf5_path, "r") as f:
+        image_groups = [name for name in f.keys() if name.startswith("Image")]
+        attrs = {name: (value.item() if hasattr(value, "item") else value) for name, value in f.attrs.items()}
+    paths = []
+    for image_group in image_groups:
+        table = read_stack_table(hdf5_path, image_group)
+        paths.append(write_stack_parquet(root, image_group[len("Image"):], table, row_group_size))
+    # run parameters next to the data (not a parquet file, ignored by the readers)
+    with open(os.path.join(root, "_run_attributes.json"), "w") as fp:
+        json.dump({"source": hdf5_path, **attrs}, fp, indent=2, default=str)
+    return paths
+
+
+def _filter(wells: Optional[Sequence[str]], positions: Optional[Sequence[int]], frames: Optional[Sequence[int]]):
+    expr = None
+    for field, values in (("well", wells), ("position", positions), ("frame", frames)):
+        if values is None:
+            continue
+        term = ds.field(field).isin(list(values))
+        expr = term if expr is None else expr & term
+    return expr
+
+
+def open_dataset(root: str) -> ds.Dataset:
+    # files starting with "_" (e.g. _run_attributes.json) are ignored by pyarrow
+    return ds.dataset(root, format="parquet", partitioning="hive")
+
+
+def load_counts(
+    root: str,
+    wells: Optional[Sequence[str]] = None,
+    positions: Optional[Sequence[int]] = None,
+    frames: Optional[Sequence[int]] = None,
+) -> pd.DataFrame:
+    """Number of cells per (well, position, frame), reading only the frame column.
+
+    Frames without any detection have no row in the dataset and are absent here.
+    """
+    table = open_dataset(root).to_table(columns=["well", "position", "frame"], filter=_filter(wells, positions, frames))
+    counts = table.group_by(["well", "position", "frame"]).aggregate([("frame", "count")])
+    counts = counts.to_pandas().rename(columns={"frame_count": "count"})
+    return counts.sort_values(["well", "position", "frame"], ignore_index=True)
+
+
+def load_positions(
+    root: str,
+    wells: Optional[Sequence[str]] = None,
+    positions: Optional[Sequence[int]] = None,
+    frames: Optional[Sequence[int]] = None,
+    columns: Sequence[str] = ("x", "y"),
+) -> pd.DataFrame:
+    """Detections (well, position, frame + columns) of the selected wells/positions/frames."""
+    wanted = ["well", "position", "frame", *columns]
+    return open_dataset(root).to_table(columns=wanted, filter=_filter(wells, positions, frames)).to_pandas()
+
+
+def main() -> None:
+    paths = export_hdf5(HDF5_PATH, PARQUET_ROOT)
+    print(f"Exported {len(paths)} stacks to: {PARQUET_ROOT}")
+
+
+if __name__ == "__main__":
+    main()
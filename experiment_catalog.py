@@ -0,0 +1,268 @@
+"""
+Catalog of detection files across experiments, kept in a small SQLite database.
+
+Every detection HDF5 matched by RESULTS_GLOBS (e.g. "results 141125/output_file_1031_0.0375.hdf5")
+is indexed once: experiment date and camera id (parsed from the path), detection
+threshold, run parameters (f.attrs), the stacks it contains (well, position,
+channel, number of frames) and the cell count of every frame. A file is scanned
+again only when its size or modification time changed.
+
+The condition of a plate (hypoxie/normoxie, dose, ...) is not stored in the
+files; it is attached with CONDITIONS ("experiment/camera" -> condition) or
+set_condition(...).
+
+Queries then read the database only, e.g. the B3 counts of hypoxie vs normoxie
+at threshold 0.0375:
+    query_counts(CATALOG_PATH, wells=["B3"], conditions=["hypoxie", "normoxie"], threshold=0.0375)
+or directly the mean/std over the positions of each well:
+    well_statistics(CATALOG_PATH, wells=["B3"], threshold=0.0375)
+"""
+
+import glob
+import json
+import os
+import re
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from detections_parquet import frame_rows, parse_image_group
+
+
+# ------- Configuration -------
+CATALOG_PATH = "./detections_catalog.sqlite"
+RESULTS_GLOBS = ["./results */output_file_*.hdf5"]
+# "experiment/camera" -> condition label, e.g. {"141125/1031": "hypoxie", "151025/1029": "normoxie"}
+CONDITIONS = {}
+
+PATH_PATTERN = re.compile(r"results (?P<experiment>\d{6})")
+NAME_PATTERN = re.compile(r"output_file_(?P<camera>[^_]+)(?:_(?P<threshold>\d+(?:\.\d+)?))?\.hdf5$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    experiment TEXT,
+    camera TEXT,
+    threshold REAL,
+    condition TEXT,
+    size INTEGER,
+    mtime REAL,
+    attrs TEXT,
+    indexed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS stacks (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    image_group TEXT NOT NULL,
+    well TEXT,
+    position INTEGER,
+    channel TEXT,
+    n_frames INTEGER
+);
+CREATE TABLE IF NOT EXISTS counts (
+    stack_id INTEGER NOT NULL REFERENCES stacks(id) ON DELETE CASCADE,
+    frame INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (stack_id, frame)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS stacks_well ON stacks(well);
+CREATE INDEX IF NOT EXISTS stacks_file ON stacks(file_id);
+CREATE INDEX IF NOT EXISTS files_threshold ON files(threshold);
+"""
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    con = sqlite3.connect(db_path)
+    con.execute("PRAGMA foreign_keys = ON")
+    con.executescript(SCHEMA)
+    return con
+
+
+def _plain(value):
+    """HDF5 attribute value -> JSON-friendly value."""
+    if isinstance(value, h5py.Empty):
+        return None
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def parse_path(path: str) -> Dict[str, Optional[str]]:
+    """Experiment date, camera id and threshold encoded in a result path."""
+    info = {"experiment": None, "camera": None, "threshold": None}
+    match = PATH_PATTERN.search(path)
+    if match:
+        info["experiment"] = match["experiment"]
+    match = NAME_PATTERN.search(os.path.basename(path))
+    if match:
+        info["camera"] = match["camera"]
+        info["threshold"] = match["threshold"]
+    return info
+
+
+def read_counts(f: h5py.File) -> Dict[str, Dict[int, int]]:
+    """Cell count of every frame of every image group (rows of block0_values, 0 for the placeholder of an empty frame)."""
+    counts = {}
+    for image_group in f.keys():
+        if not image_group.startswith("Image"):
+            continue
+        frames = {}
+        for name, node in f[image_group].items():
+            if name.startswith("frame"):
+                frames[int(name[len("frame"):])] = frame_rows(node)
+        counts[image_group] = frames
+    return counts
+
+
+def index_file(con: sqlite3.Connection, path: str, force: bool = False) -> bool:
+    """Index one detection file; return False if it was already up to date."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    row = con.execute("SELECT id, size, mtime, condition FROM files WHERE path = ?", (path,)).fetchone()
+    if row is not None and not force and row[1] == st.st_size and row[2] == st.st_mtime:
+        return False
+
+    info = parse_path(path)
+    with h5py.File(path, "r") as f:
+        attrs = {name: _plain(value) for name, value in f.attrs.items()}
+        counts = read_counts(f)
+    threshold = info["threshold"] if info["threshold"] is not None else attrs.get("seuil")
+    condition = row[3] if row is not None else None
+    if condition is None:
+        condition = CONDITIONS.get(f"{info['experiment']}/{info['camera']}")
+
+    with con:
+        if row is not None:
+            con.execute("DELETE FROM files WHERE id = ?", (row[0],))
+        cur = con.execute(
+            "INSERT INTO files (path, experiment, camera, threshold, condition, size, mtime, attrs, indexed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, info["experiment"], info["camera"], None if threshold is None else float(threshold),
+             condition, st.st_size, st.st_mtime, json.dumps(attrs), time.strftime("%Y-%m-%d %H:%M:%S")),
+        )
+        file_id = cur.lastrowid
+        for image_group, frames in counts.items():
+            well, position, channel = parse_image_group(image_group)
+            cur = con.execute(
+                "INSERT INTO stacks (file_id, image_group, well, position, channel, n_frames) VALUES (?, ?, ?, ?, ?, ?)",
+                (file_id, image_group, well, position, channel, len(frames)),
+            )
+            stack_id = cur.lastrowid
+            con.executemany(
+                "INSERT INTO counts (stack_id, frame, count) VALUES (?, ?, ?)",
+                ((stack_id, frame, count) for frame, count in frames.items()),
+            )
+    return True
+
+
+def index_files(db_path: str, patterns: Iterable[str], force: bool = False) -> List[str]:
+    """Index every file matching the glob patterns; return the files (re)scanned."""
+    scanned = []
+    con = connect(db_path)
+    try:
+        for pattern in patterns:
+            for path in sorted(glob.glob(pattern)):
+                if index_file(con, path, force=force):
+                    scanned.append(path)
+    finally:
+        con.close()
+    return scanned
+
+
+def set_condition(db_path: str, condition: str, experiment: str, camera: Optional[str] = None) -> int:
+    """Attach a condition label to the files of one experiment (and camera)."""
+    con = connect(db_path)
+    with con:
+        if camera is None:
+            cur = con.execute("UPDATE files SET condition = ? WHERE experiment = ?", (condition, experiment))
+        else:
+            cur = con.execute("UPDATE files SET condition = ? WHERE experiment = ? AND camera = ?",
+                              (condition, experiment, camera))
+    con.close()
+    return cur.rowcount
+
+
+def _where(
+    wells: Optional[Sequence[str]] = None,
+    conditions: Optional[Sequence[str]] = None,
+    threshold: Optional[float] = None,
+    experiments: Optional[Sequence[str]] = None,
+    cameras: Optional[Sequence[str]] = None,
+):
+    clauses, params = [], []
+    for column, values in (("s.well", wells), ("f.condition", conditions),
+                           ("f.experiment", experiments), ("f.camera", cameras)):
+        if values is not None:
+            values = list(values)
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    if threshold is not None:
+        clauses.append("ABS(f.threshold - ?) < 1e-9")
+        params.append(float(threshold))
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def list_files(db_path: str) -> pd.DataFrame:
+    """One row per indexed file, with its number of stacks and frames."""
+    con = connect(db_path)
+    try:
+        return pd.read_sql_query(
+            "SELECT f.experiment, f.camera, f.threshold, f.condition, f.path, "
+            "COUNT(s.id) AS n_stacks, MAX(s.n_frames) AS n_frames, GROUP_CONCAT(DISTINCT s.well) AS wells "
+            "FROM files f LEFT JOIN stacks s ON s.file_id = f.id GROUP BY f.id ORDER BY f.experiment, f.camera",
+            con,
+        )
+    finally:
+        con.close()
+
+
+def query_counts(db_path: str, **selection) -> pd.DataFrame:
+    """Per-frame counts of every selected stack (see _where for the selection keys)."""
+    where, params = _where(**selection)
+    con = connect(db_path)
+    try:
+        return pd.read_sql_query(
+            "SELECT f.experiment, f.camera, f.condition, f.threshold, s.image_group, s.well, s.position, "
+            "c.frame, c.count FROM counts c JOIN stacks s ON s.id = c.stack_id JOIN files f ON f.id = s.file_id"
+            + where + " ORDER BY f.experiment, f.camera, s.well, s.position, c.frame",
+            con, params=params,
+        )
+    finally:
+        con.close()
+
+
+def well_statistics(db_path: str, **selection) -> pd.DataFrame:
+    """Mean and std (ddof=0) of the counts over the positions of each well and frame."""
+    where, params = _where(**selection)
+    con = connect(db_path)
+    try:
+        stats = pd.read_sql_query(
+            "SELECT f.experiment, f.camera, f.condition, f.threshold, s.well, c.frame, "
+            "COUNT(*) AS n, AVG(c.count) AS mean, AVG(c.count * c.count) AS mean_sq "
+            "FROM counts c JOIN stacks s ON s.id = c.stack_id JOIN files f ON f.id = s.file_id"
+            + where + " GROUP BY f.id, s.well, c.frame ORDER BY f.experiment, f.camera, s.well, c.frame",
+            con, params=params,
+        )
+    finally:
+        con.close()
+    stats["std"] = np.sqrt(np.clip(stats.pop("mean_sq") - stats["mean"] ** 2, 0.0, None))
+    return stats
+
+
+def main() -> None:
+    scanned = index_files(CATALOG_PATH, RESULTS_GLOBS)
+    print(f"Indexed {len(scanned)} new or modified files into {CATALOG_PATH}")
+    print(list_files(CATALOG_PATH).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Export the mean/std density txt files of a whole campaign in one pass.
+
+Same output as export_counts_to_txt_0gy.py and
+export_density_with_radiation_to_txt.py (two columns: mean and std density in
+cells/µm^2, one row per frame, NaN where no position has the frame), but for
+every (condition, dose) entry of EXPORTS at once:
+
+    - each detection HDF5 is read once into a count matrix
+      (one row per Image{well}-{position}-{channel} group, one column per frame);
+    - with SMOOTHING set, the count matrix is smoothed along the frames
+      (count_smoothing.py, cached per parameter set);
+    - the mean/std of all wells are computed in one vectorized reduction over
+      the positions (np.nanmean/np.nanstd, ddof=0 as before);
+    - every Well{idx} file is written with the template of its entry.
+
+With CONSOLIDATED_NPZ / CONSOLIDATED_PARQUET set, all the series are also
+saved in one file (one row per condition/dose/well) for the model and plotting
+scripts (format and loader in model_dataset.py). When the detection stored the
+acquisition times of the stacks (Image{id}/times, see time_axes.py), the
+consolidated files also hold the time of every frame of each well (mean over
+its positions). With CUTOFF set, the last frame to fit/plot of every curve
+is computed in the same pass (growth_cutoff.py) and stored with it.
+"""
+
+import os
+import warnings
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import h5py
+import numpy as np
+import pandas as pd
+
+import count_smoothing
+import growth_cutoff
+import model_dataset
+import time_axes
+
+
+# ------- Configuration -------
+# One entry per (plate, dose): detection file, labels and where/how to name the txt files.
+# Templates can use {idx}, {dose} and {smooth} (tag of the smoothing parameters, "none" without smoothing);
+# an entry can override SMOOTHING with its own "smoothing" key
+EXPORTS = [
+    {
+        "hdf5": "./results 141125/output_file_1029_0.0375.hdf5",
+        "condition": "hypoxie",
+        "dose": 0,
+        "output_dir": "../Cell_Radiation_Proliferation_Model/results txt for model 1114/hypoxie",
+        "template": "{dose:g}_Gy_Well{idx}_3exps.txt",
+        "time_step_hours": 1.5,
+    },
+    {
+        "hdf5": "./results 141125/output_file_1031_0.0375.hdf5",
+        "condition": "hypoxie",
+        "dose": 10,
+        "output_dir": "../Cell_Radiation_Proliferation_Model/results txt for model 1114/hypoxie",
+        "template": "Well{idx}_Incucyte_F98_{dose:g}Gy_2025_11_14_smooth=35.txt",
+        "time_step_hours": 1.5,
+    },
+]
+PUITS_ORDER = ["A2", "B2", "C2", "A3", "B3", "C3"]  # Well1..Well6
+SUFFIXES = list(range(1, 10))  # Positions averaged in each well
+CHANNEL = "C2"
+MAX_FRAME = 160
+
+PIXEL_SIZE_UM = 1.24
+IMAGE_WIDTH_PX = 1408
+IMAGE_HEIGHT_PX = 1040
+FIELD_AREA_MICRONS2 = (IMAGE_WIDTH_PX * PIXEL_SIZE_UM) * (IMAGE_HEIGHT_PX * PIXEL_SIZE_UM)
+
+# Smoothing of the counts of every position along the frames before the mean/std, e.g.
+# {"method": "savgol", "window": 35, "polyorder": 2} (see count_smoothing.py); None exports the raw counts as before
+SMOOTHING = None
+
+# Cutoff of the curves stored in the consolidated files, e.g. {"rule": "below", "threshold": 1.1e-3} (ind_cut of the
+# fit script) or {"rule": "plateau"} (see growth_cutoff.py), overridden by the "cutoff" key of an entry; None stores growth_cutoff.NOT_COMPUTED
+CUTOFF = None
+
+CONSOLIDATED_NPZ = None  # e.g. "../Cell_Radiation_Proliferation_Model/results txt for model 1114/campaign_1114.npz"
+CONSOLIDATED_PARQUET = None  # long table (condition, dose, well, idx, frame, mean, std); None to disable
+
+
+def read_count_matrix(hdf5_path: str, max_frame: int = MAX_FRAME) -> Tuple[List[str], np.ndarray]:
+    """Cell counts of every group and frame (rows of block0_values); NaN for missing frames."""
+    with h5py.File(hdf5_path, "r") as f:
+        groups = [name for name in f.keys() if name.startswith("Image")]
+        counts = np.full((len(groups), max_frame + 1), np.nan)
+        for row, group in enumerate(groups):
+            for name, node in f[group].items():
+                if name.startswith("frame"):
+                    frame = int(name[len("frame"):])
+                    if frame <= max_frame:
+                        counts[row, frame] = node["block0_values"].shape[0]
+    return groups, counts
+
+
+def well_mean_std(
+    groups: Sequence[str],
+    counts: np.ndarray,
+    puits_order: Sequence[str] = PUITS_ORDER,
+    suffixes: Sequence[int] = SUFFIXES,
+    channel: str = CHANNEL,
+    field_area_microns2: float = FIELD_AREA_MICRONS2,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean and std density over the positions of each well, shape (n_wells, n_frames)."""
+    row_of = {group: row for row, group in enumerate(groups)}
+    # (n_wells, n_positions) row indices into counts, -1 for positions without a group
+    rows = np.array([[row_of.get(f"Image{puits}-{s}-{channel}", -1) for s in suffixes] for puits in puits_order])
+    padded = np.vstack([counts, np.full((1, counts.shape[1]), np.nan)])  # row -1 -> all NaN
+    density = padded[rows] / float(field_area_microns2)
+    with warnings.catch_warnings():
+        # frames missing in every position of a well stay NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.nanmean(density, axis=1), np.nanstd(density, axis=1, ddof=0)
+
+
+def well_times(groups: Sequence[str], hours: np.ndarray, puits_order: Sequence[str] = PUITS_ORDER,
+               suffixes: Sequence[int] = SUFFIXES, channel: str = CHANNEL) -> np.ndarray:
+    """Mean acquisition time (h) of each well and frame over its positions, NaN where unknown."""
+    row_of = {group: row for row, group in enumerate(groups)}
+    rows = np.array([[row_of.get(f"Image{puits}-{s}-{channel}", -1) for s in suffixes] for puits in puits_order])
+    padded = np.vstack([hours, np.full((1, hours.shape[1]), np.nan)])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.nanmean(padded[rows], axis=1)
+
+
+def export_all(exports: Sequence[Dict] = EXPORTS) -> Dict[str, np.ndarray]:
+    """Write the txt files of every entry; return all series stacked (one row per entry and well)."""
+    matrices = {}
+    series = {"condition": [], "dose": [], "well": [], "idx": [], "time_step_hours": [], "mean": [], "std": [], "time": [],
+              "cutoff": []}
+    for entry in exports:
+        if entry["hdf5"] not in matrices:
+            groups, counts = read_count_matrix(entry["hdf5"])
+            hours, _ = time_axes.read_time_matrix(entry["hdf5"], groups, counts.shape[1] - 1)
+            matrices[entry["hdf5"]] = (groups, counts, hours)
+        groups, counts, hours = matrices[entry["hdf5"]]
+        smoothing = entry.get("smoothing", SMOOTHING)
+        if smoothing is not None:
+            counts = count_smoothing.smooth(counts, **smoothing)
+        smooth_tag = count_smoothing.describe(**smoothing) if smoothing is not None else "none"
+        means, stds = well_mean_std(groups, counts)
+        os.makedirs(entry["output_dir"], exist_ok=True)
+        for idx, puits in enumerate(PUITS_ORDER, start=1):
+            out_txt = os.path.join(entry["output_dir"], entry["template"].format(idx=idx, dose=entry["dose"], smooth=smooth_tag))
+            np.savetxt(out_txt, np.column_stack((means[idx - 1], stds[idx - 1])), fmt="%.6f")
+            print(f"Saved: {out_txt}")
+            series["condition"].append(entry["condition"])
+            series["dose"].append(float(entry["dose"]))
+            series["well"].append(puits)
+            series["idx"].append(idx)
+            series["time_step_hours"].append(float(entry.get("time_step_hours", np.nan)))
+        series["mean"].append(means)
+        series["std"].append(stds)
+        times = well_times(groups, hours)
+        series["time"].append(times)
+        rule = entry.get("cutoff", CUTOFF)
+        if rule is not None:
+            # "plateau" rates per hour with the acquisition times where they are known
+            regular = time_axes.regular_times(times.shape[1], entry.get("time_step_hours", 1.0))
+            series["cutoff"].append(growth_cutoff.cutoff_indices(means, times=np.where(np.isnan(times), regular, times), **rule))
+        else:
+            series["cutoff"].append(np.full(len(means), growth_cutoff.NOT_COMPUTED))
+    return {
+        "condition": np.array(series["condition"]),
+        "dose": np.array(series["dose"]),
+        "well": np.array(series["well"]),
+        "idx": np.array(series["idx"], dtype=np.int32),
+        "time_step_hours": np.array(series["time_step_hours"]),
+        "mean": np.vstack(series["mean"]),
+        "std": np.vstack(series["std"]),
+        "time": np.vstack(series["time"]),
+        "cutoff": np.concatenate(series["cutoff"]).astype(np.int32),
+    }
+
+
+def save_consolidated(series: Dict[str, np.ndarray], npz_path: Optional[str], parquet_path: Optional[str]) -> None:
+    if npz_path is not None:
+        model_dataset.CampaignDataset(**series).save(npz_path)
+        print(f"Saved: {npz_path}")
+    if parquet_path is not None:
+        n_series, n_frames = series["mean"].shape
+        table = pd.DataFrame({
+            name: np.repeat(series[name], n_frames) for name in ("condition", "dose", "well", "idx", "time_step_hours")
+        })
+        table["frame"] = np.tile(np.arange(n_frames, dtype=np.int32), n_series)
+        table["mean"] = series["mean"].ravel()
+        table["std"] = series["std"].ravel()
+        table["time"] = series["time"].ravel()
+        table["cutoff"] = np.repeat(series["cutoff"], n_frames)
+        table.to_parquet(parquet_path, index=False)
+        print(f"Saved: {parquet_path}")
+
+
+def main() -> None:
+    series = export_all(EXPORTS)
+    save_consolidated(series, CONSOLIDATED_NPZ, CONSOLIDATED_PARQUET)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Render many matplotlib figures in parallel, skipping the ones that did not change.
+
+A figure is described by a FigureJob: a drawing function, the data arrays it
+plots, its options and the output path. Drawing functions use the
+object-oriented API only (no pyplot state machine):
+
+    def draw(fig, data, **options):
+        ax = fig.add_subplot()
+        ax.plot(data["x"], data["y"])
+
+Each job is rendered on its own Figure with the Agg canvas, in a process pool
+(n_workers). Data shared by many figures (e.g. the curves of all wells for the
+highlight plots) is passed once per worker with render_all(..., shared=...)
+and merged with the data of each job.
+
+Before rendering, a hash of the drawing function (name and source), the data,
+the shared data, the options and the figure settings is compared with the one
+stored in .figure_hashes.json (next to the figure) when it was last written;
+figures whose file exists with the same hash are skipped. Only the source of
+the drawing function itself is hashed: after editing a helper it calls, use
+force=True to render everything again.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+MANIFEST_NAME = ".figure_hashes.json"
+
+_SHARED = {}  # shared data of the worker processes
+
+
+class FigureJob:
+    """One figure: drawing function, data, options and where to save it."""
+
+    def __init__(
+        self,
+        draw: Callable,
+        output_path,
+        data: Optional[Dict] = None,
+        options: Optional[Dict] = None,
+        figsize: Tuple[float, float] = (15, 8),
+        dpi: int = 300,
+    ):
+        self.draw = draw
+        self.output_path = str(output_path)
+        self.data = data or {}
+        self.options = options or {}
+        self.figsize = tuple(figsize)
+        self.dpi = dpi
+
+
+def _update_hash(h, value) -> None:
+    """Feed nested dicts/lists/arrays/scalars into a hash."""
+    if isinstance(value, np.ndarray):
+        h.update(f"array{value.dtype.str}{value.shape}".encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        h.update(b"dict")
+        for key in value:  # insertion order: it is also the drawing order
+            h.update(repr(key).encode())
+            _update_hash(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(f"seq{len(value)}".encode())
+        for item in value:
+            _update_hash(h, item)
+    elif isinstance(value, Path):
+        h.update(str(value).encode())
+    else:
+        h.update(repr(value).encode())
+
+
+def _function_signature(draw: Callable) -> str:
+    try:
+        source = inspect.getsource(draw)
+    except (OSError, TypeError):
+        source = ""
+    return f"{draw.__module__}.{draw.__qualname__}\n{source}"
+
+
+def job_hash(job: FigureJob, shared_digest: str = "") -> str:
+    h = hashlib.sha256()
+    h.update(_function_signature(job.draw).encode())
+    h.update(shared_digest.encode())
+    _update_hash(h, [job.data, job.options, job.figsize, job.dpi, os.path.basename(job.output_path)])
+    return h.hexdigest()
+
+
+def _init_worker(shared: Dict) -> None:
+    _SHARED.clear()
+    _SHARED.update(shared)
+
+
+def render_job(job: FigureJob) -> str:
+    """Draw one figure on an Agg canvas and save it."""
+    fig = Figure(figsize=job.figsize)
+    FigureCanvasAgg(fig)
+    job.draw(fig, {**_SHARED, **job.data}, **job.options)
+    os.makedirs(os.path.dirname(os.path.abspath(job.output_path)), exist_ok=True)
+    fig.savefig(job.output_path, dpi=job.dpi, bbox_inches="tight", facecolor="white", edgecolor="none")
+    return job.output_path
+
+
+def _read_manifest(directory: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as fp:
+            return json.load(fp)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def render_all(
+    jobs: Sequence[FigureJob],
+    shared: Optional[Dict] = None,
+    n_workers: int = 1,
+    force: bool = False,
+) -> Tuple[List[str], List[str]]:
+    """Render the jobs whose inputs changed; return (rendered paths, skipped paths)."""
+    shared = shared or {}
+    h = hashlib.sha256()
+    _update_hash(h, shared)
+    shared_digest = h.hexdigest()
+
+    manifests = {}
+    todo, skipped, hashes = [], [], {}
+    for job in jobs:
+        directory = os.path.dirname(os.path.abspath(job.output_path))
+        if directory not in manifests:
+            manifests[directory] = _read_manifest(directory)
+        digest = job_hash(job, shared_digest)
+        name = os.path.basename(job.output_path)
+        if not force and os.path.exists(job.output_path) and manifests[directory].get(name) == digest:
+            skipped.append(job.output_path)
+        else:
+            todo.append(job)
+            hashes[job.output_path] = (directory, name, digest)
+
+    if n_workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(todo)), initializer=_init_worker, initargs=(shared,)) as pool:
+            rendered = list(pool.map(render_job, todo))
+    else:
+        _init_worker(shared)
+        rendered = [render_job(job) for job in todo]
+        _SHARED.clear()
+
+    # hashes are recorded by the parent only, once the figures exist
+    for path in rendered:
+        directory, name, digest = hashes[path]
+        manifests[directory][name] = digest
+    for directory in {hashes[path][0] for path in rendered}:
+        with open(os.path.join(directory, MANIFEST_NAME), "w") as fp:
+            json.dump(manifests[directory], fp, indent=1, sort_keys=True)
+    return rendered, skipped
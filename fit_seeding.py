@@ -0,0 +1,108 @@
+"""
+Quasi-random seeding and two-stage (coarse-to-fine) multi-start fits.
+
+Find_best_popt in the fit script runs a full bounded curve_fit from each of
+10^4 random starting points, and most of them end on the same optimum. Here:
+
+1. seeds(...) draws a low-discrepancy design of starting points within the
+   bounds (scrambled Sobol or Latin hypercube, scipy.stats.qmc), which covers
+   the parameter space more evenly than uniform random draws;
+2. screen(...) evaluates the chi2 of every seed with one integration each
+   (no fit), in N_WORKERS processes for large designs;
+3. two_stage_fit(...) runs a local fit (model_uncertainty.local_fit) only
+   from the TOP_K best seeds, and merges the optima that converged to the same
+   point (relative distance below DEDUP_TOL), keeping the number of seeds that
+   reached each of them.
+
+The model is any callable model(t, *params) with a time_points attribute,
+e.g. radiation_model.RadiationModel.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy.stats import qmc
+
+from model_uncertainty import chi2, local_fit
+
+
+# ------- Configuration -------
+N_SEEDS = 1024  # Size of the design (a power of 2 for Sobol)
+TOP_K = 16  # Seeds refined by a local fit
+DEDUP_TOL = 1e-3  # Optima closer than this (relative to the bounds) are merged
+N_WORKERS = 1  # Processes for the screening; 1 evaluates in the calling process
+SEED = 0
+
+_WORKER = {}  # state of the worker processes
+
+
+def seeds(bounds, n: int = N_SEEDS, method: str = "sobol", seed: int = SEED) -> np.ndarray:
+    """(n, n_params) starting points within the bounds."""
+    lower, upper = np.asarray(bounds[0], dtype=float), np.asarray(bounds[1], dtype=float)
+    if method == "sobol":
+        sampler = qmc.Sobol(d=lower.size, scramble=True, seed=seed)
+        # Sobol designs are balanced for powers of 2: draw the next one and keep n points
+        unit = sampler.random_base2(int(np.ceil(np.log2(max(n, 1)))))[:n]
+    elif method == "lhs":
+        unit = qmc.LatinHypercube(d=lower.size, seed=seed).random(n)
+    else:
+        raise ValueError(f"unknown seeding method: {method}")
+    return qmc.scale(unit, lower, upper)
+
+
+def _init_worker(model, exp, std) -> None:
+    _WORKER.update(model=model, exp=exp, std=std)
+
+
+def _screen_chunk(points: np.ndarray) -> np.ndarray:
+    w = _WORKER
+    t = w["model"].time_points
+    out = np.empty(len(points))
+    for j, p in enumerate(points):
+        c2 = chi2(w["exp"], w["model"](t, *p), w["std"])
+        out[j] = c2 if np.isfinite(c2) else np.inf
+    return out
+
+
+def screen(model, exp, std, points: np.ndarray, n_workers: int = N_WORKERS) -> np.ndarray:
+    """chi2 of the model at every point (inf where the integration failed)."""
+    if n_workers > 1 and len(points) > n_workers:
+        chunks = np.array_split(points, 4 * n_workers)
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(model, exp, std)) as pool:
+            return np.concatenate(list(pool.map(_screen_chunk, chunks)))
+    _init_worker(model, exp, std)
+    return _screen_chunk(points)
+
+
+def deduplicate(optima: Sequence[Tuple[np.ndarray, float]], bounds, tol: float = DEDUP_TOL) -> List[Dict]:
+    """Merge optima closer than tol (scaled by the bounds), best chi2 first."""
+    scale = np.asarray(bounds[1], dtype=float) - np.asarray(bounds[0], dtype=float)
+    scale[scale == 0] = 1.0
+    merged = []
+    for popt, c2 in sorted(optima, key=lambda item: item[1]):
+        if not np.isfinite(c2):
+            continue
+        for entry in merged:
+            if np.max(np.abs(popt - entry["popt"]) / scale) < tol:
+                entry["count"] += 1
+                break
+        else:
+            merged.append({"popt": popt, "chi2": c2, "count": 1})
+    return merged
+
+
+def two_stage_fit(
+    model, exp, std, bounds,
+    n_seeds: int = N_SEEDS, top_k: int = TOP_K, method: str = "sobol",
+    n_workers: int = N_WORKERS, seed: int = SEED, tol: float = DEDUP_TOL,
+) -> Tuple[np.ndarray, float, List[Dict]]:
+    """Best parameters, their chi2 and the distinct optima found from the top_k seeds."""
+    points = seeds(bounds, n_seeds, method, seed)
+    screened = screen(model, exp, std, points, n_workers)
+    best_seeds = points[np.argsort(screened)[:top_k]]
+    optima = [local_fit(model, exp, std, p0, bounds) for p0 in best_seeds]
+    distinct = deduplicate(optima, bounds, tol)
+    if not distinct:
+        return np.full(len(bounds[0]), np.nan), np.inf, []
+    return distinct[0]["popt"], distinct[0]["chi2"], distinct
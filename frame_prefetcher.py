@@ -0,0 +1,111 @@
+"""
+Read frames ahead in a background thread so that disk/NAS latency is hidden
+behind the detection of the previous frames.
+
+The thread walks the stacks in the order they are processed, frame by frame,
+and continues with the next stack as soon as the current one is read, so the
+first frames of the next stack are ready when its detection starts. The
+buffer is bounded both in number of frames (depth) and in bytes (max_bytes);
+the reader blocks when either limit is reached.
+
+    prefetcher = FramePrefetcher(paths, open_stack, depth=8, max_bytes=1e9)
+    for ifile, path in enumerate(paths):
+        for ip in range(nt):
+            frame = prefetcher.get(ifile, ip)
+    prefetcher.close()
+
+open_stack(path) returns (nt, read) with read(ip) giving the raw frame. The
+readers used here go through the java VM (bioformats), so thread_init and
+thread_exit are called in the reading thread, e.g. javabridge.attach and
+javabridge.detach. An error raised while reading is raised again by get().
+"""
+
+import threading
+from collections import deque
+from typing import Callable, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class FramePrefetcher:
+    """Bounded read-ahead buffer filled by one background thread."""
+
+    def __init__(
+        self,
+        paths: Sequence[str],
+        open_stack: Callable[[str], Tuple[int, Callable[[int], np.ndarray]]],
+        depth: int = 8,
+        max_bytes: float = 1e9,
+        thread_init: Optional[Callable[[], None]] = None,
+        thread_exit: Optional[Callable[[], None]] = None,
+    ):
+        if depth < 1:
+            raise ValueError(f"prefetch depth must be >= 1, got {depth}")
+        self.paths = list(paths)
+        self.open_stack = open_stack
+        self.depth = depth
+        self.max_bytes = int(max_bytes)
+        self.thread_init = thread_init
+        self.thread_exit = thread_exit
+        # (ifile, ip, frame or exception, nbytes), oldest first
+        self.items = deque()
+        self.buffered_bytes = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="frame-prefetcher", daemon=True)
+        self.thread.start()
+
+    def _put(self, ifile: int, ip: int, value, nbytes: int) -> bool:
+        with self.cond:
+            # a single frame larger than max_bytes is still accepted when the buffer is empty
+            while not self.closed and self.items and (
+                len(self.items) >= self.depth or self.buffered_bytes + nbytes > self.max_bytes
+            ):
+                self.cond.wait()
+            if self.closed:
+                return False
+            self.items.append((ifile, ip, value, nbytes))
+            self.buffered_bytes += nbytes
+            self.cond.notify_all()
+            return True
+
+    def _run(self) -> None:
+        if self.thread_init is not None:
+            self.thread_init()
+        try:
+            for ifile, path in enumerate(self.paths):
+                nt, read = self.open_stack(path)
+                for ip in range(nt):
+                    frame = read(ip)
+                    if not self._put(ifile, ip, frame, frame.nbytes):
+                        return
+        except BaseException as exc:
+            self._put(ifile, -1, exc, 0)
+        finally:
+            if self.thread_exit is not None:
+                self.thread_exit()
+
+    def get(self, ifile: int, ip: int) -> np.ndarray:
+        """Return frame ip of stack ifile; frames must be requested in reading order."""
+        with self.cond:
+            while not self.items:
+                if not self.thread.is_alive():
+                    raise RuntimeError(f"prefetcher stopped before frame {ip} of {self.paths[ifile]}")
+                self.cond.wait(timeout=1.0)
+            got_file, got_ip, value, nbytes = self.items.popleft()
+            self.buffered_bytes -= nbytes
+            self.cond.notify_all()
+        if isinstance(value, BaseException):
+            raise value
+        if (got_file, got_ip) != (ifile, ip):
+            raise RuntimeError(f"expected frame {ip} of stack {ifile}, prefetched frame {got_ip} of stack {got_file}")
+        return value
+
+    def close(self) -> None:
+        """Stop the reading thread and drop the buffered frames."""
+        with self.cond:
+            self.closed = True
+            self.items.clear()
+            self.buffered_bytes = 0
+            self.cond.notify_all()
+        self.thread.join()
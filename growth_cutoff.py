@@ -0,0 +1,108 @@
+"""
+Cutoff frames of the growth curves, computed for every series at once.
+
+The curves are cut before fitting and plotting, and each script used to scan
+its own curves with its own rule: the plot scripts keep the points up to the
+first one reaching THRESHOLD_VALUE (maybe_truncate / maybe_truncate_curve),
+the fit script the points up to the last one below 1.1e-3 (ind_cut). Here the
+rules work on a whole (n_series, n_frames) matrix (NaN-padded) in one pass and
+return, for each series, the index of the last frame to keep:
+
+    "threshold"  first frame reaching threshold (the whole series if never reached)
+    "below"      last frame below threshold (NOTHING_TO_KEEP if none)
+    "plateau"    start of the saturation: first frame from which the growth rate
+                 d(log y)/dt, averaged over window frames, stays below rate_tol
+                 (per hour with times, per frame otherwise)
+
+export_density_bulk.py (CUTOFF) stores the cutoffs with the curves of the
+campaign dataset (model_dataset.py, field "cutoff", NOT_COMPUTED where no rule
+was applied), and the fit, uncertainty, model selection and plot scripts use
+the stored cutoff of a curve when there is one (curve_cutoff), and these same
+functions otherwise.
+"""
+
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# ------- Configuration -------
+DEFAULT_RATE_TOL = 0.005  # "plateau": growth rate (1/h with times, 1/frame otherwise) below which the curve is saturated
+DEFAULT_WINDOW = 6  # "plateau": frames over which the growth rate is averaged
+
+NOTHING_TO_KEEP = -1  # cutoff of a series with no frame to keep (e.g. "below" with no point below threshold)
+NOT_COMPUTED = -2  # stored cutoff of a series no rule was applied to
+
+
+def _last_valid(values: np.ndarray) -> np.ndarray:
+    valid = ~np.isnan(values)
+    return np.where(valid.any(axis=1), values.shape[1] - 1 - valid[:, ::-1].argmax(axis=1), -1)
+
+
+def _plateau(values: np.ndarray, times: Optional[np.ndarray], rate_tol: float, window: int) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_values = np.log(np.where(values > 0, values, np.nan))
+    dt = np.diff(np.broadcast_to(times, values.shape), axis=1) if times is not None else np.ones((values.shape[0], values.shape[1] - 1))
+    rate = np.diff(log_values, axis=1) / dt  # rate[:, i] between frames i and i+1
+    valid = np.isfinite(rate)
+    # rolling sums over window rates with cumulative sums; only windows without missing rates count
+    csum = np.concatenate([np.zeros((rate.shape[0], 1)), np.cumsum(np.where(valid, rate, 0.0), axis=1)], axis=1)
+    cvalid = np.concatenate([np.zeros((rate.shape[0], 1), dtype=int), np.cumsum(valid, axis=1)], axis=1)
+    if rate.shape[1] < window:
+        return np.full(values.shape[0], -1)
+    mean_rate = (csum[:, window:] - csum[:, :-window]) / window
+    complete = (cvalid[:, window:] - cvalid[:, :-window]) == window
+    flat = complete & (mean_rate < rate_tol)
+    return np.where(flat.any(axis=1), flat.argmax(axis=1), -1)
+
+
+def cutoff_indices(
+    values: np.ndarray,
+    rule: str = "threshold",
+    threshold: Optional[float] = None,
+    times: Optional[np.ndarray] = None,
+    rate_tol: float = DEFAULT_RATE_TOL,
+    window: int = DEFAULT_WINDOW,
+) -> np.ndarray:
+    """Index of the last frame to keep in every row of values (n_series, n_frames)."""
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    last = _last_valid(values)
+    if rule == "threshold":
+        hit = values >= threshold
+        return np.where(hit.any(axis=1), hit.argmax(axis=1), last)
+    if rule == "below":
+        below = values < threshold
+        return np.where(below.any(axis=1), values.shape[1] - 1 - below[:, ::-1].argmax(axis=1), NOTHING_TO_KEEP)
+    if rule == "plateau":
+        start = _plateau(values, None if times is None else np.asarray(times, dtype=float), rate_tol, window)
+        return np.where(start >= 0, start, last)
+    raise ValueError(f"unknown cutoff rule: {rule}")
+
+
+def stack(series: Sequence[np.ndarray]) -> np.ndarray:
+    """Series of different lengths as one NaN-padded (n_series, n_frames) matrix for cutoff_indices."""
+    length = max((len(s) for s in series), default=0)
+    return np.vstack([np.pad(np.asarray(s, dtype=float), (0, length - len(s)), constant_values=np.nan) for s in series])
+
+
+def cutoff_index(values: np.ndarray, **rule) -> int:
+    """Cutoff of a single series (see cutoff_indices)."""
+    return int(cutoff_indices(np.asarray(values, dtype=float)[None], **rule)[0])
+
+
+def truncate(end: int, *arrays: Optional[np.ndarray]) -> Tuple[Optional[np.ndarray], ...]:
+    """The arrays up to index end included (None stays None)."""
+    return tuple(None if a is None else a[: end + 1] for a in arrays)
+
+
+def curve_cutoff(values: np.ndarray, stored: int = NOT_COMPUTED, **rule) -> int:
+    """Cutoff of one curve: the stored one (model_dataset "cutoff") if any, else computed on values with rule.
+
+    The cutoff is capped to the last frame of values (e.g. already cut at a
+    last frame); a ValueError is raised when there is nothing to keep.
+    """
+    stored = int(stored)
+    end = stored if stored != NOT_COMPUTED else cutoff_index(values, **rule)
+    if end < 0:
+        raise ValueError(f"no frame to keep (cutoff {'stored' if stored != NOT_COMPUTED else rule})")
+    return min(end, len(values) - 1)
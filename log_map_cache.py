@@ -0,0 +1,142 @@
+"""
+On-disk cache of per-frame LoG maps, so that re-analyses (new threshold, new
+ccmin/ccmax, new maxima rule) can skip reading the stacks and filtering.
+
+Layout (one file per frame, i.e. one chunk per frame):
+    {root}/{stack}/{variant}/sigma{sigma}/frame{n}.npy
+
+- stack is the image identifier used in the HDF5 output (e.g. "B3-7-C2"),
+- variant describes where the maps come from and how the SNR map was
+  obtained (e.g. "stack_rouge_1031_3f2a9c1e_c0_bw256": name and hash of the
+  full directory of the stacks, channel, background window, see variant(...)),
+  so that maps of other experiments (same stack names, even in directories
+  with the same name) or computed differently never collide.
+
+Maps are stored as float16 by default (half of float32, relative precision
+~1e-3, enough for thresholds around 0.03). With compress=False the files are
+plain .npy and are opened memory-mapped; with compress=True they are
+zlib-compressed .npz files (smaller, but read fully in memory).
+
+The cache size is bounded by max_bytes: when a new map would exceed it, the
+least recently used maps are deleted first. Recency is the file modification
+time, refreshed on each hit, so several runs sharing the cache directory see
+the same order. Temporary files left by interrupted writes are ignored.
+Several processes can share the directory (Detection_algorithm_stack.py with
+N_WORKERS shards): each one measures the whole directory again at least every
+rescan_seconds and whenever it goes over max_bytes, so max_bytes bounds the
+directory and not each process.
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+
+def variant(input_pattern: str, channel: int, background_window: int) -> str:
+    """Variant of the maps of a run: experiment (full directory of the stacks), channel and background window."""
+    directory = os.path.dirname(os.path.abspath(input_pattern))
+    # the name keeps the variant readable, the hash of the full path tells apart directories with the same name
+    digest = hashlib.sha256(directory.encode()).hexdigest()[:8]
+    return f"{os.path.basename(directory).replace(' ', '_')}_{digest}_c{channel}_bw{background_window}"
+
+
+class LogMapCache:
+    """Size-bounded LRU cache of LoG maps keyed by (stack, frame, sigma)."""
+
+    def __init__(
+        self,
+        root: str,
+        max_bytes: float = 50e9,
+        dtype: str = "float16",
+        compress: bool = False,
+        variant: str = "default",
+        rescan_seconds: float = 60.0,
+    ):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.dtype = np.dtype(dtype)
+        self.compress = compress
+        self.variant = variant
+        self.ext = ".npz" if compress else ".npy"
+        self.rescan_seconds = rescan_seconds
+        os.makedirs(root, exist_ok=True)
+        # path -> size, oldest first
+        self.index = OrderedDict()
+        self.total_bytes = 0
+        self._scan()
+
+    def _scan(self) -> None:
+        self.index.clear()
+        self.total_bytes = 0
+        self.scanned_at = time.monotonic()
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                # ".tmp" files are maps whose write was interrupted (see put)
+                if name.endswith((".npy", ".npz")) and ".tmp" not in name:
+                    try:
+                        st = os.stat(os.path.join(dirpath, name))
+                    except FileNotFoundError:  # evicted by another process meanwhile
+                        continue
+                    entries.append((st.st_mtime, os.path.join(dirpath, name), st.st_size))
+        for _, path, size in sorted(entries):
+            self.index[path] = size
+            self.total_bytes += size
+
+    def path(self, stack: str, ip: int, sigma: float) -> str:
+        return os.path.join(self.root, str(stack), self.variant, f"sigma{sigma:g}", f"frame{ip}{self.ext}")
+
+    def has(self, stack: str, ip: int, sigma: float) -> bool:
+        return os.path.isfile(self.path(stack, ip, sigma))
+
+    def get(self, stack: str, ip: int, sigma: float) -> Optional[np.ndarray]:
+        """Return the cached map (memory-mapped for .npy files) or None."""
+        path = self.path(stack, ip, sigma)
+        try:
+            if self.compress:
+                with np.load(path) as npz:
+                    lap = npz["lap"]
+            else:
+                lap = np.load(path, mmap_mode="r")
+        except FileNotFoundError:
+            self.index.pop(path, None)
+            return None
+        os.utime(path)
+        if path in self.index:
+            self.index.move_to_end(path)
+        return lap
+
+    def put(self, stack: str, ip: int, sigma: float, lap: np.ndarray) -> None:
+        """Store one map, evicting the least recently used ones if needed."""
+        path = self.path(stack, ip, sigma)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        info = np.finfo(self.dtype)
+        values = np.clip(lap, info.min, info.max).astype(self.dtype)
+        tmp = path + ".tmp" + self.ext
+        if self.compress:
+            np.savez_compressed(tmp, lap=values)
+        else:
+            np.save(tmp, values)
+        os.replace(tmp, path)
+
+        size = os.path.getsize(path)
+        self.total_bytes += size - self.index.pop(path, 0)
+        self.index[path] = size
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete the least recently used maps until the cache fits in max_bytes."""
+        # the maps written by the other processes sharing the directory are only seen by measuring it again
+        if self.total_bytes > self.max_bytes or time.monotonic() - self.scanned_at > self.rescan_seconds:
+            self._scan()
+        while self.total_bytes > self.max_bytes and len(self.index) > 1:
+            path, size = self.index.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
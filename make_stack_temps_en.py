@@ -10,11 +10,29 @@ Main steps:
 2. For each well and position, collect all matching image files along with their timestamps.
 3. Sort the images by time and stack them into a single TIFF file for each well-position.
 4. Save the stacked files in a dedicated output directory.
+5. Write the acquisition time of every page next to each stack ({well}-{pos}-{channel}_stack_times.csv, see
+   time_axes.py), so that the detection stores the real times with the counts.
+
+With embed_times = True, the times are also embedded in the stacks themselves: the TIFF stacks are written as
+OME-TIFF (one T series, AcquisitionDate of the first image and DeltaT of every plane, camera/well/position/channel
+in the Description), and the Zarr stacks get them in their "acquisition" attributes. The detection reads the
+embedded times first.
+
+The pages can be written compressed (compression = 'zstd', 'lzw' or 'deflate', with a predictor) and tiled,
+which typically halves the size of the stacks and the bytes read over the network by the detection.
+Compression is lossless. 'deflate' and 'lzw' are read by every Bio-Formats version; 'zstd' (and 'lzw' for
+writing) needs the imagecodecs package, and 'zstd' needs a recent Bio-Formats to be read by
+Detection_algorithm_stack.py. Use benchmark_stack_encoding.py to compare size and read throughput.
+
+With output_format = 'zarr', each stack is written as an OME-Zarr directory ({well}-{pos}-{channel}_stack.zarr,
+see zarr_stack.py) instead of a TIFF file. An existing Zarr stack is extended with the images acquired since
+the previous run only, so the script can be run again during the acquisition.
 """
 
 import os
 from datetime import datetime
 import tifffile
+import time_axes
 
 # Configurable parameters
 subdir_name = '1031'  # We process all wells (puits) and all positions of one plate at a time. 
@@ -30,6 +48,22 @@ output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"stack bf
 puits = ['A1', 'A2', 'A3', 'B1', 'B2', 'B3', 'C1', 'C2', 'C3']  # List of well names
 positions = range(1, 10)  # Positions 1-9 in each well
 
+# Output format of the stacks
+output_format = 'tiff'  # 'tiff' (multi-page BigTIFF) or 'zarr' (OME-Zarr directory, appendable)
+
+# Acquisition times and metadata embedded in the stacks (OME-XML / Zarr attributes), in addition to the sidecar
+embed_times = True
+
+# Output encoding of the TIFF stacks
+compression = None  # None (uncompressed, as before), 'zstd', 'lzw' or 'deflate'
+compression_level = None  # e.g. 3 for zstd, 6 for deflate; None uses the codec default
+predictor = True  # Horizontal differencing before compression (smaller files for smooth images)
+tile = None  # e.g. (256, 256) to write tiled pages; None writes strips as before
+compression_threads = 1  # Number of threads compressing the strips/tiles of a page
+
+if output_format == 'zarr':
+    import zarr_stack
+
 # Create the output directory if it doesn't exist
 os.makedirs(output_dir, exist_ok=True)
 
@@ -94,6 +128,17 @@ for month_dir in os.listdir(base_path):
                         # Record the timestamp and file path
                         file_records[(puit, pos)].append((dt, file_path))
 
+# Options of tif.write for the selected output encoding
+write_options = {}
+if compression is not None:
+    write_options['compression'] = compression
+    write_options['predictor'] = predictor
+    write_options['maxworkers'] = compression_threads
+    if compression_level is not None:
+        write_options['compressionargs'] = {'level': compression_level}
+if tile is not None:
+    write_options['tile'] = tile
+
 # For each well and position, stack the images in chronological order and save as a multi-page TIFF
 for (puit, pos), records in file_records.items():
     if not records:
@@ -104,15 +149,45 @@ for (puit, pos), records in file_records.items():
     sorted_records = sorted(records, key=lambda x: x[0])
     # Extract only the file paths from the sorted records to create a time-ordered list of images   
     sorted_files = [path for dt, path in sorted_records]
+    sorted_times = [dt for dt, path in sorted_records]
+
+    if output_format == 'zarr':
+        output_path = os.path.join(output_dir, f"{puit}-{pos}-{channel}_stack.zarr")
+        try:
+            if zarr_stack.is_zarr_stack(output_path):
+                stack = zarr_stack.open_stack(output_path, mode='a')
+            else:
+                first = tifffile.imread(sorted_files[0])
+                stack = zarr_stack.create_stack(output_path, first.shape, first.dtype)
+            # Only the images not yet in the stack are appended
+            n_before = stack.shape[0]
+            n_after = zarr_stack.append_frames(stack, (tifffile.imread(path) for path in sorted_files[n_before:]))
+            time_axes.write_sidecar(output_path, sorted_times[:n_after])
+            if embed_times:
+                zarr_stack.write_acquisition(output_path, sorted_times[:n_after], camera=subdir_name, well=puit,
+                                             position=pos, channel=channel)
+            print(f"Updated {output_path} ({n_after - n_before} new images, {n_after} in total)")
+        except Exception as e:
+            print(f"Error processing {puit}-{pos}: {str(e)}")
+        continue
 
     output_path = os.path.join(output_dir, f"{puit}-{pos}-{channel}_stack.tif")
 
     try:
-        # Write all images into a single TIFF stack
-        with tifffile.TiffWriter(output_path, bigtiff=True) as tif:
-            for file_path in sorted_files:
-                img = tifffile.imread(file_path)
-                tif.write(img)
+        if embed_times:
+            # Write all images as one OME-TIFF time series, with the acquisition time of every plane
+            first = tifffile.imread(sorted_files[0])
+            metadata = time_axes.ome_metadata(sorted_times[0], sorted_times, f"{puit}-{pos}-{channel}",
+                                              camera=subdir_name, well=puit, position=pos, channel=channel)
+            time_axes.write_ome_series(output_path, (tifffile.imread(file_path) for file_path in sorted_files),
+                                       len(sorted_files), first, metadata, **write_options)
+        else:
+            # Write all images into a single TIFF stack
+            with tifffile.TiffWriter(output_path, bigtiff=True) as tif:
+                for file_path in sorted_files:
+                    img = tifffile.imread(file_path)
+                    tif.write(img, **write_options)
+        time_axes.write_sidecar(output_path, sorted_times)
         print(f"Created {output_path} ({len(sorted_files)} images)")
     except Exception as e:
         print(f"Error processing {puit}-{pos}: {str(e)}")
@@ -0,0 +1,96 @@
+"""
+Merge per-stack detection shards into one detection HDF5 file.
+
+With SHARD_DIR set, Detection_algorithm_stack.py writes every stack to its own
+small HDF5 file (Image{id}.hdf5) holding the usual keys Image{id}/background
+and Image{id}/frame{n}. Workers never share a file, so they do not wait on each
+other. This script gathers the shards into the single file the other scripts
+read (output_file_*.hdf5):
+
+    - mode "copy": every Image{id} group is copied object by object with h5py
+      (no decoding of the dataframes). The result is a normal self-contained
+      file readable with pandas.read_hdf and with h5py.
+    - mode "link": the merged file only holds HDF5 external links to the
+      shards (instant, no data copied). h5py follows the links transparently,
+      so the count readers (f[group][frame]['block0_values']) work unchanged,
+      and so do recent PyTables versions behind pandas.read_hdf. Links are
+      stored relative to the merged file, so keep the shards next to it, and
+      use "copy" when the file has to be moved or shared on its own.
+
+The run attributes (channel, sigma, seuil, ...) are taken from the first shard.
+"""
+
+import glob
+import os
+from typing import List
+
+import h5py
+import pandas as pd
+
+
+# ------- Configuration -------
+SHARD_PATTERN = "./results 141125/shards 1031/Image*.hdf5"
+OUTPUT_HDF5 = "./results 141125/output_file_1031_0.0375.hdf5"
+MERGE_MODE = "copy"  # "copy" or "link"
+
+# attributes PyTables writes on every file root; the merged file gets its own
+PYTABLES_ROOT_ATTRS = {"CLASS", "TITLE", "VERSION", "PYTABLES_FORMAT_VERSION"}
+
+
+def copyInto(src: h5py.Group, dst: h5py.Group) -> None:
+    """Copy the attributes and children of src into dst, merging the groups present in both."""
+    for name, value in src.attrs.items():
+        dst.attrs[name] = value
+    for name, obj in src.items():
+        if isinstance(obj, h5py.Group) and name in dst:
+            copyInto(obj, dst[name])
+        else:
+            src.copy(obj, dst, name=name)
+
+
+def checkShard(shard: str) -> None:
+    """Read back the first frame of every stack of a shard with pandas and its background with h5py."""
+    with h5py.File(shard, "r") as f:
+        stacks = [name for name in f.keys() if name.startswith("Image")]
+        frames = {name: sorted(k for k in f[name].keys() if k.startswith("frame")) for name in stacks}
+        missing = [name for name in stacks if "background" not in f[name]]
+    if missing:
+        raise ValueError(f"{shard}: no background for {missing}")
+    for name, keys in frames.items():
+        if keys:
+            pd.read_hdf(shard, key=f"{name}/{keys[0]}")
+
+
+def mergeShards(shards: List[str], output_path: str, mode: str = "copy") -> None:
+    """Gather the Image{id} groups of all shards into output_path."""
+    if mode not in ("copy", "link"):
+        raise ValueError(f"unknown merge mode: {mode}")
+    out_dir = os.path.dirname(os.path.abspath(output_path))
+    with h5py.File(output_path, "w") as out:
+        for i, shard in enumerate(shards):
+            with h5py.File(shard, "r") as src:
+                if i == 0:
+                    for name, value in src.attrs.items():
+                        if name not in PYTABLES_ROOT_ATTRS:
+                            out.attrs[name] = value
+                for name in src.keys():
+                    if name in out:
+                        raise ValueError(f"{name} is present in several shards (last one: {shard})")
+                    if mode == "copy":
+                        src.copy(src[name], out, name=name)
+                    else:
+                        target = os.path.relpath(os.path.abspath(shard), out_dir)
+                        out[name] = h5py.ExternalLink(target, f"/{name}")
+        out.attrs["n_shards"] = len(shards)
+
+
+def main() -> None:
+    shards = sorted(glob.glob(SHARD_PATTERN))
+    if not shards:
+        raise FileNotFoundError(f"No shard matches {SHARD_PATTERN}")
+    mergeShards(shards, OUTPUT_HDF5, mode=MERGE_MODE)
+    print(f"Merged {len(shards)} shards into {OUTPUT_HDF5} ({MERGE_MODE})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Binary dataset of the mean/std density curves of a campaign, with an indexed loader.
+
+One compressed .npz holds every series the model and plotting scripts read,
+instead of one txt file per well:
+    condition        (n,)    e.g. "hypoxie", "normoxie"
+    dose             (n,)    Gy
+    well             (n,)    e.g. "A2"
+    idx              (n,)    well number of the model (1 = lowest initial density)
+    time_step_hours  (n,)    hours between two frames (NaN if unknown)
+    mean, std        (n, T)  density (cells/µm^2) per frame, NaN-padded
+    time             (n, T)  optional acquisition times (h since the first frame, see time_axes.py);
+                             NaN where unknown, in which case frame * time_step_hours is used
+    cutoff           (n,)    optional last frame to fit/plot (see growth_cutoff.py), NOT_COMPUTED (-2) where no rule was applied
+It is written by export_density_bulk.py (CONSOLIDATED_NPZ) or converted from
+existing txt files with from_txt(...). Loading reads the file once and builds
+an index (condition, dose, idx) -> row, e.g.
+    dataset = model_dataset.load(path)
+    curve = dataset.series("hypoxie", 0, 6)   # {"time", "mean", "std", "cutoff"}
+    curves = dataset.wells("normoxie", 0)     # {idx: {"time", "mean", "std"}}
+and curves with different time points are put on one grid with
+    grid, means = dataset.aligned([("hypoxie", 0, 6), ("normoxie", 0, 6)], step_hours=1.5)
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import time_axes
+from growth_cutoff import NOT_COMPUTED
+
+
+# ------- Configuration -------
+# (condition, dose, directory, file template, hours between frames) of the txt files to convert
+TXT_SOURCES = [
+    ("hypoxie", 0, "../Cell_Radiation_Proliferation_Model/results txt for model 1114/hypoxie", "0_Gy_Well{idx}_3exps.txt", 1.5),
+    ("normoxie", 0, "../Cell_Radiation_Proliferation_Model/results txt for model 1114/normoxie", "0_Gy_Well{idx}_3exps.txt", 3),
+]
+TXT_WELLS = [1, 2, 3, 4, 5, 6]
+OUTPUT_NPZ = "../Cell_Radiation_Proliferation_Model/results txt for model 1114/campaign_1114.npz"
+
+FIELDS = ("condition", "dose", "well", "idx", "time_step_hours", "mean", "std")
+OPTIONAL_FIELDS = ("time", "cutoff")
+
+
+class CampaignDataset:
+    """All mean/std curves of a campaign, indexed by (condition, dose, idx)."""
+
+    def __init__(self, condition, dose, well, idx, time_step_hours, mean, std, time=None, cutoff=None):
+        self.condition = np.asarray(condition, dtype=str)
+        self.dose = np.asarray(dose, dtype=float)
+        self.well = np.asarray(well, dtype=str)
+        self.idx = np.asarray(idx, dtype=np.int32)
+        self.time_step_hours = np.asarray(time_step_hours, dtype=float)
+        self.mean = np.atleast_2d(np.asarray(mean, dtype=float))
+        self.std = np.atleast_2d(np.asarray(std, dtype=float))
+        self.time = np.full(self.mean.shape, np.nan) if time is None else np.atleast_2d(np.asarray(time, dtype=float))
+        self.cutoff = np.full(len(self.idx), NOT_COMPUTED, dtype=np.int32) if cutoff is None else np.asarray(cutoff, dtype=np.int32)
+        self.index = {}
+        for row, key in enumerate(zip(self.condition, self.dose, self.idx)):
+            key = (str(key[0]), float(key[1]), int(key[2]))
+            if key in self.index:
+                raise ValueError(f"duplicate series {key}")
+            self.index[key] = row
+
+    def __len__(self) -> int:
+        return len(self.idx)
+
+    def keys(self) -> List[Tuple[str, float, int]]:
+        return list(self.index)
+
+    def row(self, condition: str, dose: float, idx: int) -> int:
+        try:
+            return self.index[(condition, float(dose), int(idx))]
+        except KeyError:
+            raise KeyError(f"no series for condition={condition} dose={dose} well={idx}") from None
+
+    def series(self, condition: str, dose: float, idx: int, trim: bool = True) -> Dict[str, np.ndarray]:
+        """time (h), mean, std and cutoff of one curve; trim drops the NaN padding at the end."""
+        row = self.row(condition, dose, idx)
+        mean, std, time = self.mean[row], self.std[row], self.time[row]
+        if trim:
+            valid = np.flatnonzero(~np.isnan(mean))
+            n = valid[-1] + 1 if valid.size else 0
+            mean, std, time = mean[:n], std[:n], time[:n]
+        # acquisition times where they are known, the regular axis elsewhere
+        time = np.where(np.isnan(time), time_axes.regular_times(len(mean), self.time_step_hours[row]), time)
+        return {"time": time, "mean": mean, "std": std, "cutoff": int(self.cutoff[row])}
+
+    def wells(self, condition: str, dose: float, wells: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, np.ndarray]]:
+        """Curves of every well (or of the given wells) of one condition and dose."""
+        if wells is None:
+            wells = sorted(i for c, d, i in self.index if c == condition and d == float(dose))
+        return {idx: self.series(condition, dose, idx) for idx in wells}
+
+    def aligned(
+        self, keys: Sequence[Tuple[str, float, int]], step_hours: float, field: str = "mean",
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Common time grid of the given series and their values interpolated on it, shape (n_keys, n_grid)."""
+        rows = [self.row(*key) for key in keys]
+        times = np.vstack([self.series(*key, trim=False)["time"] for key in keys])
+        values = getattr(self, field)[rows]
+        grid = time_axes.common_grid(np.where(np.isnan(values), np.nan, times), step_hours)
+        return grid, time_axes.resample(times, values, grid)
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(path, **{name: getattr(self, name) for name in FIELDS + OPTIONAL_FIELDS})
+
+
+def load(path: str) -> CampaignDataset:
+    with np.load(path, allow_pickle=False) as npz:
+        return CampaignDataset(**{name: npz[name] for name in FIELDS + OPTIONAL_FIELDS if name in npz})
+
+
+def from_txt(sources: Sequence[Tuple[str, float, str, str, float]], wells: Sequence[int] = TXT_WELLS) -> CampaignDataset:
+    """Build a dataset from the two-column (mean, std) txt files of each source."""
+    columns = {name: [] for name in FIELDS}
+    for condition, dose, directory, template, step in sources:
+        for idx in wells:
+            arr = np.loadtxt(os.path.join(directory, template.format(idx=idx, dose=dose)), ndmin=2)
+            columns["condition"].append(condition)
+            columns["dose"].append(dose)
+            columns["well"].append("")
+            columns["idx"].append(idx)
+            columns["time_step_hours"].append(step)
+            columns["mean"].append(arr[:, 0])
+            columns["std"].append(arr[:, 1] if arr.shape[1] > 1 else np.full(len(arr), np.nan))
+    # curves of different lengths are NaN-padded to the longest one
+    length = max(len(m) for m in columns["mean"])
+    for name in ("mean", "std"):
+        columns[name] = np.vstack([np.pad(v, (0, length - len(v)), constant_values=np.nan) for v in columns[name]])
+    return CampaignDataset(**columns)
+
+
+def main() -> None:
+    dataset = from_txt(TXT_SOURCES)
+    dataset.save(OUTPUT_NPZ)
+    print(f"Saved {len(dataset)} series to: {OUTPUT_NPZ}")
+
+
+if __name__ == "__main__":
+    main()
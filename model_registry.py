@@ -0,0 +1,75 @@
+"""
+Registry of the growth/radiation models, fitted with one shared backend.
+
+Each model is a CompartmentModel subclass (compartment_model.py) declaring
+its state vector, fitted parameters, bounds and right-hand side; it is
+registered under its name with @register. A variant is a new subclass of a
+few lines instead of a copy of the fit script.
+
+    model = model_registry.make("radiation", time_points, C0, dose=20)
+    popt, chi2, optima = model_registry.fit(model, exp, std)
+
+fit() is the same for every model: Sobol screening of the parameter space,
+local fits from the best seeds and merging of the optima (fit_seeding.py),
+with the integrations cached by the model. model_uncertainty.py (confidence
+intervals) and model_selection.py (comparison of the models over all wells)
+take the same objects.
+"""
+
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+import fit_seeding
+from compartment_model import CompartmentModel
+from radiation_model import RadiationModel, RadiationModelFreeTr
+
+
+MODELS: Dict[str, Type[CompartmentModel]] = {}
+
+
+def register(cls: Type[CompartmentModel]) -> Type[CompartmentModel]:
+    if not cls.name:
+        raise ValueError(f"{cls.__name__} has no name")
+    if len(cls.bounds[0]) != len(cls.param_names) or len(cls.bounds[1]) != len(cls.param_names):
+        raise ValueError(f"bounds of {cls.name} do not match its parameters {cls.param_names}")
+    MODELS[cls.name] = cls
+    return cls
+
+
+class LogisticModel(CompartmentModel):
+    """Logistic growth without radiation response, dC = k*C*(1-C/Cmax) (reference for the 0 Gy wells)."""
+
+    name = "logistic"
+    state_names = ("C",)
+    param_names = ("k", "Cmax")
+    bounds = ([0, 1e-4], [0.2, 1e-2])
+
+    def rhs(self, t, y, k, Cmax):
+        C = y[0]
+        return [k * C * (1 - C / Cmax)]
+
+
+for _cls in (RadiationModel, RadiationModelFreeTr, LogisticModel):
+    register(_cls)
+
+
+def make(name: str, time_points, C0: float, dose: Optional[float] = None, **fixed) -> CompartmentModel:
+    """Model name for one well; dose sets the dose-dependent fixed parameters (e.g. Ta)."""
+    try:
+        cls = MODELS[name]
+    except KeyError:
+        raise KeyError(f"unknown model {name!r}, registered: {sorted(MODELS)}") from None
+    if dose is None:
+        missing = [name for name in cls.dose_parameters if name not in fixed]
+        if missing:
+            raise ValueError(f"model {cls.name!r} needs a dose (or {', '.join(missing)} given directly)")
+        return cls(time_points, C0, **fixed)
+    return cls.for_dose(time_points, C0, dose, **fixed)
+
+
+def fit(
+    model: CompartmentModel, exp: np.ndarray, std: np.ndarray, bounds: Optional[Tuple] = None, **options,
+) -> Tuple[np.ndarray, float, List[Dict]]:
+    """Best parameters, chi2 and distinct optima of a model (options of fit_seeding.two_stage_fit)."""
+    return fit_seeding.two_stage_fit(model, exp, std, bounds if bounds is not None else model.bounds, **options)
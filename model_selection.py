@@ -0,0 +1,226 @@
+"""
+Compare the registered models on every well of the campaign dataset with chi2, AIC and BIC.
+
+Every (model, condition, dose, well) of MODELS x the dataset (model_dataset.py)
+is fitted with the shared backend of model_registry.py, in N_WORKERS
+processes. The curves are cut and weighted as in model_uncertainty.py
+(LAST_FRAME, stored cutoff or CUT_DENSITY, STD_FRACTION). With the std taken as the
+measurement errors, -2 log L = chi2 + const, so
+    AIC = chi2 + 2k        BIC = chi2 + k ln(n)
+(k fitted parameters, n points). The table has one row per model and well,
+ranked by AIC within each well, with delta AIC and Akaike weights, and is
+written to OUTPUT_CSV.
+
+Completed fits are stored in a SQLite cache (CACHE_PATH) under a key hashing
+the model (name, source of the modules of its classes, fixed parameters), the
+source of the fit code (model_registry.py, fit_seeding.py, model_uncertainty.py), the
+dose, the curve (time points, values, std) and the fit settings. Running again after adding wells or models only
+fits the new combinations; changing a model, a curve or a setting refits the
+affected ones.
+"""
+
+import hashlib
+import inspect
+import json
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import fit_seeding
+import model_dataset
+import model_registry
+import model_uncertainty
+
+
+# ------- Configuration -------
+DATASET_PATH = "../Cell_Radiation_Proliferation_Model/results txt for model 1114/campaign_1114.npz"
+MODELS = ["radiation", "radiation_free_tr", "logistic"]  # Names in model_registry.MODELS
+CONDITIONS = None  # e.g. ["hypoxie"]; None for all the conditions of the dataset
+FIT_SETTINGS = {"n_seeds": 1024, "top_k": 16, "method": "sobol", "seed": 0}  # Options of model_registry.fit
+N_WORKERS = 4
+CACHE_PATH = "./model_selection_cache.sqlite"
+OUTPUT_CSV = "./results 141125/model_selection.csv"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fits (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    condition TEXT,
+    dose REAL,
+    well INTEGER,
+    result TEXT NOT NULL,
+    fitted_at TEXT
+);
+"""
+
+
+def connect(cache_path: str) -> sqlite3.Connection:
+    con = sqlite3.connect(cache_path)
+    con.executescript(SCHEMA)
+    return con
+
+
+def fit_key(
+    model_name: str, model, dose: float, time_points: np.ndarray, exp: np.ndarray, std: np.ndarray, settings: Dict,
+) -> str:
+    h = hashlib.sha256()
+    h.update(model_name.encode())
+    # whole modules of the class hierarchy: the equations (e.g. radiation_rhs) and the tables of fixed
+    # parameters (e.g. ARREST_TIMES) live next to the classes
+    modules = []
+    for klass in type(model).__mro__:
+        if klass is not object and klass.__module__ not in modules and klass.__module__ != "builtins":
+            modules.append(klass.__module__)
+    # and the fit itself: the backend (model_registry.py), seeding and merging of the optima
+    # (fit_seeding.py), local fits and chi2 (model_uncertainty.py)
+    for module in (model_registry, fit_seeding, model_uncertainty):
+        if module.__name__ not in modules:
+            modules.append(module.__name__)
+    for name in modules:
+        try:
+            h.update(inspect.getsource(sys.modules[name]).encode())
+        except (OSError, TypeError):
+            h.update(name.encode())
+    # fixed parameters of the built model (Ta, k0, ...); the time points and C0 follow from the curve
+    fixed = {name: value for name, value in vars(model).items() if name not in ("_cache", "time_points")}
+    h.update(json.dumps(fixed, sort_keys=True, default=lambda v: np.asarray(v).tolist()).encode())
+    h.update(json.dumps(float(dose)).encode())
+    for array in (time_points, exp, std):
+        h.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def information_criteria(chi2: float, n_params: int, n_points: int) -> Dict[str, float]:
+    return {
+        "chi2": chi2,
+        "reduced_chi2": chi2 / (n_points - n_params) if n_points > n_params else np.nan,
+        "aic": chi2 + 2 * n_params,
+        "bic": chi2 + n_params * np.log(n_points),
+    }
+
+
+def fit_one(job: Dict) -> Dict:
+    """Fit one model to one curve; runs in the worker processes."""
+    start = time.time()
+    model = model_registry.make(job["model"], job["time_points"], job["exp"][0], dose=job["dose"])
+    popt, chi2, optima = model_registry.fit(model, job["exp"], job["std"], **job["settings"])
+    result = {
+        "params": dict(zip(model.param_names, map(float, popt))),
+        "n_params": len(model.param_names),
+        "n_points": int(job["exp"].size),
+        "n_optima": len(optima),
+        "seconds": time.time() - start,
+    }
+    result.update(information_criteria(float(chi2), result["n_params"], result["n_points"]))
+    return result
+
+
+def build_jobs(dataset: model_dataset.CampaignDataset, models: Sequence[str], conditions: Optional[Sequence[str]], settings: Dict) -> List[Dict]:
+    # the cutting and weighting of the curves are part of the key as well
+    key_settings = {**settings, "last_frame": model_uncertainty.LAST_FRAME, "cut_density": model_uncertainty.CUT_DENSITY,
+                    "std_fraction": model_uncertainty.STD_FRACTION}
+    jobs = []
+    for condition, dose, idx in dataset.keys():
+        if conditions is not None and condition not in conditions:
+            continue
+        curve = dataset.series(condition, dose, idx)
+        time_points, exp, std = model_uncertainty.prepare_curve(curve["mean"], curve["std"], curve["time"], curve["cutoff"])
+        for name in models:
+            try:
+                # models with dose-dependent fixed parameters need a known dose
+                model = model_registry.make(name, time_points, exp[0], dose=dose)
+            except KeyError:
+                print(f"Skipped {name} for {condition} {dose:g} Gy well {idx}: no parameters for this dose")
+                continue
+            jobs.append({
+                "model": name, "condition": condition, "dose": dose, "well": idx,
+                "time_points": time_points, "exp": exp, "std": std, "settings": settings,
+                "key": fit_key(name, model, dose, time_points, exp, std, key_settings),
+            })
+    return jobs
+
+
+def run(
+    dataset: model_dataset.CampaignDataset,
+    models: Sequence[str] = MODELS,
+    conditions: Optional[Sequence[str]] = CONDITIONS,
+    settings: Dict = FIT_SETTINGS,
+    cache_path: str = CACHE_PATH,
+    n_workers: int = N_WORKERS,
+) -> pd.DataFrame:
+    """Fit the models missing from the cache and return the ranked table of all of them."""
+    jobs = build_jobs(dataset, models, conditions, settings)
+    con = connect(cache_path)
+    try:
+        cached = {}
+        for job in jobs:
+            row = con.execute("SELECT result FROM fits WHERE key = ?", (job["key"],)).fetchone()
+            if row is not None:
+                cached[job["key"]] = json.loads(row[0])
+        todo = [job for job in jobs if job["key"] not in cached]
+        print(f"{len(jobs)} fits, {len(jobs) - len(todo)} from the cache, {len(todo)} to run")
+        if n_workers > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=min(n_workers, len(todo))) as pool:
+                results = pool.map(fit_one, todo)
+                for job, result in zip(todo, results):
+                    _store(con, job, result)
+                    cached[job["key"]] = result
+        else:
+            for job in todo:
+                result = fit_one(job)
+                _store(con, job, result)
+                cached[job["key"]] = result
+    finally:
+        con.close()
+
+    rows = []
+    for job in jobs:
+        result = cached[job["key"]]
+        rows.append({
+            "condition": job["condition"], "dose": job["dose"], "well": job["well"], "model": job["model"],
+            **{k: result[k] for k in ("n_params", "n_points", "chi2", "reduced_chi2", "aic", "bic", "n_optima")},
+            "params": json.dumps(result["params"]),
+        })
+    return rank(pd.DataFrame(rows))
+
+
+def _store(con: sqlite3.Connection, job: Dict, result: Dict) -> None:
+    # committed one by one, so an interrupted run keeps its finished fits
+    con.execute(
+        "INSERT OR REPLACE INTO fits (key, model, condition, dose, well, result, fitted_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (job["key"], job["model"], job["condition"], float(job["dose"]), int(job["well"]), json.dumps(result),
+         time.strftime("%Y-%m-%d %H:%M:%S")),
+    )
+    con.commit()
+
+
+def rank(table: pd.DataFrame) -> pd.DataFrame:
+    """Rank, delta AIC/BIC and Akaike weights of the models within each (condition, dose, well)."""
+    if table.empty:
+        return table
+    group = table.groupby(["condition", "dose", "well"])["aic"]
+    table["delta_aic"] = table["aic"] - group.transform("min")
+    table["delta_bic"] = table["bic"] - table.groupby(["condition", "dose", "well"])["bic"].transform("min")
+    likelihood = np.exp(-0.5 * table["delta_aic"])
+    table["akaike_weight"] = likelihood / likelihood.groupby([table["condition"], table["dose"], table["well"]]).transform("sum")
+    # a failed fit (NaN AIC) is ranked after the models that converged
+    table["rank"] = group.rank(method="min", na_option="bottom").astype(int)
+    return table.sort_values(["condition", "dose", "well", "rank"]).reset_index(drop=True)
+
+
+def main() -> None:
+    table = run(model_dataset.load(DATASET_PATH))
+    table.to_csv(OUTPUT_CSV, index=False)
+    print(table.groupby("model")[["chi2", "aic", "bic"]].median())
+    print("Best model per well:", table[table["rank"] == 1]["model"].value_counts().to_dict())
+    print(f"Saved: {OUTPUT_CSV}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Confidence intervals of the radiation model parameters (ts, tu) by bootstrap and profile likelihood.
+
+Starting from the best fit of a well (popt, e.g. from Find_best_popt):
+
+- bootstrap(...): N_BOOTSTRAP synthetic curves are built around the fitted
+  curve, either by resampling the residuals ("residual") or by adding
+  Gaussian noise of the given std ("parametric"), and refitted. The 2.5/97.5
+  percentiles of the refitted parameters give the 95% interval.
+- profile(...): one parameter is fixed on a grid around its best value and
+  the other ones are refitted; the interval is where the chi2 increase stays
+  below the chi2 quantile (3.84 for 95%, one parameter). This assumes the std
+  are the true measurement errors. The grid is scaled on the bootstrap
+  interval and widened while the interval is open at one of its edges.
+
+Fits here are weighted by std (curve_fit sigma), so that the minimized
+quantity is the chi2 of the profiles.
+
+Every refit is a local curve_fit warm-started from popt, so it converges in a
+few iterations. The refits are spread over N_WORKERS processes; each worker
+receives the model once (RadiationModel is picklable) and keeps its own cache
+of integrations.
+
+main() computes both intervals for every well of the campaign dataset
+(see model_dataset.py) and writes one CSV row per (condition, dose, well).
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import curve_fit
+from scipy.stats import chi2 as chi2_distribution
+
+import growth_cutoff
+import model_dataset
+from radiation_model import ARREST_TIMES, RadiationModel
+
+
+# ------- Configuration -------
+DATASET_PATH = "../Cell_Radiation_Proliferation_Model/results txt for model 1114/campaign_1114.npz"
+CONDITIONS = ["hypoxie"]  # Conditions of the dataset to analyse
+LAST_FRAME = 130  # Frames used in the fit, as last_frame in the fit script
+CUT_DENSITY = 1.1e-3  # Curves without a stored cutoff are cut after the last point below this density (ind_cut in the fit script)
+STD_FRACTION = 0.2  # std = STD_FRACTION * mean, as in the fit script; None uses the std of the dataset
+BOUNDS = ([0, 0], [0.06, 0.2])  # Bounds of ts and tu
+N_STARTS = 20  # Random starts of the initial best fit
+N_BOOTSTRAP = 1000
+BOOTSTRAP_KIND = "residual"  # "residual" or "parametric"
+PROFILE_POINTS = 41  # Grid points of each profile
+PROFILE_SPAN = 1.0  # Grid from popt*(1-span) to popt*(1+span), clipped to the bounds, when there is no bootstrap
+PROFILE_WIDTH = 3.0  # Otherwise the grid spans PROFILE_WIDTH times the bootstrap interval around popt
+PROFILE_WIDEN = 3  # Times the grid is widened (x4) while the interval is open at one edge
+LEVEL = 0.95
+N_WORKERS = 4
+SEED = 0
+OUTPUT_CSV = "./results 141125/radiation_model_uncertainty.csv"
+
+# state of the worker processes
+_WORKER = {}
+
+
+def chi2(exp: np.ndarray, fit: np.ndarray, std: np.ndarray) -> float:
+    """Sum of squared normalized residuals (the fit script's Chi2 without the 1/(n-k) factor)."""
+    return float(np.sum(((exp - fit) / std) ** 2))
+
+
+def local_fit(model, exp, std, p0, bounds, fixed: Optional[Tuple[int, float]] = None) -> Tuple[np.ndarray, float]:
+    """Bounded curve_fit from p0; with fixed=(i, value) parameter i is held at value."""
+    t = model.time_points
+    p0 = np.asarray(p0, dtype=float)
+    lower, upper = np.asarray(bounds[0], dtype=float), np.asarray(bounds[1], dtype=float)
+    if fixed is None:
+        f, free, lo, hi = model, p0, lower, upper
+    else:
+        i, value = fixed
+        mask = np.arange(p0.size) != i
+
+        def f(t, *free):
+            return model(t, *np.insert(np.asarray(free), i, value))
+
+        free, lo, hi = p0[mask], lower[mask], upper[mask]
+    free = np.clip(free, lo, hi)
+    try:
+        popt, _ = curve_fit(f, t, exp, p0=free, sigma=std, bounds=(lo, hi), maxfev=20000)
+    except (RuntimeError, ValueError):
+        return np.full(p0.size, np.nan), np.inf
+    full = popt if fixed is None else np.insert(popt, fixed[0], fixed[1])
+    return full, chi2(exp, model(t, *full), std)
+
+
+def best_fit(model, exp, std, bounds, n_starts: int = N_STARTS, seed: int = SEED) -> Tuple[np.ndarray, float]:
+    """Best of n_starts local fits from uniform random starts within the bounds.
+
+    Raises a RuntimeError when none of the fits converged.
+    """
+    rng = np.random.default_rng(seed)
+    best, best_chi2 = None, np.inf
+    for p0 in rng.uniform(bounds[0], bounds[1], size=(n_starts, len(bounds[0]))):
+        popt, c2 = local_fit(model, exp, std, p0, bounds)
+        if c2 < best_chi2:
+            best, best_chi2 = popt, c2
+    if best is None:
+        raise RuntimeError(f"none of the {n_starts} fits of {model.name or type(model).__name__} converged")
+    return best, best_chi2
+
+
+def _init_worker(model, exp, std, popt, bounds) -> None:
+    _WORKER.update(model=model, exp=exp, std=std, popt=popt, bounds=bounds, fitted=model(model.time_points, *popt))
+
+
+def _bootstrap_chunk(args) -> np.ndarray:
+    seed, n, kind = args
+    w = _WORKER
+    rng = np.random.default_rng(seed)
+    residuals = w["exp"] - w["fitted"]
+    out = np.empty((n, len(w["popt"])))
+    for j in range(n):
+        if kind == "parametric":
+            sample = w["fitted"] + rng.normal(0.0, w["std"])
+        else:
+            sample = w["fitted"] + rng.choice(residuals, size=residuals.size, replace=True)
+        out[j], _ = local_fit(w["model"], sample, w["std"], w["popt"], w["bounds"])
+    return out
+
+
+def _profile_point(args) -> Tuple[np.ndarray, float]:
+    i, value = args
+    w = _WORKER
+    return local_fit(w["model"], w["exp"], w["std"], w["popt"], w["bounds"], fixed=(i, value))
+
+
+def _pool(model, exp, std, popt, bounds, n_workers):
+    return ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(model, exp, std, popt, bounds))
+
+
+def bootstrap(
+    model, exp, std, popt, bounds,
+    n_boot: int = N_BOOTSTRAP, kind: str = BOOTSTRAP_KIND, n_workers: int = N_WORKERS, seed: int = SEED,
+) -> np.ndarray:
+    """Refitted parameters of n_boot bootstrap curves, shape (n_boot, n_params); NaN rows failed."""
+    if kind not in ("residual", "parametric"):
+        raise ValueError(f"unknown bootstrap kind: {kind}")
+    n_chunks = max(1, min(n_boot, 4 * n_workers))
+    sizes = np.diff(np.linspace(0, n_boot, n_chunks + 1).astype(int))
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    chunks = [(s, n, kind) for s, n in zip(seeds, sizes) if n > 0]
+    if n_workers > 1:
+        with _pool(model, exp, std, popt, bounds, n_workers) as pool:
+            return np.vstack(list(pool.map(_bootstrap_chunk, chunks)))
+    _init_worker(model, exp, std, popt, bounds)
+    return np.vstack([_bootstrap_chunk(c) for c in chunks])
+
+
+def profile(
+    model, exp, std, popt, bounds, i: int,
+    n_points: int = PROFILE_POINTS, span: float = PROFILE_SPAN, n_workers: int = N_WORKERS,
+    limits: Optional[Tuple[float, float]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Grid of values of parameter i and the minimal chi2 at each of them.
+
+    The grid covers limits (clipped to the bounds) if given, else popt*(1 -/+ span).
+    """
+    if limits is None:
+        limits = (popt[i] * (1 - span), popt[i] * (1 + span) if popt[i] > 0 else bounds[1][i])
+    lo = max(bounds[0][i], limits[0])
+    hi = min(bounds[1][i], limits[1])
+    grid = np.linspace(lo, hi, n_points)
+    tasks = [(i, value) for value in grid]
+    if n_workers > 1:
+        with _pool(model, exp, std, popt, bounds, n_workers) as pool:
+            results = list(pool.map(_profile_point, tasks))
+    else:
+        _init_worker(model, exp, std, popt, bounds)
+        results = [_profile_point(task) for task in tasks]
+    return grid, np.array([c2 for _, c2 in results])
+
+
+def percentile_interval(samples: np.ndarray, level: float = LEVEL) -> np.ndarray:
+    """(n_params, 2) lower/upper percentiles of the bootstrap parameters."""
+    alpha = 100 * (1 - level) / 2
+    return np.nanpercentile(samples, [alpha, 100 - alpha], axis=0).T
+
+
+def profile_interval(grid: np.ndarray, chi2_values: np.ndarray, chi2_min: float, level: float = LEVEL) -> Tuple[float, float]:
+    """Where chi2 - chi2_min crosses the chi2 quantile, linearly interpolated (NaN if open at the grid edge)."""
+    threshold = chi2_distribution.ppf(level, df=1)
+    delta = np.where(np.isfinite(chi2_values), chi2_values - chi2_min, np.inf)
+    ok = delta <= threshold
+    if not ok.any():
+        return np.nan, np.nan
+    inside = np.flatnonzero(ok)
+
+    def crossing(a: int, b: int) -> float:
+        # a inside, b outside
+        if not np.isfinite(delta[b]):
+            return grid[a]
+        return grid[a] + (threshold - delta[a]) / (delta[b] - delta[a]) * (grid[b] - grid[a])
+
+    lower = crossing(inside[0], inside[0] - 1) if inside[0] > 0 else np.nan
+    upper = crossing(inside[-1], inside[-1] + 1) if inside[-1] < grid.size - 1 else np.nan
+    return lower, upper
+
+
+def adaptive_profile_interval(
+    model, exp, std, popt, bounds, chi2_min, i: int, boot_interval,
+    widen: int = PROFILE_WIDEN, n_workers: int = N_WORKERS,
+) -> Tuple[float, float]:
+    """Profile interval of parameter i on a grid scaled on the bootstrap interval, widened while it is open.
+
+    bounds are those of the fit (e.g. model.bounds); the grid stops widening once it covers them.
+    """
+    # the bootstrap interval sets the scale of the grid; with std larger than the
+    # scatter of the points (STD_FRACTION) the profile interval is much wider
+    half = PROFILE_WIDTH * max(boot_interval[1] - boot_interval[0], 1e-6 * abs(popt[i]), 1e-12) / 2
+    for _ in range(widen + 1):
+        limits = (popt[i] - half, popt[i] + half)
+        grid, profile_chi2 = profile(model, exp, std, popt, bounds, i, n_workers=n_workers, limits=limits)
+        lower, upper = profile_interval(grid, profile_chi2, chi2_min)
+        at_bounds = limits[0] <= bounds[0][i] and limits[1] >= bounds[1][i]
+        if (np.isfinite(lower) and np.isfinite(upper)) or at_bounds:
+            break
+        half *= 4
+    return lower, upper
+
+
+def prepare_curve(
+    mean: np.ndarray, std: np.ndarray, time: np.ndarray, cutoff: int = growth_cutoff.NOT_COMPUTED,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Time points, mean and std of one well, cut as in the fit script.
+
+    time holds the hours of the frames (model_dataset "time": acquisition times
+    where known, so late or missing scans keep their real position); cutoff is the stored cutoff of the curve (model_dataset "cutoff"); without
+    one the curve is cut after its last point below CUT_DENSITY. Raises a
+    ValueError when there is no point to fit.
+    """
+    mean = mean[:LAST_FRAME]
+    std = STD_FRACTION * mean if STD_FRACTION is not None else std[:LAST_FRAME]
+    time_points = np.asarray(time, dtype=float)[:mean.size]
+    cutoff = growth_cutoff.curve_cutoff(mean, cutoff, rule="below", threshold=CUT_DENSITY)
+    return growth_cutoff.truncate(cutoff, time_points, mean, std)
+
+
+def main() -> None:
+    dataset = model_dataset.load(DATASET_PATH)
+    rows = []
+    for condition, dose, idx in dataset.keys():
+        if condition not in CONDITIONS or dose not in ARREST_TIMES:
+            continue
+        curve = dataset.series(condition, dose, idx)
+        time_points, exp, std = prepare_curve(curve["mean"], curve["std"], curve["time"], curve["cutoff"])
+        model = RadiationModel(time_points, exp[0], ARREST_TIMES[dose])
+
+        start = time.time()
+        try:
+            popt, chi2_min = best_fit(model, exp, std, BOUNDS)
+        except RuntimeError as error:
+            print(f"Skipped {condition} {dose:g} Gy well {idx}: {error}")
+            continue
+        samples = bootstrap(model, exp, std, popt, BOUNDS)
+        boot_ci = percentile_interval(samples)
+        row = {"condition": condition, "dose": dose, "well": idx, "chi2": chi2_min,
+               "n_points": exp.size, "bootstrap_failed": int(np.isnan(samples[:, 0]).sum())}
+        for i, name in enumerate(model.param_names):
+            row[name] = popt[i]
+            row[f"{name}_boot_low"], row[f"{name}_boot_high"] = boot_ci[i]
+            row[f"{name}_profile_low"], row[f"{name}_profile_high"] = adaptive_profile_interval(
+                model, exp, std, popt, BOUNDS, chi2_min, i, boot_ci[i])
+        rows.append(row)
+        print(f"{condition} {dose:g} Gy well {idx}: " + ", ".join(
+            f"{name}={row[name]:.4g} [{row[name + '_boot_low']:.4g}, {row[name + '_boot_high']:.4g}]"
+            for name in model.param_names) + f" ({time.time() - start:.1f} s)")
+
+    table = pd.DataFrame(rows)
+    table.to_csv(OUTPUT_CSV, index=False)
+    print(f"Saved: {OUTPUT_CSV}")
+
+
+if __name__ == "__main__":
+    main()
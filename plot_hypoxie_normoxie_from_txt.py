@@ -7,16 +7,22 @@ Data layout (per condition directory):
 
 The script builds one combined plot with 12 curves (6 hypoxie + 6 normoxie),
 then makes one highlight plot per initial density where the focal pair keeps
-full opacity and the other 10 curves are dimmed.
+full opacity and the other 10 curves are dimmed. The figures are rendered in
+parallel by figure_renderer.py, and figures whose data and settings did not
+change since the last run are not drawn again.
 添加了到一定maximum的截止功能
 """
 
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
-import matplotlib.pyplot as plt
+import matplotlib
 import numpy as np
 
+import figure_renderer
+import growth_cutoff
+import model_dataset
+
 
 # ------- Configuration -------
 # Data roots
@@ -28,6 +34,10 @@ NORMOXIE_DIR = Path("../Cell_Radiation_Proliferation_Model/results txt for model
 #FILE_TEMPLATE = "Well{idx}_Incucyte_F98_10Gy_2025_11_14_smooth=35.txt"
 FILE_TEMPLATE = "0_Gy_Well{idx}_3exps.txt"
 
+# Or read both conditions from one campaign dataset (see model_dataset.py); None reads the txt files above
+DATASET_PATH = None
+DATASET_DOSE = 0  # Dose (Gy) of the curves taken from the dataset
+
 # Initial density dictionary (x10^5/ml) keyed by file number.
 INITIAL_DENSITIES = {
     1: 0.043,
@@ -38,7 +48,8 @@ INITIAL_DENSITIES = {
     6: 1.39,
 }
 
-# Frame-to-time conversion (hours between frames); hypoxie/normoxie 可单独调整
+# Frame-to-time conversion (hours between frames) of the txt files; hypoxie/normoxie 可单独调整
+# (with DATASET_PATH the times stored in the dataset are used)
 TIME_STEP_HOURS_HYPOXIE = 1.5
 TIME_STEP_HOURS_NORMOXIE = 3
 
@@ -48,6 +59,13 @@ OUTPUT_DIR = Path("./results 141125/hypoxie_normoxie_plots")
 # 根据开关只画到 y 第一次达到 1.5e-3 的功能
 CUT_AT_THRESHOLD = False  # 默认关闭以保持原行为
 THRESHOLD_VALUE = 0.8e-3
+# With DATASET_PATH, cut the curves at the cutoffs stored in the dataset (export_density_bulk.py CUTOFF) instead;
+# curves without a stored cutoff fall back to THRESHOLD_VALUE
+USE_STORED_CUTOFFS = False
+
+# Rendering
+RENDER_WORKERS = 4  # Processes drawing the figures
+FORCE_RENDER = False  # Draw every figure again even if its inputs did not change
 
 
 def load_mean_std(path: Path) -> Tuple[np.ndarray, np.ndarray]:
@@ -80,95 +98,66 @@ def build_time_axis(n_points: int, step_hours: float) -> np.ndarray:
     return np.arange(n_points, dtype=float) * step_hours
 
 
-def maybe_truncate(time_axis: np.ndarray, y_values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
-    """Optionally truncate a curve at the first point reaching the threshold."""
-    if not CUT_AT_THRESHOLD:
-        return time_axis, y_values
-    hit_indices = np.where(y_values >= THRESHOLD_VALUE)[0]  # 首次达到/超过阈值
-    if hit_indices.size == 0:
-        return time_axis, y_values  # 未达到则画全程
-    end_idx = int(hit_indices[0])
-    return time_axis[: end_idx + 1], y_values[: end_idx + 1]
+def condition_cutoffs(data: Dict[int, Dict[str, np.ndarray]], wells: List[int]) -> Dict[int, int]:
+    """Last frame to draw of every well of one condition, all wells in one pass (see growth_cutoff.py)."""
+    # 首次达到/超过阈值；未达到则画全程
+    ends = growth_cutoff.cutoff_indices(growth_cutoff.stack([data[idx]["mean"] for idx in wells]), "threshold", THRESHOLD_VALUE)
+    cutoffs = dict(zip(wells, map(int, ends)))
+    if USE_STORED_CUTOFFS:
+        for idx in wells:
+            if data[idx].get("cutoff", growth_cutoff.NOT_COMPUTED) != growth_cutoff.NOT_COMPUTED:
+                cutoffs[idx] = int(data[idx]["cutoff"])
+    return cutoffs
 
 
-def combined_plot(
+def truncated_curves(
     hypoxie: Dict[int, Dict[str, np.ndarray]],
     normoxie: Dict[int, Dict[str, np.ndarray]],
-    hypoxie_time: np.ndarray,
-    normoxie_time: np.ndarray,
-    output_path: Path,
-) -> None:
-    colors = plt.get_cmap("tab10").colors
-    plt.figure(figsize=(15, 8))
-
-    for i, idx in enumerate(sorted(INITIAL_DENSITIES.keys())):
-        color = colors[i % len(colors)]
-        density = INITIAL_DENSITIES[idx]
-        h_x, h_y = maybe_truncate(hypoxie_time, hypoxie[idx]["mean"])
-        n_x, n_y = maybe_truncate(normoxie_time, normoxie[idx]["mean"])
-        plt.plot(
-            h_x,
-            h_y,
-            linestyle="--",
-            color=color,
-            linewidth=2.0,
-            alpha=0.9,
-            label=f"Well {idx} hypoxie ({density} x10^5/ml)",
-        )
-        plt.plot(
-            n_x,
-            n_y,
-            linestyle="-",
-            marker="o",
-            markersize=3,
-            color=color,
-            linewidth=2.0,
-            alpha=0.9,
-            label=f"Well {idx} normoxie ({density} x10^5/ml)",
-        )
-
-    plt.xlabel("Time (h)", fontsize=22, fontweight="bold")
-    plt.ylabel("Cell density (cells/µm²)", fontsize=22, fontweight="bold")
-    plt.xticks(fontsize=20)
-    plt.yticks(fontsize=20)
-    plt.legend(fontsize=13, ncol=2, frameon=True, framealpha=0.95)
-    plt.title("Hypoxie vs Normoxie (all initial densities)", fontsize=22, fontweight="bold")
-    plt.tight_layout()
-    plt.savefig(output_path, dpi=300, bbox_inches="tight", facecolor="white")
-    plt.close()
-
-
-def highlight_plot(
-    focus_idx: int,
-    hypoxie: Dict[int, Dict[str, np.ndarray]],
-    normoxie: Dict[int, Dict[str, np.ndarray]],
-    hypoxie_time: np.ndarray,
-    normoxie_time: np.ndarray,
-    output_path: Path,
+) -> Dict[int, Dict[str, np.ndarray]]:
+    """x/y arrays of every well, computed once and shared by all the figures."""
+    wells = sorted(INITIAL_DENSITIES.keys())
+    curves = {}
+    if CUT_AT_THRESHOLD:
+        h_end, n_end = condition_cutoffs(hypoxie, wells), condition_cutoffs(normoxie, wells)
+    for idx in wells:
+        h_x, h_y = hypoxie[idx]["time"], hypoxie[idx]["mean"]
+        n_x, n_y = normoxie[idx]["time"], normoxie[idx]["mean"]
+        if CUT_AT_THRESHOLD:
+            h_x, h_y = growth_cutoff.truncate(h_end[idx], h_x, h_y)
+            n_x, n_y = growth_cutoff.truncate(n_end[idx], n_x, n_y)
+        curves[idx] = {"h_x": h_x, "h_y": h_y, "n_x": n_x, "n_y": n_y}
+    return curves
+
+
+def plot_pairs(
+    ax,
+    curves: Dict[int, Dict[str, np.ndarray]],
+    densities: Dict[int, float],
+    focus_idx: Optional[int] = None,
     faded_alpha: float = 0.15,
 ) -> None:
-    colors = plt.get_cmap("tab10").colors
-    plt.figure(figsize=(15, 8))
-
-    for i, idx in enumerate(sorted(INITIAL_DENSITIES.keys())):
+    """Dashed hypoxie and dotted normoxie curve of every well; all but focus_idx dimmed if given."""
+    colors = matplotlib.colormaps["tab10"].colors
+    for i, idx in enumerate(sorted(densities.keys())):
         color = colors[i % len(colors)]
-        density = INITIAL_DENSITIES[idx]
-        emphasis = 1.0 if idx == focus_idx else faded_alpha
-        linewidth = 2.2 if idx == focus_idx else 1.3
-        h_x, h_y = maybe_truncate(hypoxie_time, hypoxie[idx]["mean"])
-        n_x, n_y = maybe_truncate(normoxie_time, normoxie[idx]["mean"])
-        plt.plot(
-            h_x,
-            h_y,
+        density = densities[idx]
+        if focus_idx is None:
+            emphasis, linewidth = 0.9, 2.0
+        else:
+            emphasis = 1.0 if idx == focus_idx else faded_alpha
+            linewidth = 2.2 if idx == focus_idx else 1.3
+        ax.plot(
+            curves[idx]["h_x"],
+            curves[idx]["h_y"],
             linestyle="--",
             color=color,
             linewidth=linewidth,
             alpha=emphasis,
             label=f"Well {idx} hypoxie ({density} x10^5/ml)",
         )
-        plt.plot(
-            n_x,
-            n_y,
+        ax.plot(
+            curves[idx]["n_x"],
+            curves[idx]["n_y"],
             linestyle="-",
             marker="o",
             markersize=3,
@@ -178,44 +167,61 @@ def highlight_plot(
             label=f"Well {idx} normoxie ({density} x10^5/ml)",
         )
 
-    density_text = INITIAL_DENSITIES[focus_idx]
-    plt.xlabel("Time (h)", fontsize=22, fontweight="bold")
-    plt.ylabel("Cell density (cells/µm²)", fontsize=22, fontweight="bold")
-    plt.xticks(fontsize=20)
-    plt.yticks(fontsize=20)
-    plt.legend(fontsize=13, ncol=2, frameon=True, framealpha=0.95)
-    plt.title(
-        f"Well {focus_idx} ({density_text} x10^5/ml): hypoxie vs normoxie",
-        fontsize=22,
-        fontweight="bold",
-    )
-    plt.tight_layout()
-    plt.savefig(output_path, dpi=300, bbox_inches="tight", facecolor="white")
-    plt.close()
+
+def style_axes(ax, title: str) -> None:
+    ax.set_xlabel("Time (h)", fontsize=22, fontweight="bold")
+    ax.set_ylabel("Cell density (cells/µm²)", fontsize=22, fontweight="bold")
+    ax.tick_params(labelsize=20)
+    ax.legend(fontsize=13, ncol=2, frameon=True, framealpha=0.95)
+    ax.set_title(title, fontsize=22, fontweight="bold")
+
+
+def combined_plot(fig, data: Dict) -> None:
+    ax = fig.add_subplot()
+    plot_pairs(ax, data["curves"], data["densities"])
+    style_axes(ax, "Hypoxie vs Normoxie (all initial densities)")
+    fig.tight_layout()
+
+
+def highlight_plot(fig, data: Dict, focus_idx: int, faded_alpha: float = 0.15) -> None:
+    ax = fig.add_subplot()
+    plot_pairs(ax, data["curves"], data["densities"], focus_idx, faded_alpha)
+    style_axes(ax, f"Well {focus_idx} ({data['densities'][focus_idx]} x10^5/ml): hypoxie vs normoxie")
+    fig.tight_layout()
 
 
 def main() -> None:
     wells = sorted(INITIAL_DENSITIES.keys())
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    hypoxie_data = load_condition_series(HYPOXIE_DIR, wells)
-    normoxie_data = load_condition_series(NORMOXIE_DIR, wells)
-
-    hypoxie_points = len(next(iter(hypoxie_data.values()))["mean"])
-    normoxie_points = len(next(iter(normoxie_data.values()))["mean"])
-    hypoxie_time = build_time_axis(hypoxie_points, TIME_STEP_HOURS_HYPOXIE)
-    normoxie_time = build_time_axis(normoxie_points, TIME_STEP_HOURS_NORMOXIE)
+    if DATASET_PATH is None:
+        hypoxie_data = load_condition_series(HYPOXIE_DIR, wells)
+        normoxie_data = load_condition_series(NORMOXIE_DIR, wells)
+        template_label = Path(FILE_TEMPLATE.format(idx="X")).stem.replace(" ", "_")
+        for data, step in ((hypoxie_data, TIME_STEP_HOURS_HYPOXIE), (normoxie_data, TIME_STEP_HOURS_NORMOXIE)):
+            for curve in data.values():
+                curve["time"] = build_time_axis(len(curve["mean"]), step)
+    else:
+        dataset = model_dataset.load(DATASET_PATH)
+        hypoxie_data = dataset.wells("hypoxie", DATASET_DOSE, wells)
+        normoxie_data = dataset.wells("normoxie", DATASET_DOSE, wells)
+        template_label = f"{Path(DATASET_PATH).stem}_{DATASET_DOSE:g}Gy".replace(" ", "_")
+
+    # every well keeps its own time axis (trimmed dataset curves can have different lengths)
+    shared = {
+        "curves": truncated_curves(hypoxie_data, normoxie_data),
+        "densities": INITIAL_DENSITIES,
+    }
 
-    template_label = Path(FILE_TEMPLATE.format(idx="X")).stem.replace(" ", "_")
     combined_path = OUTPUT_DIR / f"hypoxie_normoxie_all_wells_{template_label}.pdf"
-    combined_plot(hypoxie_data, normoxie_data, hypoxie_time, normoxie_time, combined_path)
-
+    jobs = [figure_renderer.FigureJob(combined_plot, combined_path)]
     for idx in wells:
         out_path = OUTPUT_DIR / f"hypoxie_normoxie_highlight_well{idx}_{template_label}.pdf"
-        highlight_plot(idx, hypoxie_data, normoxie_data, hypoxie_time, normoxie_time, out_path)
+        jobs.append(figure_renderer.FigureJob(highlight_plot, out_path, options={"focus_idx": idx}))
+    rendered, skipped = figure_renderer.render_all(jobs, shared=shared, n_workers=RENDER_WORKERS, force=FORCE_RENDER)
 
     print(f"Saved combined plot to: {combined_path}")
-    print(f"Saved per-well highlight plots to: {OUTPUT_DIR}")
+    print(f"Saved per-well highlight plots to: {OUTPUT_DIR} ({len(rendered)} rendered, {len(skipped)} unchanged)")
 
 
 if __name__ == "__main__":
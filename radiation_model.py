@@ -0,0 +1,107 @@
+"""
+Compartment model of cell growth in response to radiation, as a reusable, picklable object.
+
+Same equations as Model_in_Response_to_Radiation_with_logistic_in_Cd_Cr.py:
+before the arrest time Ta the dividing cells Cd grow logistically with a rate
+increasing linearly in time; after Ta
+    dCd = kd*Cd*(1-C/Cmax) - (tu+tr)*Cd       kd = tr + tu - gamma
+    dCu = tu*Cd - gamma*Cu
+    dCs = ts*Cu
+    dCr = k0*(1-C/Cmax)*Cr + tr*Cd
+    dC  = dCd + dCr + dCu + dCs
+The fitted parameters are ts and tu; k0, gamma, Cmax, tr and Ta are fixed
+and stored in the object, together with the time points and C0, so the model
+can be sent to worker processes (bootstrap, profile likelihood, batch fits).
+RadiationModelFreeTr also fits tr.
+
+Integration and caching are in compartment_model.py: the total density used
+by the fit and the compartments used by the figure come from the same
+integration, and repeated evaluations at the same parameters (warm starts,
+profile scans) are not integrated again.
+"""
+
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from compartment_model import CompartmentModel
+
+
+# Arrest time Ta (h) of each dose (Gy), as in the fit script
+ARREST_TIMES = {20: 23, 15: 21, 12.5: 18, 10: 18, 7.5: 16.5, 5: 16.5, 0: 0}
+
+
+def radiation_rhs(t, y, ts, tu, tr, k0, gamma, Cmax, Ta):
+    Cd, Cr, Cs, Cu, C = y
+    kd = tr + tu - gamma
+    if t < Ta:
+        dCd = (kd / Ta) * t * C * (1 - C / Cmax)
+        dCu = 0
+        dCs = 0
+        dCr = 0
+    else:
+        dCd = kd * Cd * (1 - C / Cmax) - (tu + tr) * Cd
+        dCu = tu * Cd - gamma * Cu
+        dCs = ts * Cu
+        dCr = k0 * (1 - C / Cmax) * Cr + tr * Cd
+    dC = dCd + dCr + dCu + dCs
+    return [dCd, dCr, dCs, dCu, dC]
+
+
+class RadiationModel(CompartmentModel):
+    """C(t) = Cd + Cr + Cs + Cu of one well, with ts and tu as free parameters."""
+
+    name = "radiation"
+    state_names = ("Cd", "Cr", "Cs", "Cu", "C")
+    param_names = ("ts", "tu")
+    bounds = ([0, 0], [0.06, 0.2])
+    dose_parameters = ("Ta",)
+
+    def __init__(
+        self,
+        time_points: Sequence[float],
+        C0: float,
+        Ta: float,
+        k0: float = 0.045,
+        gamma: float = 0.06,
+        Cmax: float = 2.4e-3,
+        tr: float = 0.0,
+        method: str = "DOP853",
+    ):
+        super().__init__(time_points, C0, method)
+        self.Ta = float(Ta)
+        self.k0 = k0
+        self.gamma = gamma
+        self.Cmax = Cmax
+        self.tr = tr
+
+    @classmethod
+    def for_dose(cls, time_points, C0, dose, **fixed) -> "RadiationModel":
+        return cls(time_points, C0, ARREST_TIMES[dose], **fixed)
+
+    def rhs(self, t, y, ts, tu):
+        return radiation_rhs(t, y, ts, tu, self.tr, self.k0, self.gamma, self.Cmax, self.Ta)
+
+    # name used in the fit script
+    equa_diff = rhs
+
+    def subpopulations(self, ts: float, tu: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        y = self.solve(ts, tu)
+        return y[0], y[1], y[2], y[3]
+
+
+class RadiationModelFreeTr(RadiationModel):
+    """Same model with the repair rate tr fitted as well."""
+
+    name = "radiation_free_tr"
+    param_names = ("ts", "tu", "tr")
+    bounds = ([0, 0, 0], [0.06, 0.2, 0.01])
+
+    def rhs(self, t, y, ts, tu, tr):
+        return radiation_rhs(t, y, ts, tu, tr, self.k0, self.gamma, self.Cmax, self.Ta)
+
+    equa_diff = rhs
+
+    def subpopulations(self, ts: float, tu: float, tr: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        y = self.solve(ts, tu, tr)
+        return y[0], y[1], y[2], y[3]
@@ -1,6 +1,7 @@
 import h5py
 import numpy as np
-import matplotlib.pyplot as plt
+
+import figure_renderer
 
 # ---- 可调参数集中 ----
 # 只改一次标签，输入HDF5路径和输出文件名都会同步
@@ -31,6 +32,9 @@ FRAME_INTERVAL_HOURS = 3
 Y_MODE = "density"
 # y 轴上限；None 时按 Matplotlib 自动缩放
 Y_MAX = 0.002
+# 绘图进程数；FORCE_RENDER=True 时即使输入未变也重画所有图
+RENDER_WORKERS = 4
+FORCE_RENDER = False
 
 
 def read_all_cell_counts(hdf5_path):
@@ -82,35 +86,42 @@ def prepare_y_values(mean_counts, variances, y_mode):
     return y, std_dev
 
 
-def plot_puits_cell_counts(puits_stats, output_path, puits_concentrations=None, y_mode="count", y_max=None):
-    plt.figure(figsize=(15, 8))
-    colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
-    y_label = "Cell count" if y_mode == "count" else "Cell density (cells/µm²)"
-    for i, (puits_name, stats) in enumerate(puits_stats.items()):
+def puits_curves(puits_stats, y_mode):
+    """每个puits的x（小时）、y与标准差，预先计算后交给绘图进程。"""
+    curves = {}
+    for puits_name, stats in puits_stats.items():
         n_points = len(stats['mean_counts'])
         x = np.arange(0, n_points * FRAME_INTERVAL_HOURS, FRAME_INTERVAL_HOURS)
         y, std_dev = prepare_y_values(stats['mean_counts'], stats['variances'], y_mode)
+        curves[puits_name] = {'x': x, 'y': y, 'std': std_dev}
+    return curves
+
+
+def plot_puits_cell_counts(fig, data, puits_concentrations=None, y_mode="count", y_max=None):
+    ax = fig.add_subplot()
+    colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
+    y_label = "Cell count" if y_mode == "count" else "Cell density (cells/µm²)"
+    for i, (puits_name, curve) in enumerate(data['curves'].items()):
+        x, y, std_dev = curve['x'], curve['y'], curve['std']
         label_text = puits_name
         if puits_concentrations and puits_name in puits_concentrations:
             label_text = f" ({puits_concentrations[puits_name]:.2f} x10^5/ml)"
-        plt.scatter(x, y, label=label_text, color=colors[i], marker='o', s=50, alpha=0.7)
-        plt.fill_between(x, y - std_dev, y + std_dev, color=colors[i], alpha=0.1)
-    plt.xlabel('Time (h)', fontsize=24, fontweight='bold')
-    plt.ylabel(y_label, fontsize=24, fontweight='bold')
-    plt.xticks(fontsize=22)
-    plt.yticks(fontsize=22)
+        ax.scatter(x, y, label=label_text, color=colors[i], marker='o', s=50, alpha=0.7)
+        ax.fill_between(x, y - std_dev, y + std_dev, color=colors[i], alpha=0.1)
+    ax.set_xlabel('Time (h)', fontsize=24, fontweight='bold')
+    ax.set_ylabel(y_label, fontsize=24, fontweight='bold')
+    ax.tick_params(labelsize=22)
     if y_max is not None:
-        plt.ylim(top=y_max)
-    plt.legend(fontsize=20, loc='upper right', frameon=True, framealpha=0.95)
-    plt.tight_layout()
-    plt.savefig(output_path, dpi=300, bbox_inches='tight', facecolor='white', edgecolor='none')
-    plt.close()
+        ax.set_ylim(top=y_max)
+    ax.legend(fontsize=20, loc='upper right', frameon=True, framealpha=0.95)
+    fig.tight_layout()
 
 
 def main():
     try:
         cell_counts = read_all_cell_counts(HDF5_PATH)
 
+        jobs = []
         for suffix in SUFFIX_RANGE:
             puits_groups = {
                 name: [template.format(suffix=suffix)]
@@ -118,8 +129,15 @@ def main():
             }
             puits_stats = calculate_puits_stats(cell_counts, puits_groups)
             output_path = OUTPUT_TEMPLATE.format(run_tag=RUN_TAG, suffix=suffix)
-            plot_puits_cell_counts(puits_stats, output_path, PUITS_CONCENTRATIONS, y_mode=Y_MODE, y_max=Y_MAX)
-        print("All plots have been saved.")
+            jobs.append(figure_renderer.FigureJob(
+                plot_puits_cell_counts,
+                output_path,
+                data={'curves': puits_curves(puits_stats, Y_MODE)},
+                options={'puits_concentrations': PUITS_CONCENTRATIONS, 'y_mode': Y_MODE, 'y_max': Y_MAX},
+            ))
+        # 多进程绘图；输入与设置未变的图不重画
+        rendered, skipped = figure_renderer.render_all(jobs, n_workers=RENDER_WORKERS, force=FORCE_RENDER)
+        print(f"All plots have been saved ({len(rendered)} rendered, {len(skipped)} unchanged).")
     except Exception as e:
         print(f"Error occurred: {str(e)}")
 
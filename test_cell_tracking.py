@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+import Find_Local_Maxima as findMax
+from cell_tracking import NO_PARENT, read_stack_positions, track_positions
+
+
+def test_tracking_goes_on_across_an_empty_frame(tmp_path):
+    path = str(tmp_path / "det.hdf5")
+    cells = pd.DataFrame({"x": [10.0, 50.0], "y": [10.0, 50.0]})
+    moved = pd.DataFrame({"x": [11.0, 51.0], "y": [10.0, 50.0]})
+    # frame 2 has no detection, as written by the detection on a blank image
+    blank = findMax.findMax(findMax.getBlobs(np.zeros((64, 64)), 0.05), (64, 64))
+    for ip, pos in enumerate([cells, moved, blank, cells, moved]):
+        pos.to_hdf(path, key=f"ImageB3-7-C2/frame{ip}")
+
+    frames, positions = read_stack_positions(path, "ImageB3-7-C2")
+    assert list(frames) == [0, 1, 2, 3, 4]
+    assert positions[2].shape == (0, 2)
+
+    tracks, lineage = track_positions(frames, positions, max_distance=5.0, division_distance=5.0)
+    assert len(tracks) == 8
+    # the two cells die at frame 1 and two new tracks are born at frame 3
+    assert sorted(lineage["end"]) == [1, 1, 4, 4]
+    assert sorted(lineage["start"]) == [0, 0, 3, 3]
+    assert (lineage["length"] == 2).all()
+    assert (lineage["parent"] == NO_PARENT).all()
@@ -0,0 +1,15 @@
+import os
+
+import numpy as np
+
+import count_smoothing
+
+
+def test_cache_dir_set_at_run_time_is_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(count_smoothing, "CACHE_DIR", str(tmp_path))
+    counts = np.random.default_rng(0).poisson(100, size=(3, 60)).astype(float)
+    counts[1, 10] = np.nan
+    out = count_smoothing.smooth(counts, "savgol", window=9)
+    files = os.listdir(tmp_path)
+    assert len(files) == 1 and files[0].startswith("savgol_p2_w9_")
+    assert np.isnan(out[1, 10]) and np.isfinite(out[0]).all()
@@ -0,0 +1,18 @@
+import json
+
+import detection_metrics
+
+
+def test_frame_records_are_readable_before_the_stack_ends(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    metrics = detection_metrics.RunMetrics(path)
+    try:
+        with metrics.stage("read"):
+            pass
+        metrics.frame("B3-7-C2", 0, maxima=12)
+        with open(path) as fp:
+            records = [json.loads(line) for line in fp]
+        assert records[-1]["event"] == "frame"
+        assert records[-1]["maxima"] == 12 and "read" in records[-1]["stages_ms"]
+    finally:
+        metrics.close()
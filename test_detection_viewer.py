@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+import Find_Local_Maxima as findMax
+from detection_viewer import Detections
+
+
+def test_positions_of_an_empty_stored_frame(tmp_path):
+    path = str(tmp_path / "det.hdf5")
+    blank = findMax.findMax(findMax.getBlobs(np.zeros((64, 64)), 0.05), (64, 64))
+    blank.to_hdf(path, key="ImageB3-7-C2/frame0")
+    pd.DataFrame({"x": [1.0], "y": [2.0]}).to_hdf(path, key="ImageB3-7-C2/frame1")
+
+    detections = Detections(path, "B3-7-C2")
+    try:
+        assert detections.positions(0).shape == (0, 2)
+        np.testing.assert_array_equal(detections.positions(1), [[1.0, 2.0]])
+        assert detections.positions(5).shape == (0, 2)  # frame not stored
+    finally:
+        detections.close()
@@ -0,0 +1,38 @@
+import h5py
+import numpy as np
+import pandas as pd
+
+import Find_Local_Maxima as findMax
+from detections_parquet import frame_rows, read_frame_table, read_stack_table
+
+
+def write_frames(path, frames):
+    for ip, pos in enumerate(frames):
+        pos.to_hdf(path, key=f"ImageB3-7-C2/frame{ip}")
+
+
+def blank_frame():
+    # findMax on an image without any blob, as written by the detection
+    blobs = findMax.getBlobs(np.zeros((64, 64)), 0.05)
+    return findMax.findMax(blobs, (64, 64))
+
+
+def test_empty_frame_reads_back_as_zero_length_columns(tmp_path):
+    path = str(tmp_path / "det.hdf5")
+    write_frames(path, [blank_frame(), pd.DataFrame({"x": [1.0, 3.0], "y": [2.0, 4.0]})])
+    with h5py.File(path, "r") as f:
+        group = f["ImageB3-7-C2"]
+        empty = read_frame_table(group["frame0"])
+        full = read_frame_table(group["frame1"])
+        assert [frame_rows(group["frame0"]), frame_rows(group["frame1"])] == [0, 2]
+    assert set(empty) == {"x", "y"}
+    assert all(len(column) == 0 for column in empty.values())
+    np.testing.assert_array_equal(full["y"], [2.0, 4.0])
+
+
+def test_stack_table_keeps_going_after_an_empty_frame(tmp_path):
+    path = str(tmp_path / "det.hdf5")
+    cells = pd.DataFrame({"x": [1.0], "y": [2.0]})
+    write_frames(path, [cells, blank_frame(), cells])
+    table = read_stack_table(path, "ImageB3-7-C2")
+    assert sorted(table["frame"]) == [0, 2]
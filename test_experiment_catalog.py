@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+
+import Find_Local_Maxima as findMax
+import experiment_catalog
+
+
+def test_empty_frames_are_counted_as_zero(tmp_path):
+    path = str(tmp_path / "output_file_1031_0.0375.hdf5")
+    blank = findMax.findMax(findMax.getBlobs(np.zeros((64, 64)), 0.05), (64, 64))
+    pd.DataFrame({"x": [1.0, 2.0, 3.0], "y": [1.0, 2.0, 3.0]}).to_hdf(path, key="ImageB3-7-C2/frame0")
+    blank.to_hdf(path, key="ImageB3-7-C2/frame1")
+
+    db = str(tmp_path / "catalog.sqlite")
+    experiment_catalog.index_files(db, [path])
+    counts = experiment_catalog.query_counts(db).set_index("frame")["count"]
+    assert counts.to_dict() == {0: 3, 1: 0}
+    stats = experiment_catalog.well_statistics(db).set_index("frame")["mean"]
+    assert stats.to_dict() == {0: 3.0, 1: 0.0}
@@ -0,0 +1,40 @@
+import numpy as np
+
+import log_map_cache
+
+
+def test_variant_tells_apart_experiments_with_the_same_directory_name(tmp_path):
+    first = log_map_cache.variant(str(tmp_path / "141125" / "stack rouge 1031" / "*.tif"), 0, 256)
+    second = log_map_cache.variant(str(tmp_path / "151025" / "stack rouge 1031" / "*.tif"), 0, 256)
+    assert first != second
+    assert first.startswith("stack_rouge_1031_") and first.endswith("_c0_bw256")
+    assert first == log_map_cache.variant(str(tmp_path / "141125" / "stack rouge 1031" / "*.tif"), 0, 256)
+    assert first != log_map_cache.variant(str(tmp_path / "141125" / "stack rouge 1031" / "*.tif"), 1, 256)
+
+    # the same stack id of the two experiments gets two different maps
+    root = str(tmp_path / "cache")
+    log_map_cache.LogMapCache(root, variant=first).put("B3-7-C2", 0, 3.5, np.zeros((4, 4)))
+    assert log_map_cache.LogMapCache(root, variant=second).get("B3-7-C2", 0, 3.5) is None
+
+
+def test_budget_covers_the_maps_of_every_process(tmp_path):
+    root = str(tmp_path / "cache")
+    lap = np.zeros((32, 32))
+    one_map = 32 * 32 * 2 + 128
+    # two workers sharing the directory, each with its own index
+    a = log_map_cache.LogMapCache(root, max_bytes=3 * one_map, variant="a", rescan_seconds=0)
+    b = log_map_cache.LogMapCache(root, max_bytes=3 * one_map, variant="b", rescan_seconds=0)
+    for ip in range(4):
+        a.put("B3-7-C2", ip, 3.5, lap)
+        b.put("B3-7-C2", ip, 3.5, lap)
+    log_map_cache.LogMapCache(root)  # scan of the whole directory
+    total = sum(p.stat().st_size for p in (tmp_path / "cache").rglob("*.npy"))
+    assert total <= 3 * one_map
+
+
+def test_interrupted_writes_are_not_counted(tmp_path):
+    root = tmp_path / "cache"
+    cache = log_map_cache.LogMapCache(str(root), variant="v")
+    cache.put("B3-7-C2", 0, 3.5, np.zeros((4, 4)))
+    np.save(root / "B3-7-C2" / "v" / "sigma3.5" / "frame1.npy.tmp.npy", np.zeros(100))
+    assert list(log_map_cache.LogMapCache(str(root), variant="v").index) == [cache.path("B3-7-C2", 0, 3.5)]
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+import model_registry
+
+
+TIME_POINTS = np.linspace(0, 100, 5)
+
+
+def test_radiation_model_without_dose_names_the_dose():
+    with pytest.raises(ValueError, match="needs a dose"):
+        model_registry.make("radiation", TIME_POINTS, 1e-4)
+
+
+def test_radiation_model_with_dose_or_arrest_time():
+    assert model_registry.make("radiation", TIME_POINTS, 1e-4, dose=20).Ta == 23
+    assert model_registry.make("radiation_free_tr", TIME_POINTS, 1e-4, Ta=18).Ta == 18
+
+
+def test_models_without_dose_parameters_need_no_dose():
+    model = model_registry.make("logistic", TIME_POINTS, 1e-4)
+    assert model.C0 == 1e-4
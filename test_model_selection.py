@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+import model_registry
+import model_selection
+
+
+def test_failed_fit_is_ranked_last():
+    table = pd.DataFrame({
+        "condition": "hypoxie", "dose": 20.0, "well": 3,
+        "model": ["radiation", "radiation_free_tr", "logistic"],
+        "aic": [12.0, np.nan, 10.0], "bic": [14.0, np.nan, 11.0],
+    })
+    ranked = model_selection.rank(table)
+    assert list(ranked["model"]) == ["logistic", "radiation", "radiation_free_tr"]
+    assert list(ranked["rank"]) == [1, 2, 3]
+    assert np.isclose(ranked["akaike_weight"].iloc[:2].sum(), 1.0)
+
+
+def test_fit_key_follows_the_fit_code(monkeypatch):
+    time_points = np.linspace(0, 100, 5)
+    exp = np.linspace(1e-4, 5e-4, 5)
+    std = 0.1 * exp
+    model = model_registry.make("logistic", time_points, exp[0])
+    key = model_selection.fit_key("logistic", model, 0.0, time_points, exp, std, {})
+    source = model_selection.inspect.getsource
+
+    def edited(module):
+        text = source(module)
+        return text + "\n# edited" if module is model_selection.fit_seeding else text
+
+    monkeypatch.setattr(model_selection.inspect, "getsource", edited)
+    assert model_selection.fit_key("logistic", model, 0.0, time_points, exp, std, {}) != key
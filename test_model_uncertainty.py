@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import model_uncertainty
+from compartment_model import CompartmentModel
+
+
+class InflowLogistic(CompartmentModel):
+    """Logistic growth with a constant inflow: three parameters, unlike the (ts, tu) of BOUNDS."""
+
+    name = "inflow_logistic"
+    param_names = ("k", "Cmax", "a")
+    bounds = ([0, 1e-4, 0], [0.2, 1e-2, 1e-5])
+
+    def rhs(self, t, y, k, Cmax, a):
+        return [k * y[0] * (1 - y[0] / Cmax) + a]
+
+
+def curve():
+    model = InflowLogistic(np.linspace(0, 150, 40), 2e-4)
+    exp = model(model.time_points, 0.05, 1.5e-3, 2e-6)
+    return model, exp, 0.02 * exp
+
+
+def test_profile_interval_uses_the_bounds_it_is_given():
+    model, exp, std = curve()
+    popt, chi2_min = model_uncertainty.best_fit(model, exp, std, model.bounds, n_starts=4)
+    lower, upper = model_uncertainty.adaptive_profile_interval(
+        model, exp, std, popt, model.bounds, chi2_min, 2, (popt[2] * 0.9, popt[2] * 1.1), n_workers=1)
+    assert model.bounds[0][2] <= lower < 2e-6 < upper <= model.bounds[1][2]
+
+
+def test_best_fit_raises_when_no_fit_converges():
+    model, exp, std = curve()
+    with pytest.raises(RuntimeError, match="none of the 3 fits"):
+        model_uncertainty.best_fit(model, np.full_like(exp, np.nan), std, model.bounds, n_starts=3)
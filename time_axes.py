@@ -0,0 +1,247 @@
+"""
+Acquisition times of the stacks, carried from the stack builder to the counts, and resampling onto common grids.
+
+The scripts used to build their time axis as np.arange(n) * interval with a
+constant interval (1.5 h, 3 h, ...), although the real interval depends on the
+experiment and scans are sometimes late or missing. Here the acquisition
+times follow the data:
+
+- make_stack_temps_en.py embeds them in the stacks, from the folder names it
+  already parses (ScanData/YYMM/DD/HHMM): in the OME-XML of the TIFF stacks
+  (AcquisitionDate of the image and DeltaT of every plane) or in the
+  "acquisition" attributes of the Zarr stacks, with the camera, well, position
+  and channel. It also writes a sidecar {stack}_times.csv (frame, ISO datetime);
+- Detection_algorithm_stack.py reads them with read_stack_acquisition(...),
+  which prefers the embedded times over the sidecar, and stores them in the
+  output HDF5 as Image{id}/times: hours since the first frame of the stack,
+  with the datetime of the first frame in the attribute "start". The other
+  acquisition metadata become attributes of the Image{id} group;
+- read_time_matrix(...) reads them for every group, aligned with the count
+  matrix of export_density_bulk.read_count_matrix;
+- resample(...) interpolates many series with different time points onto one
+  grid in a single vectorized pass (no loop over the series), and
+  common_grid(...) builds the grid covered by all of them.
+"""
+
+import csv
+import os
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import h5py
+import numpy as np
+
+
+SIDECAR_SUFFIX = "_times.csv"
+TIMES_NAME = "times"  # dataset Image{id}/times
+DELTA_T_SECONDS = {"s": 1.0, "ms": 1e-3, "min": 60.0, "h": 3600.0}  # OME DeltaTUnit -> seconds
+
+
+def sidecar_path(stack_path: str) -> str:
+    """B2-1-C2_stack.tif (or .zarr) -> B2-1-C2_stack_times.csv"""
+    return os.path.splitext(stack_path.rstrip("/\\"))[0] + SIDECAR_SUFFIX
+
+
+def write_sidecar(stack_path: str, datetimes: Sequence[datetime]) -> str:
+    path = sidecar_path(stack_path)
+    with open(path, "w", newline="") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(["frame", "datetime"])
+        for frame, dt in enumerate(datetimes):
+            writer.writerow([frame, dt.isoformat()])
+    return path
+
+
+def read_sidecar(stack_path: str) -> Optional[List[datetime]]:
+    """Datetimes of the frames of a stack, or None if it has no sidecar."""
+    path = sidecar_path(stack_path)
+    if not os.path.isfile(path):
+        return None
+    with open(path, newline="") as fp:
+        rows = sorted((int(row["frame"]), row["datetime"]) for row in csv.DictReader(fp))
+    return [datetime.fromisoformat(value) for _, value in rows]
+
+
+def ome_metadata(start: datetime, times: Sequence[datetime], name: str, **description) -> Dict:
+    """tifffile metadata of an OME-TIFF stack with the acquisition time of every plane.
+
+    description (e.g. camera, well) is stored as "key=value" pairs in the Description of the image.
+    """
+    delta = [(dt - start).total_seconds() for dt in times]
+    return {
+        "Name": name,
+        "AcquisitionDate": start.isoformat(),
+        "Description": " ".join(f"{key}={value}" for key, value in description.items()),
+        "Plane": {"DeltaT": delta, "DeltaTUnit": ["s"] * len(delta)},
+    }
+
+
+def _tiles(frames: Iterable[np.ndarray], tile: Sequence[int]) -> Iterator[np.ndarray]:
+    """The tiles of every frame in the order tifffile writes them (rows of tiles, frame after frame)."""
+    th, tw = tile
+    for img in frames:
+        for y in range(0, img.shape[0], th):
+            for x in range(0, img.shape[1], tw):
+                yield img[y:y + th, x:x + tw]
+
+
+def write_ome_series(path: str, frames: Iterable[np.ndarray], n_frames: int, first: np.ndarray, metadata: Dict, **write_options) -> None:
+    """Write the frames (read one at a time) as a single OME-TIFF T series with the given ome_metadata.
+
+    write_options are passed to tifffile (compression, predictor, tile, ...);
+    with tile, the frames are handed to tifffile tile by tile, as it expects.
+    """
+    import tifffile
+    rgb = first.ndim == 3 and first.shape[-1] in (3, 4)
+    metadata = {**metadata, "axes": "TYXS" if rgb else "TYX"}
+    data = frames if write_options.get("tile") is None else _tiles(frames, write_options["tile"])
+    with tifffile.TiffWriter(path, bigtiff=True, ome=True) as tif:
+        tif.write(data, shape=(n_frames, *first.shape), dtype=first.dtype,
+                  photometric="rgb" if rgb else "minisblack", metadata=metadata, **write_options)
+
+
+def read_ome_acquisition(ome_xml: str) -> Optional[Tuple[List[datetime], Dict]]:
+    """Datetimes of the planes (along T) and Description pairs of the first image of an OME-XML, or None."""
+    root = ET.fromstring(ome_xml)
+    ns = {"ome": root.tag[1:].split("}")[0]} if root.tag.startswith("{") else {"ome": ""}
+    prefix = "ome:" if ns["ome"] else ""
+    image = root.find(f"{prefix}Image", ns)
+    if image is None:
+        return None
+    date = image.find(f"{prefix}AcquisitionDate", ns)
+    planes = image.findall(f"{prefix}Pixels/{prefix}Plane", ns)
+    if date is None or not date.text or not planes or any(p.get("DeltaT") is None for p in planes):
+        return None
+    start = datetime.fromisoformat(date.text.strip())
+    delta = {}
+    for plane in planes:
+        seconds = float(plane.get("DeltaT")) * DELTA_T_SECONDS.get(plane.get("DeltaTUnit", "s"), 1.0)
+        delta.setdefault(int(plane.get("TheT", 0)), seconds)
+    times = [start + timedelta(seconds=delta[t]) for t in sorted(delta)]
+    text = image.findtext(f"{prefix}Description", default="", namespaces=ns)
+    metadata = dict(pair.split("=", 1) for pair in text.split() if "=" in pair)
+    return times, metadata
+
+
+def read_stack_acquisition(stack_path: str) -> Tuple[Optional[List[datetime]], Dict]:
+    """Datetimes of the frames of a stack and its acquisition metadata.
+
+    The times embedded in the stack (OME-XML of a TIFF, attributes of a Zarr
+    stack) are used first, then the sidecar; metadata["times_source"] tells
+    which one ("ome", "zarr", "sidecar"), and the times are None without any.
+    """
+    embedded, source = None, None
+    if os.path.isdir(stack_path):
+        import zarr_stack  # only needed (with zarr) for Zarr stacks
+        if zarr_stack.is_zarr_stack(stack_path):
+            embedded, source = zarr_stack.read_acquisition(stack_path), "zarr"
+    else:
+        import tifffile
+        with tifffile.TiffFile(stack_path) as tif:
+            if tif.ome_metadata:
+                embedded, source = read_ome_acquisition(tif.ome_metadata), "ome"
+    if embedded is not None and embedded[0]:
+        times, metadata = embedded
+        return times, {**metadata, "times_source": source}
+    metadata = dict(embedded[1]) if embedded is not None else {}
+    times = read_sidecar(stack_path)
+    if times is not None:
+        metadata["times_source"] = "sidecar"
+    return times, metadata
+
+
+def hours_since(datetimes: Sequence[datetime], start: Optional[datetime] = None) -> np.ndarray:
+    start = datetimes[0] if start is None else start
+    return np.array([(dt - start).total_seconds() / 3600.0 for dt in datetimes])
+
+
+def write_stack_times(group: h5py.Group, datetimes: Sequence[datetime]) -> None:
+    """Store the times of one stack in its Image{id} group."""
+    if TIMES_NAME in group:
+        del group[TIMES_NAME]
+    ds = group.create_dataset(TIMES_NAME, data=hours_since(datetimes))
+    ds.attrs["start"] = datetimes[0].isoformat()
+    ds.attrs["unit"] = "hours"
+
+
+def read_stack_times(group: h5py.Group) -> Optional[Tuple[np.ndarray, datetime]]:
+    """(hours since the first frame, datetime of the first frame) of one Image{id} group, or None."""
+    if TIMES_NAME not in group:
+        return None
+    ds = group[TIMES_NAME]
+    return ds[:], datetime.fromisoformat(ds.attrs["start"])
+
+
+def read_time_matrix(hdf5_path: str, groups: Sequence[str], max_frame: int) -> Tuple[np.ndarray, List[Optional[datetime]]]:
+    """Hours of every group and frame (rows as groups, NaN without times) and the start of each group."""
+    hours = np.full((len(groups), max_frame + 1), np.nan)
+    starts = []
+    with h5py.File(hdf5_path, "r") as f:
+        for row, group in enumerate(groups):
+            times = read_stack_times(f[group]) if group in f else None
+            if times is None:
+                starts.append(None)
+                continue
+            n = min(times[0].size, max_frame + 1)
+            hours[row, :n] = times[0][:n]
+            starts.append(times[1])
+    return hours, starts
+
+
+def regular_times(n_frames: int, step_hours: float) -> np.ndarray:
+    """The former np.arange(n) * interval axis, for series without stored times."""
+    return np.arange(n_frames, dtype=float) * step_hours
+
+
+def common_grid(times: np.ndarray, step_hours: float) -> np.ndarray:
+    """Grid with the given step over the time range covered by every series (rows of times)."""
+    times = np.atleast_2d(times)
+    start = np.nanmax(np.nanmin(times, axis=1))
+    stop = np.nanmin(np.nanmax(times, axis=1))
+    if not stop >= start:
+        return np.empty(0)
+    return start + np.arange(int(np.floor((stop - start) / step_hours + 1e-9)) + 1) * step_hours
+
+
+def resample(times: np.ndarray, values: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """Linear interpolation of every row of values (at the times of the same row) onto grid.
+
+    times and values are (n_series, n_frames), NaN where a frame is missing;
+    times must increase along each row. A 1-D times is shared by all rows.
+    Grid points outside the range of a series, or with no valid point around
+    them, are NaN (no extrapolation).
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    times = np.broadcast_to(np.asarray(times, dtype=float), values.shape)
+    grid = np.asarray(grid, dtype=float)
+    n_series = values.shape[0]
+    valid = np.isfinite(times) & np.isfinite(values)
+    if not valid.any() or grid.size == 0:
+        return np.full((n_series, grid.size), np.nan)
+
+    # all the series are laid end to end on one axis, each shifted by row * span, so a
+    # single searchsorted finds the neighbours of the grid points in every series
+    t_min = min(np.min(times[valid]), grid.min())
+    span = max(np.max(times[valid]), grid.max()) - t_min + 1.0
+    rows, cols = np.nonzero(valid)
+    keys = rows * span + (times[rows, cols] - t_min)
+    flat_values = values[rows, cols]
+    first = np.searchsorted(rows, np.arange(n_series), side="left")
+    last = np.searchsorted(rows, np.arange(n_series), side="right") - 1
+
+    query = (np.arange(n_series)[:, None] * span + (grid[None, :] - t_min))
+    right = np.searchsorted(keys, query, side="left")
+    left = right - 1
+    # exact hits and points inside the range of the series
+    inside = (right <= last[:, None]) & (left >= first[:, None])
+    exact = (right <= last[:, None]) & (right >= first[:, None])
+    right_c = np.clip(right, 0, keys.size - 1)
+    left_c = np.clip(left, 0, keys.size - 1)
+    hit = exact & (keys[right_c] == query)
+
+    dt = keys[right_c] - keys[left_c]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.where(dt > 0, (query - keys[left_c]) / dt, 0.0)
+    out = np.where(inside, flat_values[left_c] + w * (flat_values[right_c] - flat_values[left_c]), np.nan)
+    return np.where(hit, flat_values[right_c], out)
@@ -0,0 +1,110 @@
+"""
+OME-Zarr storage of the image stacks, as an alternative to multi-page TIFF.
+
+Layout (OME-NGFF 0.4, zarr format 2, one directory per stack):
+    {well}-{position}-{channel}_stack.zarr/
+        .zattrs      multiscales metadata (axes t, y, x), and under "acquisition" the
+                     datetime of every frame and the camera/well/position/channel
+        0/           array (nt, Ny, Nx), one chunk per FRAMES_PER_CHUNK frames
+
+Every chunk is a separate Blosc/zstd-compressed file, so frame t is read
+without walking the pages of the stack, several processes can read different
+frames at the same time, and new frames are appended without rewriting the
+previous ones (make_stack_temps_en.py only adds the frames acquired since the
+last run). Works with zarr 2 and zarr 3.
+"""
+
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numcodecs
+import numpy as np
+import zarr
+
+
+# ------- Configuration -------
+FRAMES_PER_CHUNK = 1  # Frames per chunk along t; 1 gives the fastest random access to a single frame
+COMPRESSION_LEVEL = 3  # zstd level of the Blosc compressor
+
+ZARR_MAJOR = int(zarr.__version__.split(".")[0])
+ARRAY_NAME = "0"  # full-resolution level of the multiscales
+ACQUISITION_KEY = "acquisition"
+
+
+def is_zarr_stack(path: str) -> bool:
+    return os.path.isdir(path) and path.rstrip("/\\").endswith(".zarr")
+
+
+def _ome_metadata(name: str) -> dict:
+    return {
+        "multiscales": [{
+            "version": "0.4",
+            "name": name,
+            "axes": [
+                {"name": "t", "type": "time"},
+                {"name": "y", "type": "space"},
+                {"name": "x", "type": "space"},
+            ],
+            "datasets": [{
+                "path": ARRAY_NAME,
+                "coordinateTransformations": [{"type": "scale", "scale": [1.0, 1.0, 1.0]}],
+            }],
+        }]
+    }
+
+
+def create_stack(
+    path: str,
+    frame_shape: Tuple[int, int],
+    dtype,
+    frames_per_chunk: int = FRAMES_PER_CHUNK,
+    level: int = COMPRESSION_LEVEL,
+) -> "zarr.Array":
+    """Create an empty stack (0 frames) of frames of shape (Ny, Nx)."""
+    compressor = numcodecs.Blosc(cname="zstd", clevel=level, shuffle=numcodecs.Blosc.BITSHUFFLE)
+    shape = (0, *frame_shape)
+    chunks = (frames_per_chunk, *frame_shape)
+    if ZARR_MAJOR >= 3:
+        group = zarr.open_group(path, mode="w", zarr_format=2)
+        array = group.create_array(ARRAY_NAME, shape=shape, chunks=chunks, dtype=dtype, compressors=compressor)
+    else:
+        group = zarr.open_group(path, mode="w")
+        array = group.create_dataset(ARRAY_NAME, shape=shape, chunks=chunks, dtype=dtype, compressor=compressor)
+    group.attrs.update(_ome_metadata(os.path.basename(path.rstrip("/\\"))))
+    return array
+
+
+def open_stack(path: str, mode: str = "r") -> "zarr.Array":
+    """Open the (nt, Ny, Nx) array of a stack; frames are read lazily, e.g. stack[ip]."""
+    return zarr.open_group(path, mode=mode)[ARRAY_NAME]
+
+
+def append_frames(array: "zarr.Array", frames: Iterable[np.ndarray]) -> int:
+    """Append frames at the end of the stack; return the new number of frames."""
+    for frame in frames:
+        array.append(np.asarray(frame, dtype=array.dtype)[None], axis=0)
+    return array.shape[0]
+
+
+def write_acquisition(path: str, times: Sequence[datetime], **metadata) -> None:
+    """Store the datetime of every frame (ISO strings) and other acquisition metadata in the group attributes."""
+    group = zarr.open_group(path, mode="a")
+    group.attrs[ACQUISITION_KEY] = {"times": [dt.isoformat() for dt in times], **metadata}
+
+
+def read_acquisition(path: str) -> Optional[Tuple[List[datetime], Dict]]:
+    """(datetimes of the frames, other acquisition metadata), or None for stacks written without them."""
+    acquisition = zarr.open_group(path, mode="r").attrs.get(ACQUISITION_KEY)
+    if not acquisition:
+        return None
+    metadata = {key: value for key, value in acquisition.items() if key != "times"}
+    return [datetime.fromisoformat(value) for value in acquisition.get("times", [])], metadata
+
+
+def read_frame(array: "zarr.Array", ip: int) -> np.ndarray:
+    """Frame ip as float64 rescaled to [0, 1] for integer images, like bioformats ImageReader.read."""
+    frame = array[ip]
+    if np.issubdtype(frame.dtype, np.integer):
+        return frame / float(np.iinfo(frame.dtype).max)
+    return frame.astype(np.float64)